@@ -1,48 +1,41 @@
+import asyncio
 import os
-from dotenv import load_dotenv
+import re
+from collections import Counter
 
 from google.adk.agents import Agent
-from google.adk.tools import FunctionTool
+from google.adk.tools import FunctionTool, ToolContext
 from google.adk.tools.agent_tool import AgentTool
 
 # Import LangChan and related components
-from langchain_community.graphs import Neo4jGraph
-from langchain.chains import GraphCypherQAChain
 from langchain.prompts.prompt import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-
-from .ticket_agent.agent import ticket_agent
+from .ticket_agent.agent import continue_ticket, ticket_agent
 
 from . import prompt
-
-load_dotenv()
-
-project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-location = os.getenv("GOOGLE_CLOUD_LOCATION")
-api_key = os.getenv("GOOGLE_API_KEY")
-url = "bolt:://localhost:7687"
-username = "neo4j"
-password = "#Warriors30."
-
-print(url, username, password)
-
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=api_key
-        )
-
-
-# --- 1. Connect to the Neo4j Knowledge Graph ---
-graph = Neo4jGraph(
-    url=url,
-    username=username,
-    password=password
-)
-
-graph.refresh_schema()
+from . import cypher_guard
+from . import cypher_templates
+from . import chunk_store
+from . import entity_context
+from . import gateway
+from . import manual_retrieval
+from . import resources
+from . import streaming
+from .caching import AnswerCache, CypherCache, labels_in, parse_ttls
+from .prompt_builder import CypherPromptBuilder
+from .resources import Lazy
+from .speculative import SpeculativeRouter
+from .telemetry import stage, tool_span
+
+# --- 1. Lazily initialized resources ---
+# Nothing below connects to Neo4j or Google at import time. Clients, the graph
+# connection and the chains are built on first use (or by the background
+# warm-up at the end of this module).
+graph = resources.graph
+async_graph = resources.async_graph
+llm = resources.llm
+embeddings = resources.embeddings
 
 # --- 2. Create the LangChain QA Chain ---
 CYPHER_GENERATION_TEMPLATE = prompt.CYPHER_GENERATION_TEMPLATE
@@ -51,32 +44,312 @@ CYPHER_GENERATION_PROMPT = PromptTemplate(
     input_variables=["schema", "question"], template=CYPHER_GENERATION_TEMPLATE
 )
 
+# Build the Cypher prompt per question from the live schema and the closest
+# examples (prompt_builder.py). CYPHER_DYNAMIC_PROMPT=0 sends the full template.
+CYPHER_DYNAMIC_PROMPT = os.getenv("CYPHER_DYNAMIC_PROMPT", "1") == "1"
+cypher_prompt_builder = CypherPromptBuilder()
+
 QA_TEMPLATE = prompt.QA_TEMPLATE
 
 QA_PROMPT = PromptTemplate(
     input_variables=["context", "question"], template=QA_TEMPLATE
 )
 
-qa_chain = GraphCypherQAChain.from_llm(
-    graph=graph,
-    llm=ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=api_key
-        ),
-    verbose=True,
-    allow_dangerous_requests=True,
-    cypher_prompt=CYPHER_GENERATION_PROMPT,
-    qa_prompt=QA_PROMPT
+
+def _build_qa_chain():
+    from langchain.chains import GraphCypherQAChain
+
+    return GraphCypherQAChain.from_llm(
+        graph=graph.get(),
+        llm=resources.cypher_llm.get(),
+        verbose=True,
+        allow_dangerous_requests=True,
+        return_intermediate_steps=True,
+        cypher_prompt=CYPHER_GENERATION_PROMPT,
+        qa_prompt=QA_PROMPT
+    )
+
+
+qa_chain = Lazy("qa_chain", _build_qa_chain)
+
+# Used on a cache hit, where the stored Cypher is run without the generation step.
+qa_answer_chain = Lazy("qa_answer_chain", lambda: QA_PROMPT | llm.get() | StrOutputParser())
+
+# --- 2b. Cache generated Cypher per question ---
+cypher_cache = CypherCache(
+    cypher_prompt_builder.version_text if CYPHER_DYNAMIC_PROMPT else CYPHER_GENERATION_TEMPLATE,
+    max_size=int(os.getenv("CYPHER_CACHE_SIZE", "512")),
+    ttl_seconds=int(os.getenv("CYPHER_CACHE_TTL_SECONDS", str(24 * 3600))),
+    similarity_threshold=float(os.getenv("CYPHER_CACHE_SIMILARITY", "0.95")),
 )
 
+
+def _on_schema(schema):
+    if cypher_cache.set_schema(schema):
+        print("Graph schema changed, Cypher cache cleared.")
+
+
+resources.schema_listeners.append(_on_schema)
+
+# --- 2c. Cache final answers per question ---
+# Served until a label the answer read changes version in the graph (polled
+# every ANSWER_CACHE_VERSION_POLL seconds) or its shortest per-label TTL ends;
+# see caching.AnswerCache. ANSWER_CACHE_TTLS overrides the per-label TTLs,
+# e.g. "Measurement=30,Equipment=604800".
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_VERSION_POLL = float(os.getenv("ANSWER_CACHE_VERSION_POLL", "5"))
+answer_cache = AnswerCache(
+    ttls=parse_ttls(os.getenv("ANSWER_CACHE_TTLS", "")),
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+)
+_TEMPLATE_LABELS = {t.cypher: t.labels for t in cypher_templates.TEMPLATES}
+_TEMPLATE_LABELS.update({t.cypher_by_id: t.labels for t in cypher_templates.TEMPLATES if t.cypher_by_id})
+MANUALS_LABELS = ("Chunk", "Equipment")
+
+
+def refresh_schema():
+    """Re-read the graph schema. Cached Cypher is dropped if the schema changed."""
+    resources.refresh_schema(graph.get())
+
+
+# Which path answered each question: "template:<family>", "cypher_cache", "llm" or "cypher_rejected".
+answer_paths = Counter()
+
+
+def _record_path(path: str):
+    answer_paths[path] += 1
+    print(f"Answered by {path} (totals: {dict(answer_paths)})")
+
+
+def _graph_labels(cypher):
+    if cypher in _TEMPLATE_LABELS:
+        return _TEMPLATE_LABELS[cypher]
+    schema = graph.get().structured_schema
+    return labels_in(cypher or "", schema.get("node_props", {}), schema.get("relationships", ()))
+
+
+async def _cached(tool, query, events, labels_for):
+    """Answer from answer_cache, or pass `events` through and cache the answer if it had rows."""
+    if not ANSWER_CACHE:
+        async for event in events:
+            yield event
+        return
+    await answer_cache.arefresh(async_graph.get(), ANSWER_CACHE_VERSION_POLL)
+    entry = answer_cache.lookup(tool, query)
+    if entry is not None:
+        print(f"Answer cache hit {answer_cache.stats()}")
+        yield {"type": "rows", "cypher": entry["cypher"], "rows": entry["rows"]}
+        if tool == "knowledge_graph":
+            _record_path("answer_cache")
+        yield {"type": "answer", "text": entry["answer"], "path": "answer_cache"}
+        return
+    rows = None
+    async for event in events:
+        if event["type"] == "rows":
+            rows = event
+        elif event["type"] == "answer" and rows is not None:
+            answer_cache.store(tool, query, event["text"], rows["rows"], labels_for(rows["cypher"]), rows["cypher"])
+        yield event
+
+
+# --- 2d. Session entity context ---
+# Anchors resolved in a session are kept with their neighbourhood, and
+# follow-ups that refer to them ("what parts does it have?") are rewritten to
+# name them; see entity_context.py. Needs the tool's session state, so it only
+# applies to questions asked through the agent.
+def _entity_session(tool_context):
+    if not entity_context.ENTITY_CONTEXT or tool_context is None:
+        return None
+    return entity_context.SessionContext(tool_context.state)
+
+
+def _follow_up(session, query):
+    """The question with references to the session's focus entity spelled out."""
+    if session is None:
+        return query
+    rewritten = session.rewrite(query)
+    if rewritten != query:
+        print(f"Follow-up rewritten: {query!r} -> {rewritten!r}")
+    session.observe(rewritten)
+    return rewritten
+
+
+async def _template_rows(match, session):
+    """
+    (cypher, rows) for a routed question. With a session, an anchored template
+    resolves its anchor through the entity context and is answered from the
+    cached neighbourhood, or by its Cypher starting at the resolved node.
+    """
+    template = match.template
+    if session is None or not template.anchor_label:
+        return match.cypher, await _execute(match.cypher, match.params, f"template:{match.family}")
+    versions = answer_cache.versions()
+    with stage("knowledge_graph", "entity_context") as s:
+        entity, source = await session.resolve(match.params["anchor"], template.anchor_label, async_graph.get(), versions)
+        rows = entity_context.rows_from_context(template, entity, versions, answer_cache.ttl_for(template.labels)) \
+            if entity else []
+        s.set(source=source, from_context=rows is not None)
+    print(f"Entity context: {match.params['anchor']!r} from {source} {entity_context.store.stats()}")
+    if rows is None:
+        rows = await _execute(template.cypher_by_id, {"anchor_id": entity["id"]}, f"template:{match.family}:by_id")
+    return template.cypher_by_id, rows
+
+
 # --- 3. Build the ADK FunctionTool ---
-def query_knowledge_graph(query: str) -> str:
+# The tools are coroutines: ADK awaits them directly, so a session waiting on
+# Gemini or Neo4j doesn't hold a worker thread. Each answer pipeline is an
+# async generator of events (see streaming.py): the tools drain it, and the
+# streaming agents forward rows and tokens as they arrive.
+async def _stream_answer(question, cypher, rows, path):
+    yield {"type": "rows", "cypher": cypher, "rows": rows}
+    # Same rows as an earlier answer to this question: reuse it.
+    cached = answer_cache.lookup_context("knowledge_graph", question, rows) if ANSWER_CACHE and rows else None
+    if cached is not None:
+        _record_path("answer_cache:context")
+        yield {"type": "answer", "text": cached, "path": "answer_cache:context"}
+        return
+    parts = []
+    with stage("knowledge_graph", "qa_answer", path=path) as s:
+        async for token in qa_answer_chain.get().astream({"question": question, "context": rows}):
+            parts.append(token)
+            yield {"type": "token", "text": token}
+        s.set(size=sum(map(len, parts)))
+    _record_path(path)
+    yield {"type": "answer", "text": "".join(parts) or "No answer found.", "path": path}
+
+
+def _extract_cypher(text):
+    """Strip a ``` fence (optionally tagged cypher) around generated Cypher."""
+    match = re.search(r"```(?:cypher)?(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    return (match.group(1) if match else text).strip()
+
+
+# Generates Cypher from an already assembled prompt.
+cypher_generator = Lazy("cypher_generator", lambda: resources.cypher_llm.get() | StrOutputParser())
+
+
+async def _generate_cypher(query, query_embedding=None, rejected=None):
+    """
+    The generation half of GraphCypherQAChain, so the rows can be streamed
+    before the summary. `rejected` is a (cypher, problem) pair from
+    cypher_guard, appended to the prompt for a second attempt.
+    """
+    chain = qa_chain.get()
+    feedback = prompt.CYPHER_FEEDBACK_TEMPLATE.format(cypher=rejected[0], problem=rejected[1]) if rejected else ""
+    built = None
+    if CYPHER_DYNAMIC_PROMPT:
+        built = await cypher_prompt_builder.abuild(
+            query, graph.get().structured_schema, query_embedding, embeddings=embeddings.get()
+        )
+    with stage("knowledge_graph", "cypher_generation") as s:
+        if built:
+            print(f"Cypher prompt: ~{built.tokens} tokens (full template ~{built.baseline_tokens}, "
+                  f"-{built.reduction:.0%}), labels {built.labels}")
+            s.set(prompt_tokens=built.tokens, dynamic_prompt=True)
+            generated = await cypher_generator.get().ainvoke(built.text + feedback)
+        else:
+            s.set(dynamic_prompt=False)
+            generated = await chain.cypher_generation_chain.ainvoke(
+                {"question": query + feedback, "schema": chain.graph_schema}
+            )
+            generated = generated[chain.cypher_generation_chain.output_key]
+        s.set(size=len(generated), retry=bool(rejected))
+    cypher = _extract_cypher(generated)
+    if chain.cypher_query_corrector:
+        cypher = chain.cypher_query_corrector(cypher)
+    print(f"Generated Cypher:\n{cypher}")
+    return cypher
+
+
+async def _guarded_cypher(query, query_embedding, limit):
+    """
+    Generated Cypher that passed cypher_guard, regenerating once with the
+    rejection as feedback. Returns (cypher, None) or (None, problem).
+    """
+    cypher = await _generate_cypher(query, query_embedding)
+    if not cypher_guard.CYPHER_GUARD:
+        return cypher, None
+    for attempt in range(2):
+        try:
+            with stage("knowledge_graph", "cypher_guard", attempt=attempt):
+                return await cypher_guard.aguard(cypher, graph.get().structured_schema, async_graph.get(), limit), None
+        except cypher_guard.CypherRejected as e:
+            print(f"Generated Cypher rejected: {e}")
+            if attempt:
+                return None, str(e)
+            cypher = await _generate_cypher(query, query_embedding, rejected=(cypher, str(e)))
+
+
+async def _execute(cypher, params, source):
+    with stage("knowledge_graph", "cypher_execution", source=source) as s:
+        rows = await async_graph.get().query(cypher, params=params, name=source)
+        s.set(size=len(rows))
+    return rows
+
+
+def stream_knowledge_graph(query: str, session=None):
+    return _cached("knowledge_graph", query, _stream_knowledge_graph(query, session), _graph_labels)
 
+
+async def _stream_knowledge_graph(query: str, session=None):
     print(f"Querying knowledge graph with: {query}")
-    try:
-        result = qa_chain.invoke({"query": query})
 
-        return result.get('result', "No answer found.")
+    # Fast path: known question families run pre-written Cypher with no LLM call.
+    match = cypher_templates.route(query)
+    if match:
+        cypher, rows = await _template_rows(match, session)
+        if rows:
+            yield {"type": "rows", "cypher": cypher, "rows": rows}
+            _record_path(f"template:{match.family}")
+            yield {"type": "answer", "text": cypher_templates.format_rows(match, rows), "path": f"template:{match.family}"}
+            return
+        print(f"Template '{match.family}' returned no rows, falling back to the LLM chain.")
+
+    try:
+        with stage("knowledge_graph", "embedding"):
+            query_embedding = await embeddings.get().aembed_query(query)
+    except Exception as e:
+        print(f"Could not embed query for the Cypher cache: {e}")
+        query_embedding = None
+
+    top_k = qa_chain.get().top_k
+    cached_cypher, cached_key = cypher_cache.lookup(query, query_embedding)
+    if cached_cypher:
+        print(f"Cypher cache hit {cypher_cache.stats()}: {cached_cypher}")
+        try:
+            context = (await _execute(cached_cypher, None, "cypher_cache"))[:top_k]
+        except Exception as e:
+            print(f"Cached Cypher failed, regenerating: {e}")
+            cypher_cache.discard(cached_key)
+        else:
+            async for event in _stream_answer(query, cached_cypher, context, "cypher_cache"):
+                yield event
+            return
+
+    cypher, problem = await _guarded_cypher(query, query_embedding, top_k)
+    if problem:
+        # Both attempts were rejected: say why rather than summarizing nothing.
+        yield {"type": "rows", "cypher": None, "rows": []}
+        _record_path("cypher_rejected")
+        yield {"type": "answer", "text": f"Sorry, I could not build a safe query for that question. {problem}",
+               "path": "cypher_rejected"}
+        return
+    context = (await _execute(cypher, None, "generated_cypher"))[:top_k] if cypher else []
+
+    # Only remember Cypher that actually found something.
+    if context:
+        cypher_cache.store(query, cypher, query_embedding)
+
+    async for event in _stream_answer(query, cypher, context, "llm"):
+        yield event
+
+
+async def query_knowledge_graph(query: str, tool_context: ToolContext = None) -> str:
+    try:
+        with tool_span("query_knowledge_graph"):
+            session = _entity_session(tool_context)
+            query = _follow_up(session, query)
+            return await streaming.collect(streaming.timed_stream("knowledge_graph", stream_knowledge_graph(query, session)))
     except Exception as e:
         print(f"Error querying knowledge graph: {e}")
         return "Sorry, I encountered an error while trying to access the knowledge graph."
@@ -98,73 +371,194 @@ extract_equipment_prompt = PromptTemplate.from_template(
     "Equipment Name:"
 )
 
-equipment_extractor_chain = extract_equipment_prompt | llm | StrOutputParser()
+equipment_extractor_chain = Lazy(
+    "equipment_extractor_chain", lambda: extract_equipment_prompt | llm.get() | StrOutputParser()
+)
+manuals_answer_chain = Lazy("manuals_answer_chain", lambda: MANUALS_QA_PROMPT | llm.get())
+
+# The LLM equipment extraction costs a round-trip and is off by default: the
+# hybrid query matches the question itself against equipment names.
+MANUALS_EXTRACT_EQUIPMENT = os.getenv("MANUALS_EXTRACT_EQUIPMENT", "0") == "1"
+
+# Optional local retrieval instead of the Neo4j indexes: a memory-mapped chunk
+# store kept in sync by setup/sync_chunks.py, or an in-process ANN index built
+# from exported chunk embeddings (see setup/export_chunks.py).
+MANUALS_CHUNK_STORE = os.getenv("MANUALS_CHUNK_STORE")
+MANUALS_ANN_INDEX = os.getenv("MANUALS_ANN_INDEX")
+
+
+def _local_chunk_index():
+    if MANUALS_CHUNK_STORE:
+        return chunk_store.ChunkStore(MANUALS_CHUNK_STORE)
+    if MANUALS_ANN_INDEX:
+        return manual_retrieval.LocalANNIndex.from_npz(MANUALS_ANN_INDEX)
+    return None
+
+
+local_chunk_index = Lazy("local_chunk_index", _local_chunk_index)
+
 
+def _chunk_context(chunk):
+    if chunk.get("source"):
+        return f"[{os.path.basename(chunk['source'])}, page {chunk.get('page')}]\n{chunk['text']}"
+    return chunk["text"]
 
-def answer_from_manuals(query: str) -> str:
+
+async def _extract_equipment(query):
+    with stage("manuals", "equipment_extraction") as s:
+        name = await equipment_extractor_chain.get().ainvoke({"query": query})
+        s.set(size=len(name))
+    return name
+
+
+async def _embed_manuals_query(query):
+    with stage("manuals", "embedding"):
+        return await embeddings.get().aembed_query(query)
+
+
+def stream_manuals(query: str, equipment=None):
+    return _cached("manuals", query, _stream_manuals(query, equipment), lambda cypher: MANUALS_LABELS)
+
+
+async def _stream_manuals(query: str, equipment=None):
+    print(f"Searching manuals with vector search for: {query}")
+
+    if equipment:
+        # The session already knows which equipment the question is about.
+        equipment_name, query_embedding = equipment, await _embed_manuals_query(query)
+        print(f"Hybrid Search: equipment '{equipment_name}' from the session's entity context")
+    elif MANUALS_EXTRACT_EQUIPMENT:
+        # The equipment extraction and the query embedding are independent, so overlap them.
+        equipment_name, query_embedding = await asyncio.gather(
+            _extract_equipment(query),
+            _embed_manuals_query(query),
+        )
+        print(f"Hybrid Search: Identified equipment '{equipment_name}'")
+    else:
+        equipment_name, query_embedding = None, await _embed_manuals_query(query)
+
+    # Vector and full-text retrieval in one query, fused and boosted by matching equipment
+    with stage("manuals", "vector_search") as s:
+        if local_chunk_index.get() is not None:
+            s.set(index="local")
+            results = local_chunk_index.get().search(query_embedding, anchor_text=equipment_name or query)
+        else:
+            s.set(index="neo4j")
+            results = await manual_retrieval.ahybrid_search(
+                async_graph.get(), query, query_embedding, anchor_text=equipment_name
+            )
+        s.set(size=len(results))
+    for r in results:
+        print(f"  {r['score']:.4f} {r['source']} p.{r['page']} {r['scores']} {r['equipment']}")
+
+    # Extract the text from the results and collect unique sources
+    context = "\\n\\n---\\n\\n".join([_chunk_context(r) for r in results])
+
+    if not context:
+        yield {"type": "answer", "text": "Sorry, I could not find any relevant information in the manuals.", "path": "manuals"}
+        return
+
+    rows = [{k: r[k] for k in ("id", "source", "page", "score", "equipment")} for r in results]
+    yield {"type": "rows", "cypher": None, "rows": rows}
+    cached = answer_cache.lookup_context("manuals", query, rows) if ANSWER_CACHE else None
+    if cached is not None:
+        print("Manuals answer reused for an unchanged context.")
+        yield {"type": "answer", "text": cached, "path": "answer_cache:context"}
+        return
+
+    # Use the LLM to synthesize a final answer from the context, token by token
+    parts = []
+    with stage("manuals", "manuals_synthesis", context_chars=len(context)) as s:
+        async for chunk in manuals_answer_chain.get().astream({"context": context, "question": query}):
+            parts.append(chunk.content)
+            yield {"type": "token", "text": chunk.content}
+        s.set(size=sum(map(len, parts)))
+    yield {"type": "answer", "text": "".join(parts), "path": "manuals"}
+
+
+async def answer_from_manuals(query: str, tool_context: ToolContext = None) -> str:
     """
     Use this tool to answer questions that can be found in technical manuals,
     datasheets, or other documents. It is best for "how-to" questions,
     troubleshooting, or finding specific technical specifications.
     """
-    print(f"Searching manuals with vector search for: {query}")
-
-    
-
     try:
-        equipment_name = equipment_extractor_chain.invoke({"query": query})
-        if not equipment_name:
-            return "Could not identify a specific piece of equipment in the query."
-
-        print(f"Hybrid Search: Identified equipment '{equipment_name}'")
-        # This is a pure vector search query
-        vector_search_query = """
-            CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', $equipment_name) YIELD node AS equipment, score
-            WHERE 'Equipment' IN labels(equipment)
-            WITH equipment ORDER BY score DESC LIMIT 1
-            MATCH (equipment)-[:HAS_CHUNK]->(chunk)
-            WITH chunk, gds.similarity.cosine(chunk.embedding, $question_embedding) AS similarity
-            RETURN chunk.text AS text
-            ORDER BY similarity DESC
-            LIMIT 10
-        """
-
-        # Generate an embedding for the user's query
-        query_embedding = embeddings.embed_query(query)
-
-        # Run the vector search
-        results = graph.query(vector_search_query, params={'equipment_name': equipment_name, 'question_embedding': query_embedding})
-        
-        # Extract the text from the results and collect unique sources
-        context = "\\n\\n---\\n\\n".join([r['text'] for r in results])
-        
-        if not context:
-            return "Sorry, I could not find any relevant information in the manuals."
-
-        # Use the LLM to synthesize a final answer from the context
-        qa_chain = MANUALS_QA_PROMPT | llm
-
-        answer = qa_chain.invoke({
-            "context": context,
-            "question": query
-        })
-
-        return answer.content
-        
+        with tool_span("answer_from_manuals"):
+            session = _entity_session(tool_context)
+            query = _follow_up(session, query)
+            equipment = session.mentioned(query, label="Equipment") if session else None
+            return await streaming.collect(streaming.timed_stream("manuals", stream_manuals(query, equipment)))
     except Exception as e:
         print(f"Error in answer_from_manuals tool: {e}")
         return "Sorry, I encountered an error while searching the manuals."
 
 manuals_tool = FunctionTool(answer_from_manuals)
 
+# --- 4b. Speculative routing ---
+# With SPECULATIVE_ROUTING=1 the root agent also gets `answer_building_question`,
+# which classifies the question locally and, when it's ambiguous, runs the graph
+# and manuals pipelines concurrently and keeps the first confident answer.
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "0") == "1"
+speculative_router = SpeculativeRouter(
+    {"knowledge_graph": stream_knowledge_graph, "manuals": stream_manuals}, embeddings
+)
+
+
+async def answer_building_question(query: str, tool_context: ToolContext = None) -> str:
+    """
+    Use this tool when it is unclear whether the answer is in the knowledge
+    graph (assets, locations, readings, work orders) or in the technical
+    manuals (procedures, troubleshooting). It searches both as needed.
+    """
+    try:
+        with tool_span("answer_building_question"):
+            return await speculative_router.answer(_follow_up(_entity_session(tool_context), query))
+    except Exception as e:
+        print(f"Error in answer_building_question tool: {e}")
+        return "Sorry, I encountered an error while answering."
+
+speculative_tool = FunctionTool(answer_building_question)
+
 
 # --- 5. Integrate the Tool into the ADK Agent ---
 ROOT_AGENT_INSTRUCTIONS = prompt.ROOT_AGENT_INSTRUCTIONS
 
+# With STREAM_ANSWERS=1 the root agent can also transfer a question to agents
+# that stream the answer (rows first, then tokens) as partial events, instead
+# of waiting for the whole tool result. Run with RunConfig(streaming_mode=SSE).
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "0") == "1"
+
+streaming_agents = [
+    streaming.StreamingAnswerAgent(
+        name="knowledge_graph_streamer",
+        description="Streams answers to questions about building assets, locations, measurements and work orders from the knowledge graph.",
+        stream=stream_knowledge_graph,
+        error_message="Sorry, I encountered an error while trying to access the knowledge graph.",
+    ),
+    streaming.StreamingAnswerAgent(
+        name="manuals_streamer",
+        description="Streams answers to how-to, troubleshooting and specification questions from the technical manuals.",
+        stream=stream_manuals,
+        error_message="Sorry, I encountered an error while searching the manuals.",
+    ),
+] if STREAM_ANSWERS else []
+
 root_agent = Agent(
-    model="gemini-2.5-flash",
+    model=gateway.adk_model("gemini-2.5-flash"),
     name='building_engineer_assistant',
     description='An intelligent assistant for building engineers that can answer complex questions by querying a knowledge graph of building assets.',
-    tools=[knowledge_graph_tool, manuals_tool, AgentTool(agent=ticket_agent)],
-    instruction=ROOT_AGENT_INSTRUCTIONS
-)
\ No newline at end of file
+    tools=[knowledge_graph_tool, manuals_tool, AgentTool(agent=ticket_agent, skip_summarization=True)]
+          + ([speculative_tool] if SPECULATIVE_ROUTING else []),
+    sub_agents=streaming_agents,
+    # Replies to an open ticket's questions go to its state machine without a routing turn.
+    before_agent_callback=continue_ticket,
+    instruction=ROOT_AGENT_INSTRUCTIONS + (prompt.SPECULATIVE_ROUTING_INSTRUCTIONS if SPECULATIVE_ROUTING else "")
+)
+
+resources.registry.extend([
+    qa_chain, qa_answer_chain, cypher_generator, equipment_extractor_chain, manuals_answer_chain, local_chunk_index,
+])
+
+# Build clients and connect in the background so the first question doesn't pay for it.
+if os.getenv("AGENT_WARMUP", "1") == "1":
+    resources.warm_up(background=True)
\ No newline at end of file
@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+from . import cypher_templates
+from . import gateway
+from . import telemetry
+
+# Bulk question answering for reports and nightly digests. Questions are
+# deduplicated; template questions of the same family run as one UNWIND
+# execution per group (cypher_templates.batched_cypher) and are answered
+# without an LLM; the rest go through the knowledge-graph pipeline
+# concurrently, with new pipelines started no faster than the rate limit.
+# Results are written as JSONL, one line per input question.
+#
+#   python -m KnowledgeGraphADK.batch questions.txt --out answers.jsonl
+#   python -m KnowledgeGraphADK.batch questions.jsonl --concurrency 16 --rate 4 --compare
+
+# --- Configuration ---
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# LLM-path questions started per second (each makes up to three LLM calls).
+RATE = float(os.getenv("BATCH_RATE", "4"))
+# Items per grouped UNWIND execution.
+GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "200"))
+
+# (tool, stage) observations counted as the cost of a run.
+COST_STAGES = {
+    "llm_calls": [("knowledge_graph", "cypher_generation"), ("knowledge_graph", "qa_answer")],
+    "graph_executions": [("knowledge_graph", "cypher_execution")],
+    "embedding_calls": [("knowledge_graph", "embedding")],
+}
+
+
+def normalize(question: str) -> str:
+    """Key used for deduplication: case, whitespace and trailing punctuation don't matter."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.! ").casefold()
+
+
+def read_questions(path):
+    """(id, question) pairs from a text file (one per line) or JSONL with a "question" field; '-' is stdin."""
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                yield str(record.get("id", n)), record["question"]
+            else:
+                yield str(n), line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class RateLimiter:
+    """Token bucket: acquire() waits until a token is available; `rate` tokens/s, up to `burst` saved."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def cost_snapshot() -> dict:
+    return {name: sum(telemetry.stage_duration.count(tool=tool, stage=stage) for tool, stage in stages)
+            for name, stages in COST_STAGES.items()}
+
+
+def _cost_since(before):
+    after = cost_snapshot()
+    return {name: after[name] - before[name] for name in after}
+
+
+async def _answer_templates(agent, jobs, group_size):
+    """Run routed jobs grouped per family; returns the keys that found nothing."""
+    by_family = {}
+    for key, job in jobs.items():
+        by_family.setdefault(job["match"].family, []).append(key)
+    empty = []
+    for family, keys in by_family.items():
+        template = jobs[keys[0]]["match"].template
+        if not jobs[keys[0]]["match"].params:
+            # No parameters (e.g. system_mode): one plain execution answers them all.
+            rows = await agent._execute(template.cypher, None, f"batch:{family}")
+            grouped = {key: rows for key in keys}
+        else:
+            grouped = {key: [] for key in keys}
+            for start in range(0, len(keys), group_size):
+                group = keys[start:start + group_size]
+                items = [{"key": key, **jobs[key]["match"].params} for key in group]
+                try:
+                    rows = await agent._execute(cypher_templates.batched_cypher(template), {"batch": items},
+                                                f"batch:{family}")
+                except Exception as e:
+                    # e.g. a server without CALL subqueries: run the group one question at a time.
+                    print(f"Grouped {family} execution failed, running {len(group)} queries singly: {e}")
+                    rows = [{**row, "_key": key} for key in group
+                            for row in await agent._execute(template.cypher, jobs[key]["match"].params, f"batch:{family}")]
+                for row in rows:
+                    grouped[row.pop("_key")].append({k: v for k, v in row.items() if k != "item"})
+        for key, rows in grouped.items():
+            if not rows:
+                empty.append(key)
+                continue
+            match = jobs[key]["match"]
+            jobs[key].update(answer=cypher_templates.format_rows(match, rows), rows=rows, cypher=match.cypher,
+                             path=f"batch_template:{family}")
+    return empty
+
+
+async def _answer_llm(agent, job, semaphore, limiter):
+    async with semaphore:
+        await limiter.acquire()
+        try:
+            async for event in agent.stream_knowledge_graph(job["question"]):
+                if event["type"] == "rows":
+                    job.update(rows=event["rows"], cypher=event["cypher"])
+                elif event["type"] == "answer":
+                    job.update(answer=event["text"], path=event.get("path"))
+        except Exception as e:
+            print(f"Batch question failed: {job['question']!r}: {e}")
+            job.update(answer=None, path="error", error=str(e))
+
+
+async def run_batch(agent, questions, concurrency=CONCURRENCY, rate=RATE, group_size=GROUP_SIZE):
+    """
+    Answer (id, question) pairs. Returns (results in input order, stats).
+    `agent` is the agent module, whose pipeline and caches are used.
+    """
+    started = time.perf_counter()
+    before = cost_snapshot()
+    questions = list(questions)
+    jobs, first_id = {}, {}
+    for question_id, question in questions:
+        key = normalize(question)
+        if key not in jobs:
+            jobs[key] = {"question": question, "match": cypher_templates.route(question), "rows": [], "cypher": None}
+            first_id[key] = question_id
+
+    routed = {key: job for key, job in jobs.items() if job["match"]}
+    fallback = await _answer_templates(agent, routed, group_size) if routed else []
+    llm_keys = [key for key, job in jobs.items() if not job["match"]] + fallback
+    semaphore, limiter = asyncio.Semaphore(concurrency), RateLimiter(rate, burst=concurrency)
+    # Batch lane: interactive questions sharing this process's gateway go first.
+    with gateway.lane("batch"):
+        await asyncio.gather(*(_answer_llm(agent, jobs[key], semaphore, limiter) for key in llm_keys))
+
+    results = []
+    for question_id, question in questions:
+        key = normalize(question)
+        job = jobs[key]
+        results.append({
+            "id": question_id,
+            "question": question,
+            "answer": job.get("answer"),
+            "path": job.get("path"),
+            "cypher": job.get("cypher"),
+            "rows": job.get("rows"),
+            "duplicate_of": first_id[key] if first_id[key] != question_id else None,
+            **({"error": job["error"]} if "error" in job else {}),
+        })
+    elapsed = time.perf_counter() - started
+    stats = {
+        "questions": len(questions),
+        "unique": len(jobs),
+        "template_grouped": len(routed) - len(fallback),
+        "llm_pipeline": len(llm_keys),
+        "errors": sum(1 for job in jobs.values() if job.get("path") == "error"),
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(len(questions) / elapsed, 2) if elapsed else None,
+        "cost": _cost_since(before),
+    }
+    return results, stats
+
+
+async def run_sequential(agent, questions):
+    """The naive loop: one query_knowledge_graph call per question, in order."""
+    started = time.perf_counter()
+    before = cost_snapshot()
+    questions = list(questions)
+    for _, question in questions:
+        await agent.query_knowledge_graph(question)
+    elapsed = time.perf_counter() - started
+    return {
+        "questions": len(questions),
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(len(questions) / elapsed, 2) if elapsed else None,
+        "cost": _cost_since(before),
+    }
+
+
+def compare(batch_stats, sequential_stats) -> dict:
+    return {
+        "speedup": round(sequential_stats["elapsed_s"] / batch_stats["elapsed_s"], 2) if batch_stats["elapsed_s"] else None,
+        **{f"{name}_saved": sequential_stats["cost"][name] - batch_stats["cost"][name] for name in COST_STAGES},
+    }
+
+
+def fresh(agent):
+    """Empty the Cypher and answer caches so runs are comparable."""
+    agent.cypher_cache.clear()
+    agent.answer_cache.clear()
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result, default=str) + "\n")
+
+
+async def _main(args):
+    from . import agent
+
+    questions = list(read_questions(args.questions))
+    report = {}
+    if args.compare:
+        fresh(agent)
+        report["sequential"] = await run_sequential(agent, questions)
+        fresh(agent)
+    results, report["batch"] = await run_batch(agent, questions, concurrency=args.concurrency, rate=args.rate,
+                                               group_size=args.group_size)
+    if args.compare:
+        report["comparison"] = compare(report["batch"], report["sequential"])
+    write_results(results, args.out)
+    print(f"Wrote {len(results)} answers to {args.out}.")
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions in bulk.")
+    parser.add_argument("questions", help="Text file (one question per line) or JSONL with a \"question\" field; '-' reads stdin.")
+    parser.add_argument("--out", default="answers.jsonl", help="JSONL output, one line per input question.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE, help="LLM-path questions started per second; 0 is unlimited.")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE)
+    parser.add_argument("--compare", action="store_true",
+                        help="Run the naive sequential loop first and report throughput and cost against it.")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Batch question answering (batch.py) against the naive sequential loop, with
+# the same stubbed LLM, embedding and in-memory graph delays as harness.py.
+# Questions are drawn with replacement from a pool of `--unique` knowledge-graph
+# questions, so a digest-sized file has the repeats real report files have.
+#
+#   python -m KnowledgeGraphADK.benchmarks.batch_qa --questions 300 --unique 150 --rate 20
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+from .harness import StageRecorder, load_agent, reset
+from .stubs import DelayedEmbeddings
+from .synthetic import synthetic_building, workload
+
+
+async def run(args):
+    from .. import batch
+
+    agent = load_agent()
+    recorder = StageRecorder()
+    building = synthetic_building(n_equipment=args.equipment, n_rooms=max(1, args.equipment // 5),
+                                  embed=DelayedEmbeddings().embed_documents, seed=args.seed)
+    pool = [question for _, question in workload(building, args.unique, mix=(args.template_share,
+                                                                               1 - args.template_share, 0.0),
+                                                   seed=args.seed)]
+    rng = random.Random(args.seed)
+    questions = [(str(i), rng.choice(pool)) for i in range(args.questions)]
+
+    reset(agent, args, recorder, building)
+    sequential = await batch.run_sequential(agent, questions)
+    reset(agent, args, recorder, building)
+    results, batched = await batch.run_batch(agent, questions, concurrency=args.concurrency, rate=args.rate,
+                                             group_size=args.group_size)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "sequential": sequential,
+        "batch": batched,
+        "comparison": batch.compare(batched, sequential),
+        "paths": {path: sum(1 for r in results if r["path"] == path) for path in sorted({r["path"] for r in results})},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch QA throughput and cost against the sequential loop.")
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--unique", type=int, default=150)
+    parser.add_argument("--template-share", type=float, default=0.6)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=20)
+    parser.add_argument("--group-size", type=int, default=200)
+    parser.add_argument("--equipment", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", choices=("memory",), default="memory")
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--cypher-llm-latency", type=float, default=0.9)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.15)
+    parser.add_argument("--graph-latency", type=float, default=0.02)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    comparison = result["comparison"]
+    print(f"sequential {result['sequential']['elapsed_s']}s, batch {result['batch']['elapsed_s']}s "
+          f"({comparison['speedup']}x), {comparison['llm_calls_saved']} LLM calls saved", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
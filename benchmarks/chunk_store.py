@@ -0,0 +1,125 @@
+# Memory footprint, latency and recall of the memory-mapped chunk store in
+# float32 and int8 modes, against the in-memory LocalANNIndex, over synthetic
+# manual chunks with clustered embeddings.
+#
+#   python -m KnowledgeGraphADK.benchmarks.chunk_store --chunks 100000 --dim 768
+#   python -m KnowledgeGraphADK.benchmarks.chunk_store --out chunk_store.json
+#
+# "heap_bytes" is what opening the store allocates on the Python heap (the
+# mapped matrix and texts are not included; the OS pages them in on demand).
+# Recall is top-k overlap with an exact float32 search.
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..chunk_store import ChunkStore, write_store
+from ..manual_retrieval import LocalANNIndex
+from .synthetic import EQUIPMENT_KINDS, MANUAL_TOPICS
+
+
+def chunks(n, dim, n_equipment=500, n_topics=64, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    for i in range(n):
+        name = f"{EQUIPMENT_KINDS[i % len(EQUIPMENT_KINDS)]}-{i % n_equipment}"
+        topic = int(rng.integers(n_topics))
+        yield {
+            "id": f"chunk-{i}",
+            "text": f"{name} manual. {MANUAL_TOPICS[topic % len(MANUAL_TOPICS)]}",
+            "embedding": topics[topic] + 0.6 * rng.standard_normal(dim).astype(np.float32),
+            "source": f"manuals/{name.split('-')[0].lower()}.pdf", "page": i % 200 + 1, "equipment": [name],
+        }
+
+
+def _timed(search, queries, top_k):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([row["id"] for row in search(query, anchor_text=None, top_k=top_k)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return results, {"p50": round(statistics.median(latencies), 3),
+                     "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3)}
+
+
+def _recall(results, truth):
+    return round(statistics.mean(len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)), 4)
+
+
+def run(args):
+    data = list(chunks(args.chunks, args.dim, seed=args.seed))
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [data[int(i)]["embedding"] + 0.3 * rng.standard_normal(args.dim).astype(np.float32)
+               for i in rng.integers(len(data), size=args.queries)]
+    root = tempfile.mkdtemp(prefix="chunk_store_")
+    result = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {k: v for k, v in vars(args).items() if k != "out"}, "modes": {}}
+    try:
+        truth = None
+        for dtype in ("float32", "int8"):
+            path = os.path.join(root, dtype)
+            started = time.perf_counter()
+            write_store(path, data, dtype=dtype)
+            written = time.perf_counter() - started
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            store = ChunkStore(path)
+            opened = time.perf_counter() - started
+            heap = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results, latency = _timed(store.search, queries, args.top_k)
+            truth = truth or results
+            result["modes"][dtype] = {
+                "files": store.footprint(), "embedding_bytes": store.vectors.nbytes, "heap_bytes": heap,
+                "write_s": round(written, 3), "open_ms": round(opened * 1000, 3), "search_ms": latency,
+                "recall_vs_float32": _recall(results, truth),
+            }
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = LocalANNIndex([c["embedding"] for c in data], [c["text"] for c in data],
+                              [c["equipment"] for c in data], [c["source"] for c in data], [c["page"] for c in data])
+        built = time.perf_counter() - started
+        heap = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        ids = {i: c["id"] for i, c in enumerate(data)}
+        results, latency = _timed(lambda q, **kw: [{"id": ids[r["id"]]} for r in index.search(q, **kw)],
+                                  queries, args.top_k)
+        result["modes"]["local_ann_index"] = {
+            "embedding_bytes": index.vectors.nbytes, "heap_bytes": heap, "build_s": round(built, 3),
+            "search_ms": latency, "recall_vs_float32": _recall(results, truth),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Footprint and latency of the memory-mapped chunk store.")
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
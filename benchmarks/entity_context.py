@@ -0,0 +1,116 @@
+# Follow-up conversations about one asset with and without the session entity
+# context (entity_context.py). The baseline names the equipment in every
+# question and resolves it with a full-text lookup each time; the session run
+# asks the same questions with pronouns and bare follow-ups, resolving the
+# anchor once with its neighbourhood. Same stubbed LLM, embedding and
+# in-memory graph delays as harness.py; answers of the two runs are compared.
+#
+#   python -m KnowledgeGraphADK.benchmarks.entity_context --conversations 50
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from .harness import StageRecorder, load_agent, reset
+from .stubs import DelayedEmbeddings
+from .synthetic import synthetic_building
+
+# (baseline question, follow-up form asked in a session)
+CONVERSATION = [
+    ("Where is {name}?", "Where is {name}?"),
+    ("What parts does {name} have?", "What parts does it have?"),
+    ("Are there any active alarms on {name}?", "Any active alarms?"),
+    ("Show me the work orders for {name}", "Show me the work orders for it"),
+    ("What are the maintenance routines for {name}?", "What are the maintenance routines for it?"),
+    ("Who manufactured {name}?", "Who manufactured it?"),
+]
+
+
+def _count(telemetry, tool, stage):
+    return telemetry.stage_duration.count(tool=tool, stage=stage)
+
+
+async def converse(agent, names, with_session):
+    from .. import telemetry
+
+    graph = agent.resources.async_graph.get()
+    before = {"graph_queries": graph.queries,
+              "llm_calls": _count(telemetry, "knowledge_graph", "cypher_generation")
+              + _count(telemetry, "knowledge_graph", "qa_answer")}
+    answers = []
+    started = time.perf_counter()
+    for name in names:
+        tool_context = SimpleNamespace(state={}) if with_session else None
+        for baseline, follow_up in CONVERSATION:
+            question = (follow_up if with_session else baseline).format(name=name)
+            answers.append(await agent.query_knowledge_graph(question, tool_context=tool_context))
+    elapsed = time.perf_counter() - started
+    questions = len(names) * len(CONVERSATION)
+    llm_calls = _count(telemetry, "knowledge_graph", "cypher_generation") + _count(telemetry, "knowledge_graph", "qa_answer")
+    return answers, {
+        "questions": questions,
+        "elapsed_s": round(elapsed, 3),
+        "mean_latency_ms": round(elapsed / questions * 1000, 2),
+        "graph_queries": graph.queries - before["graph_queries"],
+        "llm_calls": llm_calls - before["llm_calls"],
+    }
+
+
+async def run(args):
+    from .. import entity_context
+
+    agent = load_agent()
+    recorder = StageRecorder()
+    building = synthetic_building(n_equipment=args.equipment, n_rooms=max(1, args.equipment // 5),
+                                  embed=DelayedEmbeddings().embed_documents, seed=args.seed)
+    names = [e["name"] for e in random.Random(args.seed).sample(building.equipment, args.conversations)]
+
+    reset(agent, args, recorder, building)
+    baseline_answers, baseline = await converse(agent, names, with_session=False)
+    reset(agent, args, recorder, building)
+    entity_context.store.clear()
+    session_answers, session = await converse(agent, names, with_session=True)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "baseline": baseline,
+        "entity_context": {**session, "store": entity_context.store.stats()},
+        "graph_queries_saved": baseline["graph_queries"] - session["graph_queries"],
+        "speedup": round(baseline["elapsed_s"] / session["elapsed_s"], 2) if session["elapsed_s"] else None,
+        "answers_match": sum(a == b for a, b in zip(baseline_answers, session_answers)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow-up questions with and without the session entity context.")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--equipment", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", choices=("memory",), default="memory")
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--cypher-llm-latency", type=float, default=0.9)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.15)
+    parser.add_argument("--graph-latency", type=float, default=0.02)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    print(f"graph queries {result['baseline']['graph_queries']} -> {result['entity_context']['graph_queries']}, "
+          f"{result['baseline']['elapsed_s']}s -> {result['entity_context']['elapsed_s']}s, "
+          f"{result['answers_match']}/{result['baseline']['questions']} answers identical", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
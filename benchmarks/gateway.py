@@ -0,0 +1,153 @@
+# A batch job and interactive questions sharing one rate-limited model, with
+# and without the LLM gateway (gateway.py). The backend is a fake that raises
+# 429s past its quota (stubs.ThrottledChatModel). Without the gateway every
+# caller retries on its own with exponential backoff, as the clients did;
+# with it, calls share the token bucket, the adaptive concurrency limit and
+# the lanes, and duplicate prompts in flight are sent once.
+#
+#   python -m KnowledgeGraphADK.benchmarks.gateway --batch 200 --interactive 30
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from .stubs import ThrottledChatModel
+
+MODEL = "fake-gemini"
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+def workload(args):
+    """Batch prompts (with repeats) and interactive (arrival offset, prompt) pairs."""
+    rng = random.Random(args.seed)
+    batch = [f"batch question {rng.randrange(int(args.batch * (1 - args.duplicates)) or 1)}" for _ in range(args.batch)]
+    interactive = [(i * args.interactive_interval, f"interactive question {i}") for i in range(args.interactive)]
+    return batch, interactive
+
+
+async def naive_call(backend, prompt, args):
+    """The pre-gateway behaviour: each caller retries on its own."""
+    for attempt in range(args.retries + 1):
+        try:
+            return await backend.ainvoke(prompt)
+        except Exception as e:
+            if getattr(e, "code", None) != 429 or attempt == args.retries:
+                raise
+            await asyncio.sleep(args.backoff * 2 ** attempt * (0.5 + random.random()))
+
+
+async def run_mode(args, use_gateway):
+    from ..gateway import Gateway, GatewayChatModel, lane
+
+    backend = ThrottledChatModel(latency=args.latency, rate=args.backend_rate, max_concurrency=args.backend_concurrency,
+                                 knee=args.backend_knee, retry_after=args.retry_after, responses=["ok"])
+    gw = Gateway(rates={"*": args.gateway_rate or args.backend_rate}, max_retries=args.retries,
+                 retry_backoff=args.backoff)
+    client = GatewayChatModel(inner=backend, model=MODEL, gateway=gw)
+    call = (lambda prompt: client.ainvoke(prompt)) if use_gateway else (lambda prompt: naive_call(backend, prompt, args))
+    batch, interactive = workload(args)
+    latencies = {"batch": [], "interactive": []}
+    failures = {"batch": 0, "interactive": 0}
+
+    async def timed(kind, prompt):
+        started = time.perf_counter()
+        try:
+            await call(prompt)
+            latencies[kind].append(time.perf_counter() - started)
+        except Exception:
+            failures[kind] += 1
+
+    async def run_batch():
+        semaphore = asyncio.Semaphore(args.batch_concurrency)
+
+        async def one(prompt):
+            async with semaphore:
+                await timed("batch", prompt)
+
+        with lane("batch"):
+            await asyncio.gather(*(one(p) for p in batch))
+
+    async def run_interactive():
+        async def one(delay, prompt):
+            await asyncio.sleep(delay)
+            await timed("interactive", prompt)
+
+        await asyncio.gather(*(one(d, p) for d, p in interactive))
+
+    started = time.perf_counter()
+    await asyncio.gather(run_batch(), run_interactive())
+    elapsed = time.perf_counter() - started
+    result = {
+        "elapsed_s": round(elapsed, 3),
+        "backend_calls": backend.calls,
+        "backend_429s": backend.throttled,
+        "failed": failures,
+    }
+    for kind, values in latencies.items():
+        result[f"{kind}_p50_s"] = _percentile(values, 0.5)
+        result[f"{kind}_p95_s"] = _percentile(values, 0.95)
+        result[f"{kind}_mean_s"] = round(statistics.mean(values), 3) if values else None
+    if use_gateway:
+        result["gateway"] = gw.stats()
+    return result
+
+
+async def run(args):
+    naive = await run_mode(args, use_gateway=False)
+    gateway = await run_mode(args, use_gateway=True)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "naive": naive,
+        "gateway": gateway,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared model quota with and without the LLM gateway.")
+    parser.add_argument("--batch", type=int, default=200, help="Batch calls, all queued at the start.")
+    parser.add_argument("--duplicates", type=float, default=0.25, help="Share of batch prompts that repeat another.")
+    parser.add_argument("--batch-concurrency", type=int, default=32)
+    parser.add_argument("--interactive", type=int, default=30, help="Interactive calls, arriving at a steady pace.")
+    parser.add_argument("--interactive-interval", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.4, help="Backend seconds per call when not overloaded.")
+    parser.add_argument("--backend-rate", type=float, default=20, help="Calls per second before the backend 429s.")
+    parser.add_argument("--backend-concurrency", type=int, default=16, help="Calls in flight before the backend 429s.")
+    parser.add_argument("--backend-knee", type=int, default=8, help="Calls in flight past which the backend slows down.")
+    parser.add_argument("--retry-after", type=float, default=None, help="retry_after sent with each 429.")
+    parser.add_argument("--gateway-rate", type=float, default=None, help="Gateway token rate (default: --backend-rate).")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    naive, gateway = result["naive"], result["gateway"]
+    print(f"429s {naive['backend_429s']} -> {gateway['backend_429s']}, "
+          f"failed {sum(naive['failed'].values())} -> {sum(gateway['failed'].values())}, "
+          f"{naive['elapsed_s']}s -> {gateway['elapsed_s']}s, "
+          f"interactive p95 {naive['interactive_p95_s']}s -> {gateway['interactive_p95_s']}s, "
+          f"{gateway['gateway']['coalesced']} coalesced", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Offline benchmark and regression harness. Drives query_knowledge_graph and
+# answer_from_manuals against a synthetic building with deterministic fakes for
+# Gemini and the embeddings, and either an in-memory graph or a local Neo4j:
+#
+#   python -m KnowledgeGraphADK.benchmarks.harness --requests 300 --concurrency 1,8,32 --out bench.json
+#   python -m KnowledgeGraphADK.benchmarks.harness --graph neo4j --seed-neo4j --out bench-neo4j.json
+#   python -m KnowledgeGraphADK.benchmarks.harness --baseline bench.json --max-regression 0.15
+#
+# For each concurrency level it reports p50/p95/p99 latency per tool, throughput,
+# and p50/p95/p99 per stage (LLM calls, embedding calls, graph queries by kind).
+# With --baseline, p95 latency and throughput are compared against a previous
+# run and the exit code is 1 if any level regressed by more than --max-regression.
+import argparse
+import asyncio
+import contextlib
+import gc
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from .stubs import DelayedChatModel, DelayedEmbeddings, StubGraph
+from .synthetic import InMemoryGraph, seed_neo4j, synthetic_building, workload
+
+ANSWER = ("The requested equipment is operating normally; the latest readings are within range and "
+          "no further action is needed.")
+# Generated Cypher as the fake model returns it, fenced like Gemini output.
+GENERATED_CYPHER = [
+    "```cypher\nCALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'AHU-0 Supply Air Temperature') "
+    "YIELD node AS point, score\nWITH point ORDER BY score DESC LIMIT 1\n"
+    "RETURN point.network_point, point.latest_value, point.latest_recorded_time\n```",
+    "```cypher\nCALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'PP-1') YIELD node AS equipment, score\n"
+    "WHERE 'Equipment' IN labels(equipment)\nWITH equipment ORDER BY score DESC LIMIT 1\n"
+    "RETURN equipment.name, equipment.manufacturer\n```",
+]
+
+
+class StageRecorder:
+    """Durations per stage name, e.g. "llm:answer", "embed", "graph:template"."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def clear(self):
+        self.samples.clear()
+
+    def summary(self):
+        return {stage: percentiles(values) for stage, values in sorted(self.samples.items())}
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(data, 50)), 2),
+        "p95_ms": round(float(np.percentile(data, 95)), 2),
+        "p99_ms": round(float(np.percentile(data, 99)), 2),
+        "mean_ms": round(float(data.mean()), 2),
+    }
+
+
+def load_agent():
+    os.environ["AGENT_WARMUP"] = "0"
+    return importlib.import_module(__package__.rsplit(".", 1)[0] + ".agent")
+
+
+def install(agent, args, recorder, building):
+    from ..embedding_cache import CachedEmbeddings, EmbeddingStore
+
+    resources = agent.resources
+    resources.llm.override(DelayedChatModel(
+        responses=[ANSWER], latency=args.llm_latency, token_latency=args.token_latency,
+        stage="llm:answer", recorder=recorder,
+    ))
+    resources.cypher_llm.override(DelayedChatModel(
+        responses=GENERATED_CYPHER, latency=args.cypher_llm_latency, stage="llm:cypher", recorder=recorder,
+    ))
+    fake = DelayedEmbeddings(latency=args.embed_latency, recorder=recorder)
+    # Same wrapper as production, backed by an in-memory store so runs don't share a cache.
+    resources.embeddings.override(CachedEmbeddings(fake, model_name="fake", store=EmbeddingStore(":memory:")))
+
+    # The sync graph only supplies the schema; tool queries go through async_graph,
+    # which is the real executor when --graph neo4j.
+    graph = StubGraph()
+    graph.structured_schema = building.structured_schema()
+    resources.graph.override(graph)
+    if args.graph == "memory":
+        resources.async_graph.override(InMemoryGraph(building, query_delay=args.graph_latency, recorder=recorder))
+    agent.local_chunk_index.override(None)
+
+
+def reset(agent, args, recorder, building):
+    """Fresh caches and counters so each concurrency level starts cold."""
+    install(agent, args, recorder, building)
+    agent.cypher_cache.clear()
+    agent.answer_cache.clear()
+    agent.answer_paths.clear()
+    agent.streaming.stream_stats.samples.clear()
+    recorder.clear()
+
+
+async def run_level(agent, requests, concurrency):
+    tools = {"knowledge_graph": agent.query_knowledge_graph, "manuals": agent.answer_from_manuals}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {"all": [], "knowledge_graph": [], "manuals": []}
+    errors = 0
+
+    async def one(tool, question):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            answer = await tools[tool](question)
+            elapsed = time.perf_counter() - started
+        if answer.startswith("Sorry, I encountered an error"):
+            errors += 1
+        latencies["all"].append(elapsed)
+        latencies[tool].append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(tool, question) for tool, question in requests))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(requests),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(requests) / wall, 2),
+        "latency": {tool: percentiles(values) for tool, values in latencies.items()},
+    }
+
+
+async def run(args):
+    agent = load_agent()
+    recorder = StageRecorder()
+    fake = DelayedEmbeddings()
+    building = synthetic_building(
+        n_equipment=args.equipment, n_rooms=max(1, args.equipment // 5), embed=fake.embed_documents, seed=args.seed,
+    )
+    if args.graph == "neo4j" and args.seed_neo4j:
+        started = time.perf_counter()
+        seed_neo4j(agent.resources.executor.get(), building)
+        print(f"Seeded Neo4j with {building.counts()} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    requests = workload(building, args.requests, mix=tuple(args.mix), seed=args.seed)
+    # Keep the collector from rescanning the building during measured runs.
+    gc.collect()
+    gc.freeze()
+    levels = []
+    for concurrency in args.concurrency:
+        reset(agent, args, recorder, building)
+        level = await run_level(agent, requests, concurrency)
+        level["stages"] = recorder.summary()
+        level["answer_paths"] = dict(agent.answer_paths)
+        level["streaming"] = agent.streaming.stream_stats.summary()
+        level["cypher_cache"] = agent.cypher_cache.stats()
+        level["answer_cache"] = agent.answer_cache.stats()
+        levels.append(level)
+        print(f"concurrency {concurrency}: {level['throughput_qps']} qps, "
+              f"p95 {level['latency']['all'].get('p95_ms')} ms", file=sys.stderr)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "building": building.counts(),
+        "cypher_prompt": agent.cypher_prompt_builder.stats.summary(),
+        "levels": levels,
+    }
+
+
+def compare(result, baseline, max_regression):
+    """Print p95/throughput deltas per concurrency level; return False on a regression."""
+    ok = True
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in result["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        p95, old_p95 = level["latency"]["all"]["p95_ms"], old["latency"]["all"]["p95_ms"]
+        qps, old_qps = level["throughput_qps"], old["throughput_qps"]
+        p95_change = (p95 - old_p95) / old_p95 if old_p95 else 0.0
+        qps_change = (qps - old_qps) / old_qps if old_qps else 0.0
+        regressed = p95_change > max_regression or -qps_change > max_regression
+        ok = ok and not regressed
+        print(f"concurrency {level['concurrency']:>4}: p95 {old_p95} -> {p95} ms ({p95_change:+.1%}), "
+              f"throughput {old_qps} -> {qps} qps ({qps_change:+.1%}){'  REGRESSION' if regressed else ''}",
+              file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for the agent tools.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 8, 32])
+    parser.add_argument("--mix", type=float, nargs=3, default=[0.4, 0.3, 0.3],
+                        metavar=("TEMPLATE", "LLM_CYPHER", "MANUALS"))
+    parser.add_argument("--equipment", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", choices=("memory", "neo4j"), default="memory")
+    parser.add_argument("--seed-neo4j", action="store_true", help="Write the synthetic building to NEO4J_URI first.")
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--cypher-llm-latency", type=float, default=0.9)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.15)
+    parser.add_argument("--graph-latency", type=float, default=0.02)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    parser.add_argument("--baseline", help="A previous result to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' own logging.")
+    args = parser.parse_args()
+
+    # The tools log every step; keep stdout for the result unless asked.
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Synthetic BMS load for the ingestion path: `--points` network points each
+# report a reading every `--interval` seconds of simulated time, pushed into
+# ingestion.Ingestor as fast as it accepts them (or at `--rate` records/s),
+# with a share of alarms mixed in. Reports sustained points/s, write latency
+# percentiles and how long producers were held back by backpressure.
+#
+#   python -m KnowledgeGraphADK.benchmarks.ingest_load --records 200000 --batch-size 5000 --writers 4
+#   python -m KnowledgeGraphADK.benchmarks.ingest_load --graph neo4j --records 50000 --out ingest.json
+#
+# `--graph memory` writes to a DelayedWriter whose cost is `--write-latency`
+# per batch plus `--row-latency` per row, which is enough to compare batch
+# sizes and writer counts without a database.
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+from .stubs import DelayedWriter
+
+START_TIME = 1_750_000_000
+
+
+def records(n_points, count, interval=60.0, alarm_ratio=0.005, n_equipment=200, seed=0):
+    """Yield (kind, record): readings round-robin over the points, advancing simulated time per round."""
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < alarm_ratio:
+            yield "alarm", {
+                "id": f"load-alarm-{i}", "message": "High discharge temperature", "status": "Open",
+                "type": "Critical", "active": "true", "recorded_time": START_TIME + (i // n_points) * interval,
+                "equipment_id": f"eq-{rng.randrange(n_equipment)}",
+            }
+            continue
+        point = i % n_points
+        yield "measurement", {
+            "network_point": "Present System Mode" if point == 0 else f"LOAD-{point} Supply Air Temperature",
+            "value": rng.randrange(4) if point == 0 else round(rng.uniform(10, 30), 2),
+            "recorded_time": START_TIME + (i // n_points) * interval,
+        }
+
+
+async def produce(ingestor, stream, rate):
+    """Feed the stream into the ingestor, pacing to `rate` records/s when set."""
+    started = time.perf_counter()
+    for sent, (kind, record) in enumerate(stream, 1):
+        await ingestor.put(kind, record)
+        if rate and sent % 100 == 0:
+            ahead = sent / rate - (time.perf_counter() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+
+async def run(args):
+    from ..ingestion import Ingestor
+
+    if args.graph == "neo4j":
+        from .. import resources
+
+        executor = resources.async_graph.get()
+    else:
+        executor = DelayedWriter(latency=args.write_latency, row_latency=args.row_latency,
+                                 connections=args.connections)
+    ingestor = Ingestor(executor, batch_size=args.batch_size, flush_interval=args.flush_interval,
+                        max_pending=args.max_pending, writers=args.writers)
+    try:
+        async with ingestor:
+            await produce(ingestor, records(args.points, args.records, alarm_ratio=args.alarm_ratio, seed=args.seed),
+                          args.rate)
+    finally:
+        await executor.close()
+
+    result = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "ingest": ingestor.stats.summary(),
+    }
+    if args.graph == "neo4j":
+        from ..graph_access import metrics
+
+        result["queries"] = {name: series for name, series in metrics.snapshot().items() if name.startswith("ingest:")}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic load generator for the ingestion path.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0, help="Records/s to offer; 0 offers as fast as accepted.")
+    parser.add_argument("--alarm-ratio", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--max-pending", type=int, default=50000)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--graph", choices=("memory", "neo4j"), default="memory")
+    parser.add_argument("--write-latency", type=float, default=0.02)
+    parser.add_argument("--row-latency", type=float, default=0.00002)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    parser.add_argument("--verbose", action="store_true", help="Show the ingestor's own logging.")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    stats = result["ingest"]
+    print(f"{stats['written']} records in {stats['elapsed_s']}s: {stats['points_per_s']} points/s, "
+          f"write p95 {stats['write_ms'].get('p95')} ms, backpressure {stats['backpressure_s']}s", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# Manual ingestion before and after structure-aware chunking
+# (manual_chunking.py), over a synthetic corpus: one manual per equipment
+# model of a synthetic building, each with a cover, contents, legal and
+# safety pages shared across manuals, running headers and footers, and
+# numbered sections mixing model-specific text with common procedures, one
+# of them written as numbered steps.
+#
+# "before" splits each page with RecursiveCharacterTextSplitter(1000, 100)
+# and links nothing, as setup/embeddings.py did; "after" chunks along
+# sections, skips near-duplicates and links equipment by model and
+# manufacturer. Both are embedded with a hashed bag-of-words (so retrieval
+# is meaningful without an API), written to a chunk store and searched with
+# the equipment named in the question as the anchor. A hit is a top-k chunk
+# that holds the asked-about procedure and belongs to that equipment's
+# manual or is linked to it.
+#
+#   python -m KnowledgeGraphADK.benchmarks.manual_chunking --equipment 200
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .. import manual_chunking
+from ..chunk_store import ChunkStore, write_store
+from .synthetic import MANUAL_TOPICS, synthetic_building
+
+KIND_NAMES = {"AHU": "Air Handling Unit", "PP": "Pump", "CH": "Chiller", "CT": "Cooling Tower", "EF": "Exhaust Fan",
+              "BLR": "Boiler", "VAV": "VAV Box", "FCU": "Fan Coil Unit"}
+# (question, words that identify the answering procedure in MANUAL_TOPICS)
+QUESTIONS = [
+    ("How do I reset the pressure switch on {name}?", "reset the pressure switch"),
+    ("How often should the filters on {name} be replaced?", "replace the filters"),
+    ("{name} motor keeps tripping on overload, what should I check?", "motor trips on overload"),
+    ("What does fault code E4 mean on {name}?", "fault code e4"),
+    ("How should the bearings of {name} be lubricated?", "lubricate the bearings"),
+]
+LEGAL = [
+    "{maker} reserves the right to change the design and specifications of its products without notice.",
+    "This manual is provided for the use of qualified service personnel only and does not cover every variation "
+    "of the equipment or every contingency that may arise during installation, operation or maintenance.",
+    "The warranty covers defects in materials and workmanship for twelve months from start-up or eighteen months "
+    "from shipment, whichever comes first, provided the equipment is installed and maintained as described.",
+    "The warranty does not cover damage caused by improper installation, misuse, neglect, unauthorized "
+    "modification, or operation outside the published limits, nor refrigerant, filters, belts or fuses.",
+    "No part of this publication may be reproduced, stored or transmitted in any form without the written "
+    "permission of {maker}. All trademarks are the property of their respective owners.",
+]
+SAFETY = [
+    "Only qualified personnel may install and service this equipment. Read this manual completely before starting.",
+    "Disconnect all electrical power, including remote disconnects, and discharge all capacitors before servicing. "
+    "Follow lock-out and tag-out procedures to make sure the power cannot be inadvertently energized.",
+    "Wear appropriate personal protective equipment, including safety glasses, gloves and hearing protection, "
+    "when working on the unit. Rotating parts can start without warning.",
+    "Use only replacement parts approved by the manufacturer. Failure to follow these instructions could result in "
+    "death or serious injury.",
+]
+SECTIONS = {
+    "Installation": ["Receiving and inspection", "Mounting", "Electrical connections"],
+    "Operation": ["Start-up", "Sequence of operation"],
+    "Maintenance": ["Routine maintenance", "Lubrication", "Filters"],
+    "Troubleshooting": ["Fault codes", "Motor protection"],
+}
+# A numbered procedure in the Filters subsection; its unpunctuated steps read like headings.
+FILTER_STEPS = [
+    "Turn off power at the disconnect",
+    "Remove the front access panel",
+    "Slide out the old filters",
+    "Fit new filters with the airflow arrow facing the fan",
+]
+# Procedure of MANUAL_TOPICS that goes into each subsection.
+TOPIC_OF = {"Routine maintenance": 0, "Filters": 1, "Motor protection": 2, "Fault codes": 3, "Lubrication": 4}
+
+
+def manual(maker, model, kind, rng):
+    """(file name, [(page text, page number)]) for one synthetic manual."""
+    title = f"{model} {KIND_NAMES[kind]}"
+    body = [
+        f"{maker.upper()}\n{title}\nInstallation, Operation and Maintenance Manual\nDocument {model}-IOM rev {rng.randint(1, 9)}",
+        "CONTENTS\n" + "\n".join(f"{n} {name} {'.' * 24} {n * 3}" for n, name in enumerate(SECTIONS, 1)),
+        "IMPORTANT NOTICE\n" + "\n\n".join(s.format(maker=maker) for s in LEGAL)
+        + f"\n\nCopyright {rng.randint(2015, 2024)} {maker}.",
+        "SAFETY INFORMATION\n" + "\n\n".join(SAFETY),
+    ]
+    for n, (section, subsections) in enumerate(SECTIONS.items(), 1):
+        page = [f"{n} {section}"]
+        for m, subsection in enumerate(subsections, 1):
+            paragraph = [f"The {title} is rated for {rng.randint(2, 90)} kW and a supply of {rng.choice((208, 230, 460))} V. "
+                         f"Allow {rng.randint(300, 900)} mm of service clearance on the {rng.choice(('access', 'coil', 'motor'))} side."]
+            if subsection in TOPIC_OF:
+                paragraph.append(MANUAL_TOPICS[TOPIC_OF[subsection]])
+            if subsection == "Filters":
+                paragraph.extend(f"{k}. {step}" for k, step in enumerate(FILTER_STEPS, 1))
+            paragraph.append(f"Record the readings for the {model} in the log at the end of this manual.")
+            page.append(f"{n}.{m} {subsection}\n" + "\n".join(paragraph))
+        body.append("\n".join(page))
+    total = len(body)
+    pages = [(f"{maker} {model} Service Manual\n{text}\nPage {i} of {total}", i) for i, text in enumerate(body, 1)]
+    return f"manuals/{maker.lower()}_{model.lower()}_iom.pdf", pages
+
+
+def corpus(args):
+    building = synthetic_building(n_equipment=args.equipment, n_rooms=max(1, args.equipment // 5), seed=args.seed)
+    rng = random.Random(args.seed)
+    manuals, seen = [], set()
+    for equipment in building.equipment:
+        key = (equipment["manufacturer"], equipment["model"])
+        if key not in seen:
+            seen.add(key)
+            kind = equipment["name"].split("-")[0]
+            manuals.append(manual(*key, kind, rng))
+    catalog = [{"id": e["id"], "name": e["name"], "model": e["model"], "manufacturer": e["manufacturer"]}
+               for e in building.equipment]
+    return building, manuals, catalog
+
+
+def embed(texts, dim):
+    """Hashed bag of words: stand-in embeddings under which word overlap means similarity."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vectors[i, int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % dim] += 1
+    return vectors
+
+
+def chunks_before(manuals):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    for source, pages in manuals:
+        for text, page in pages:
+            for n, piece in enumerate(splitter.split_text(text)):
+                yield {"id": f"{source}:{page}:{n}", "text": piece, "source": source, "page": page, "equipment": []}
+
+
+def chunks_after(manuals, catalog, stats):
+    matcher = manual_chunking.EquipmentMatcher(catalog)
+    names = {row["id"]: row["name"] for row in catalog}
+    kept, rows, by_id = manual_chunking.SimHashIndex(), [], {}
+    for source, pages in manuals:
+        lead = manual_chunking.lead_text(source, pages)
+        manual_equipment = matcher.for_manual(lead)
+        chunks = manual_chunking.chunk_manual(pages)
+        stats["chunked"] += len(chunks)
+        bodies = "\n".join(chunk["body"] for chunk in chunks)
+        stats["steps_kept"] += sum(f"{k}. {step}" in bodies for k, step in enumerate(FILTER_STEPS, 1))
+        for n, chunk in enumerate(chunks):
+            equipment = [names[i] for i in matcher.for_chunk(chunk["body"], manual_equipment, lead)]
+            simhash = int(chunk["simhash"], 16)
+            original = kept.find(simhash)
+            if original is not None:
+                # Same as setup/embeddings.LINK_DUPLICATES: the kept copy gains this manual's equipment.
+                stats["duplicates"] += 1
+                by_id[original]["equipment"] = sorted(set(by_id[original]["equipment"]) | set(equipment))
+                continue
+            row = {"id": f"{source}:{n}", "text": chunk["text"], "source": source, "page": chunk["page"],
+                   "equipment": equipment}
+            kept.add(simhash, row["id"])
+            by_id[row["id"]] = row
+            rows.append(row)
+    return rows
+
+
+def evaluate(name, rows, questions, manual_of, args, root):
+    started = time.perf_counter()
+    vectors = embed([r["text"] for r in rows], args.dim)
+    embed_s = time.perf_counter() - started
+    for row, vector in zip(rows, vectors):
+        row["embedding"] = vector
+    path = os.path.join(root, name)
+    write_store(path, rows)
+    store = ChunkStore(path)
+    chunk_by_id = {r["id"]: r for r in rows}
+
+    latencies, hits = [], 0
+    for question, phrase, equipment in questions:
+        query = embed([question], args.dim)[0]
+        started = time.perf_counter()
+        found = store.search(query, anchor_text=question, top_k=args.top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(phrase in chunk["text"].lower()
+                    and (chunk_by_id[chunk["id"]]["source"] == manual_of[equipment]
+                         or equipment in chunk_by_id[chunk["id"]]["equipment"])
+                    for chunk in found)
+    latencies.sort()
+    texts = [r["text"] for r in rows]
+    return {
+        "chunks": len(rows),
+        "linked_chunks": sum(bool(r["equipment"]) for r in rows),
+        "embedded_chars": sum(map(len, texts)),
+        "mean_chunk_chars": round(statistics.mean(map(len, texts)), 1) if texts else 0,
+        "embedding_requests": -(-len(rows) // args.embed_batch_size),
+        "embed_s": round(embed_s, 3),
+        "store_bytes": store.footprint()["total"],
+        "index_bytes_768d_float32": len(rows) * 768 * 4,
+        "search_ms": {"p50": round(statistics.median(latencies), 3),
+                      "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3)},
+        f"hit_at_{args.top_k}": round(hits / len(questions), 4),
+    }
+
+
+def run(args):
+    building, manuals, catalog = corpus(args)
+    manual_of = {e["name"]: f"manuals/{e['manufacturer'].lower()}_{e['model'].lower()}_iom.pdf"
+                 for e in building.equipment}
+    rng = random.Random(args.seed + 1)
+    questions = []
+    for _ in range(args.questions):
+        template, phrase = rng.choice(QUESTIONS)
+        equipment = rng.choice(building.equipment)["name"]
+        questions.append((template.format(name=equipment), phrase, equipment))
+
+    stats = {"chunked": 0, "duplicates": 0, "steps_kept": 0}
+    started = time.perf_counter()
+    before_rows = list(chunks_before(manuals))
+    before_chunking_s = time.perf_counter() - started
+    started = time.perf_counter()
+    after_rows = chunks_after(manuals, catalog, stats)
+    after_chunking_s = time.perf_counter() - started
+
+    root = tempfile.mkdtemp(prefix="manual_chunking_")
+    try:
+        before = evaluate("before", before_rows, questions, manual_of, args, root)
+        after = evaluate("after", after_rows, questions, manual_of, args, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    before["chunking_s"] = round(before_chunking_s, 3)
+    after.update(chunking_s=round(after_chunking_s, 3), chunks_before_dedup=stats["chunked"],
+                 near_duplicates_skipped=stats["duplicates"],
+                 procedure_steps_kept=round(stats["steps_kept"] / (len(manuals) * len(FILTER_STEPS)), 4))
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "manuals": len(manuals),
+        "pages": sum(len(pages) for _, pages in manuals),
+        "before": before,
+        "after": after,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manual chunk counts, embedding cost and retrieval, before and after "
+                                                 "structure-aware chunking with dedup and equipment linking.")
+    parser.add_argument("--equipment", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    result = run(args)
+    before, after = result["before"], result["after"]
+    hit = f"hit_at_{args.top_k}"
+    print(f"chunks {before['chunks']} -> {after['chunks']}, embedded chars {before['embedded_chars']} -> "
+          f"{after['embedded_chars']}, search p50 {before['search_ms']['p50']}ms -> {after['search_ms']['p50']}ms, "
+          f"{hit} {before[hit]} -> {after[hit]}, procedure steps kept {after['procedure_steps_kept']}", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Measures import-to-ready latency of the agent against a stub graph.
+#
+#   python -m KnowledgeGraphADK.benchmarks.startup --introspection-delay 2.0
+#
+# "import" is the time to import agent.py and construct root_agent; "ready" is
+# the time until every lazily built resource exists. Each scenario runs in a
+# fresh interpreter, once without and once with a schema cache file, which is
+# what lets startup skip the synchronous schema introspection.
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .stubs import StubGraph, stub_embeddings, stub_llm
+
+
+def measure(package, introspection_delay, connect_delay):
+    schema_cached = os.path.exists(os.environ["SCHEMA_CACHE_PATH"])
+
+    started = time.perf_counter()
+    agent = importlib.import_module(f"{package}.agent")
+    imported = time.perf_counter()
+
+    resources = agent.resources
+    resources.connect_graph = lambda: StubGraph(connect_delay=connect_delay, introspection_delay=introspection_delay)
+    resources.llm.override(stub_llm())
+    resources.cypher_llm.override(stub_llm())
+    resources.embeddings.override(stub_embeddings())
+    resources.warm_up(background=False)
+    ready = time.perf_counter()
+
+    return {
+        "import_s": round(imported - started, 4),
+        "ready_s": round(ready - started, 4),
+        "schema_from_cache": schema_cached,
+        "all_ready": resources.is_ready(),
+    }
+
+
+def run_child(module, args, cache_path):
+    env = dict(os.environ, AGENT_WARMUP="0", SCHEMA_CACHE_PATH=cache_path)
+    output = subprocess.run(
+        [sys.executable, "-m", module, "--child",
+         "--introspection-delay", str(args.introspection_delay), "--connect-delay", str(args.connect_delay)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent import-to-ready benchmark.")
+    parser.add_argument("--introspection-delay", type=float, default=2.0,
+                        help="Seconds the stub graph takes to refresh its schema.")
+    parser.add_argument("--connect-delay", type=float, default=0.1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    package = __package__.rsplit(".", 1)[0]
+    if args.child:
+        print(json.dumps(measure(package, args.introspection_delay, args.connect_delay)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "schema.json")
+        cold = run_child(__spec__.name, args, cache_path)
+        warm = run_child(__spec__.name, args, cache_path)
+
+    print(json.dumps({"cold_start": cold, "warm_start": warm}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
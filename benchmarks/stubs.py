@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_community.graphs.graph_store import GraphStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Stand-ins for external services so benchmarks run without Neo4j or Google APIs.
+
+STUB_SCHEMA = """Node properties:
+Equipment {id: STRING, name: STRING, unique_identifier: STRING, manufacturer: STRING, model: STRING}
+Room {id: STRING, name: STRING, floor: INTEGER, category: STRING}
+Relationship properties:
+
+The relationships:
+(:Equipment)-[:LOCATEDIN]->(:Room)
+"""
+
+STUB_STRUCTURED_SCHEMA = {
+    "node_props": {
+        "Equipment": [{"property": "name", "type": "STRING"}, {"property": "unique_identifier", "type": "STRING"}],
+        "Room": [{"property": "name", "type": "STRING"}, {"property": "floor", "type": "INTEGER"}],
+    },
+    "rel_props": {},
+    "relationships": [{"start": "Equipment", "type": "LOCATEDIN", "end": "Room"}],
+    "metadata": {"constraint": [], "index": []},
+}
+
+
+class StubGraph(GraphStore):
+    """Mimics the parts of Neo4jGraph the agent uses, with configurable latencies."""
+
+    def __init__(self, connect_delay=0.0, introspection_delay=0.0, query_delay=0.0, rows=None):
+        time.sleep(connect_delay)
+        self.introspection_delay = introspection_delay
+        self.query_delay = query_delay
+        self.rows = rows or []
+        self.schema = ""
+        self.structured_schema = {}
+        self.queries = []
+
+    @property
+    def get_schema(self):
+        return self.schema
+
+    @property
+    def get_structured_schema(self):
+        return self.structured_schema
+
+    def refresh_schema(self):
+        time.sleep(self.introspection_delay)
+        self.schema = STUB_SCHEMA
+        self.structured_schema = STUB_STRUCTURED_SCHEMA
+
+    def query(self, query, params=None):
+        time.sleep(self.query_delay)
+        self.queries.append((query, params or {}))
+        return list(self.rows)
+
+    def add_graph_documents(self, graph_documents, include_source=False):
+        raise NotImplementedError
+
+
+def stub_llm(responses=None):
+    from langchain_core.language_models import FakeListChatModel
+
+    return FakeListChatModel(responses=responses or ["stub answer"])
+
+
+def stub_embeddings(size=768):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return DeterministicFakeEmbedding(size=size)
+
+
+class AsyncStubGraph:
+    """Async counterpart of StubGraph, matching graph_access.AsyncGraphExecutor.query."""
+
+    def __init__(self, query_delay=0.0, rows=None, write_rows=None):
+        self.query_delay = query_delay
+        self.rows = rows or []
+        self.write_rows = write_rows or []
+        self.queries = []
+        self.writes = []
+
+    async def query(self, query, params=None, name=None):
+        await asyncio.sleep(self.query_delay)
+        self.queries.append((query, params or {}))
+        return list(self.rows)
+
+    async def write(self, query, params=None, name=None):
+        await asyncio.sleep(self.query_delay)
+        self.writes.append((query, params or {}))
+        return list(self.write_rows)
+
+    async def close(self):
+        pass
+
+
+class DelayedWriter:
+    """
+    Write side of graph_access.AsyncGraphExecutor for ingestion benchmarks:
+    each write takes `latency` plus `row_latency` per row, and at most
+    `connections` writes run at once, like a bounded Neo4j pool.
+    """
+
+    def __init__(self, latency=0.01, row_latency=0.0, connections=4):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.semaphore = asyncio.Semaphore(connections)
+        self.rows = 0
+
+    async def write(self, query, params=None, name=None):
+        rows = (params or {}).get("rows", [])
+        async with self.semaphore:
+            await asyncio.sleep(self.latency + self.row_latency * len(rows))
+        self.rows += len(rows)
+        return [{"written": len(rows)}]
+
+    async def read(self, query, params=None, name=None):
+        return []
+
+    async def close(self):
+        pass
+
+
+class DelayedChatModel(BaseChatModel):
+    """
+    Deterministic chat model that waits `latency` seconds before answering.
+    Responses cycle through `responses`; streaming yields one word every
+    `token_latency` seconds. With a `recorder`, each call's duration is
+    recorded under `stage`.
+    """
+
+    responses: List[str] = ["stub answer"]
+    latency: float = 0.0
+    token_latency: float = 0.0
+    calls: int = 0
+    stage: str = "llm"
+    recorder: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "delayed-fake-chat-model"
+
+    def _next_response(self) -> str:
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return response
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._next_response()))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        result = ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._next_response()))])
+        self._record(started)
+        return result
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        words = self._next_response().split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        self._record(started)
+
+    def _record(self, started):
+        if self.recorder is not None:
+            self.recorder.record(self.stage, time.perf_counter() - started)
+
+
+class QuotaExceeded(Exception):
+    """What the fake backend raises when over quota; shaped like a Gemini 429."""
+
+    code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 RESOURCE_EXHAUSTED: quota exceeded (fake backend)")
+        self.retry_after = retry_after
+
+
+class ThrottledChatModel(DelayedChatModel):
+    """
+    A DelayedChatModel with a provider quota: more than `rate` calls started
+    in any one second, or more than `max_concurrency` in flight, raise
+    QuotaExceeded (with `retry_after` if set). Past `knee` calls in flight
+    each call slows down in proportion, like an overloaded backend. Share one
+    instance between callers to model one API key.
+    """
+
+    rate: float = 10.0
+    max_concurrency: int = 16
+    knee: int = 8
+    retry_after: Optional[float] = None
+    active: int = 0
+    throttled: int = 0
+    starts: List[float] = []
+
+    def _admit(self):
+        now = time.monotonic()
+        self.starts = [t for t in self.starts if now - t < 1.0]
+        if len(self.starts) >= self.rate or self.active >= self.max_concurrency:
+            self.throttled += 1
+            raise QuotaExceeded(self.retry_after)
+        self.starts.append(now)
+        self.active += 1
+        return self.latency * max(1.0, self.active / self.knee)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        latency = self._admit()
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            self.active -= 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._next_response()))])
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        result = await self._agenerate(messages, stop=stop, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=result.generations[0].message.content))
+
+
+class DelayedEmbeddings(Embeddings):
+    """Hash-seeded unit vectors: the same text always gets the same embedding."""
+
+    def __init__(self, size=768, latency=0.0, recorder=None):
+        self.size = size
+        self.latency = latency
+        self.recorder = recorder
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        vectors = [self._vector(t) for t in texts]
+        if self.recorder is not None:
+            self.recorder.record("embed", time.perf_counter() - started)
+        return vectors
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
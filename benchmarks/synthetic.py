@@ -0,0 +1,441 @@
+import asyncio
+import random
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .. import caching
+from .. import cypher_templates
+from .. import entity_context
+from .. import latest_measurements
+from .. import manual_retrieval
+
+# A synthetic building (rooms, equipment, parts, alarms, work orders, routines,
+# network points with measurement history, manual chunks) plus two ways to
+# serve it to the agent: InMemoryGraph, which answers the agent's own queries
+# from Python data structures, and seed_neo4j, which writes it into a local
+# Neo4j (e.g. a throwaway container) so the real executor can be measured.
+
+EQUIPMENT_KINDS = ("AHU", "PP", "CH", "CT", "EF", "BLR", "VAV", "FCU")
+ROOM_KINDS = ("Mechanical Room", "Boiler Room", "Cafeteria", "Electrical Room", "Office", "Roof", "Steam Room")
+POINT_METRICS = ("Supply Air Temperature", "Discharge Pressure", "Flow Rate", "Capacity", "Status")
+MODES = ("Unoccupied", "Occupied Heating", "Mechanical Cooling", "Economizer")
+MANUAL_TOPICS = (
+    "To reset the pressure switch, isolate the unit and press the reset button on the local panel.",
+    "Replace the filters every three months or when the differential pressure exceeds the limit.",
+    "If the motor trips on overload, check the belt tension and the bearing temperature.",
+    "Fault code E4 indicates low refrigerant charge; check for leaks before recharging.",
+    "Lubricate the bearings annually with the grease listed in the parts table.",
+)
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+@dataclass
+class Building:
+    rooms: list = field(default_factory=list)
+    equipment: list = field(default_factory=list)
+    parts: list = field(default_factory=list)
+    alarms: list = field(default_factory=list)
+    work_orders: list = field(default_factory=list)
+    routines: list = field(default_factory=list)
+    points: list = field(default_factory=list)
+    measurements: list = field(default_factory=list)
+    modes: list = field(default_factory=list)
+    chunks: list = field(default_factory=list)
+
+    def counts(self):
+        return {name: len(getattr(self, name)) for name in self.__dataclass_fields__}
+
+    def structured_schema(self):
+        def props(*names):
+            return [{"property": n, "type": "STRING"} for n in names]
+
+        return {
+            "node_props": {
+                "Equipment": props("id", "name", "unique_identifier", "manufacturer", "model"),
+                "Room": props("id", "name", "floor", "category"),
+                "Part": props("id", "name", "quantity"),
+                "Alarm": props("id", "message", "status", "active", "recorded_time"),
+                "Work Order": props("id", "order_number", "description", "status", "priority"),
+                "Maintenance Routine": props("id", "issue_description", "recurrence", "status"),
+                "Network Point": props("id", "network_point", "latest_value", "latest_recorded_time", "latest_mode"),
+                "Measurement": props("id", "value", "recorded_time"),
+                "Mode Name": props("mode", "present system mode"),
+                "Chunk": props("id", "text", "source", "page"),
+            },
+            "rel_props": {},
+            "relationships": [
+                {"start": "Equipment", "type": "LOCATEDIN", "end": "Room"},
+                {"start": "Equipment", "type": "HASPART", "end": "Part"},
+                {"start": "Equipment", "type": "HASALARM", "end": "Alarm"},
+                {"start": "Equipment", "type": "HASORDER", "end": "Work Order"},
+                {"start": "Equipment", "type": "HASROUTINE", "end": "Maintenance Routine"},
+                {"start": "Equipment", "type": "HAS_CHUNK", "end": "Chunk"},
+                {"start": "Network Point", "type": "HASMEASUREMENT", "end": "Measurement"},
+                {"start": "Network Point", "type": "LATEST", "end": "Measurement"},
+                {"start": "Measurement", "type": "HASNAME", "end": "Mode Name"},
+            ],
+            "metadata": {"constraint": [], "index": []},
+        }
+
+
+def synthetic_building(n_equipment=200, n_rooms=40, parts_per_equipment=3, points_per_equipment=2,
+                       measurements_per_point=24, chunks_per_equipment=3, embed=None, seed=0):
+    """
+    Generate a building. `embed(texts) -> vectors` embeds the manual chunks
+    (use the same fake embedder as the agent so vector search is consistent).
+    """
+    rng = random.Random(seed)
+    b = Building()
+    for i in range(n_rooms):
+        kind = ROOM_KINDS[i % len(ROOM_KINDS)]
+        b.rooms.append({"id": f"room-{i}", "name": f"{kind} {i}", "floor": i % 8, "category": kind})
+
+    now = 1_750_000_000
+    for i in range(n_equipment):
+        kind = EQUIPMENT_KINDS[i % len(EQUIPMENT_KINDS)]
+        name = f"{kind}-{i}"
+        b.equipment.append({
+            "id": f"eq-{i}", "name": name, "unique_identifier": f"{kind}{i:04d}",
+            "manufacturer": rng.choice(("Trane", "Carrier", "Daikin", "Grundfos")), "model": f"M{rng.randint(100, 999)}",
+            "room": b.rooms[rng.randrange(n_rooms)]["id"],
+        })
+        for j in range(parts_per_equipment):
+            b.parts.append({"id": f"part-{i}-{j}", "name": rng.choice(("Filter", "Belt", "Bearing", "Seal", "Valve")) + f" {j}",
+                            "quantity": rng.randint(0, 12), "equipment": f"eq-{i}"})
+        if rng.random() < 0.3:
+            b.alarms.append({"id": f"alarm-{i}", "message": f"{name} high temperature", "status": "Open",
+                             "active": True, "recorded_time": now - rng.randint(0, 86400), "equipment": f"eq-{i}"})
+        if rng.random() < 0.4:
+            b.work_orders.append({"id": f"wo-{i}", "order_number": 10000 + i, "description": f"Inspect {name}",
+                                  "status": rng.choice(("Open", "Closed")), "priority": rng.choice(("Low", "High")),
+                                  "equipment": f"eq-{i}"})
+        b.routines.append({"id": f"routine-{i}", "issue_description": f"Quarterly inspection of {name}",
+                           "recurrence": "Quarterly", "status": "Active", "equipment": f"eq-{i}"})
+        for j in range(points_per_equipment):
+            point_id = f"np-{i}-{j}"
+            b.points.append({"id": point_id, "network_point": f"{name} {POINT_METRICS[(i + j) % len(POINT_METRICS)]}",
+                             "equipment": f"eq-{i}"})
+            for k in range(measurements_per_point):
+                b.measurements.append({"id": f"m-{i}-{j}-{k}", "value": round(rng.uniform(0, 100), 2),
+                                       "recorded_time": now - k * 3600, "point": point_id})
+        for j in range(chunks_per_equipment):
+            b.chunks.append({
+                "id": f"chunk-{i}-{j}",
+                "text": f"{name} {kind} manual. {MANUAL_TOPICS[(i + j) % len(MANUAL_TOPICS)]}",
+                "source": f"manuals/{kind.lower()}.pdf", "page": j + 1, "equipment": [name],
+            })
+
+    for value, mode in enumerate(MODES):
+        b.modes.append({"mode": mode, "present system mode": value})
+    b.points.append({"id": "np-mode", "network_point": "Present System Mode", "equipment": None})
+    for k in range(measurements_per_point):
+        b.measurements.append({"id": f"m-mode-{k}", "value": rng.randrange(len(MODES)),
+                               "recorded_time": now - k * 3600, "point": "np-mode"})
+
+    if embed is not None and b.chunks:
+        vectors = embed([c["text"] for c in b.chunks])
+        for chunk, vector in zip(b.chunks, np.asarray(vectors, dtype=np.float32)):
+            chunk["embedding"] = vector
+    return b
+
+
+def workload(building, n, mix=(0.4, 0.3, 0.3), seed=0):
+    """
+    `n` (tool, question) pairs: template-routable graph questions, graph
+    questions that need generated Cypher, and manuals questions, in `mix` ratios.
+    """
+    rng = random.Random(seed)
+    template_questions = ("Where is {name} located?", "What parts does {name} have?",
+                          "Are there any active alarms on {name}?", "Show me the work orders for {name}",
+                          "What is the latest {metric} on {name}?", "Is {name} running right now?")
+    llm_questions = ("How has the {metric} on {name} changed today?", "Which vendor services {name}?",
+                     "Who manufactured {name}?")
+    manual_questions = ("How do I reset the pressure on {name}?", "How often should I replace the filters on {name}?",
+                        "What does fault code E4 mean on {name}?")
+    requests = []
+    for _ in range(n):
+        equipment = rng.choice(building.equipment)
+        fields = {"name": equipment["name"], "metric": rng.choice(POINT_METRICS).lower()}
+        roll = rng.random()
+        if roll < mix[0]:
+            requests.append(("knowledge_graph", rng.choice(template_questions).format(**fields)))
+        elif roll < mix[0] + mix[1]:
+            requests.append(("knowledge_graph", rng.choice(llm_questions).format(**fields)))
+        else:
+            requests.append(("manuals", rng.choice(manual_questions).format(**fields)))
+    return requests
+
+
+class InMemoryGraph:
+    """
+    Serves the agent's queries from a Building. Template and hybrid-search
+    queries are recognized by their text and answered exactly; any other
+    (generated or cached) Cypher is answered from its full-text anchor. The
+    `query_delay` stands in for the database round-trip.
+    """
+
+    def __init__(self, building, query_delay=0.0, recorder=None):
+        self.building = building
+        self.query_delay = query_delay
+        self.recorder = recorder
+        self.queries = 0
+        b = building
+        self.rooms = {r["id"]: r for r in b.rooms}
+        self.equipment_by_id = {e["id"]: e for e in b.equipment}
+        self.by_equipment = {}
+        for kind in ("parts", "alarms", "work_orders", "routines", "points"):
+            for item in getattr(b, kind):
+                self.by_equipment.setdefault((kind, item["equipment"]), []).append(item)
+        self.measurements = {}
+        for m in b.measurements:
+            self.measurements.setdefault(m["point"], []).append(m)
+        for series in self.measurements.values():
+            series.sort(key=lambda m: m["recorded_time"], reverse=True)
+        self.chunk_words = [_words(c["text"]) for c in b.chunks]
+        embeddings = [c["embedding"] for c in b.chunks if "embedding" in c]
+        self.chunk_matrix = np.asarray(embeddings, dtype=np.float32) if len(embeddings) == len(b.chunks) else None
+        if self.chunk_matrix is not None and len(self.chunk_matrix):
+            self.chunk_matrix /= np.linalg.norm(self.chunk_matrix, axis=1, keepdims=True)
+        self.points_by_name = {p["network_point"]: p for p in b.points}
+        # Element ids are the items' ids.
+        self.nodes = {"Room": self.rooms, "Equipment": self.equipment_by_id, "Network Point": {p["id"]: p for p in b.points}}
+        self.handlers = {t.cypher: getattr(self, "_" + t.family) for t in cypher_templates.TEMPLATES}
+        for t in cypher_templates.TEMPLATES:
+            self.handlers[cypher_templates.batched_cypher(t)] = self._batched(self.handlers[t.cypher])
+            if t.cypher_by_id:
+                self.handlers[t.cypher_by_id] = self.handlers[t.cypher]
+        self.handlers[entity_context.ANCHOR_CONTEXT] = self._anchor_context
+        self.handlers[entity_context.ENTITY_BY_ID] = self._entity_by_id
+        self.handlers[manual_retrieval.HYBRID_SEARCH] = self._hybrid
+        self.handlers[caching.LABEL_VERSIONS_QUERY] = lambda query, params: []
+
+    async def query(self, query, params=None, name=None):
+        started = time.perf_counter()
+        await asyncio.sleep(self.query_delay)
+        self.queries += 1
+        handler = self.handlers.get(query, self._generic)
+        rows = handler(query, params or {})
+        if self.recorder is not None:
+            self.recorder.record(f"graph:{(name or 'read').split(':')[0]}", time.perf_counter() - started)
+        return rows
+
+    async def close(self):
+        pass
+
+    # --- lookups ---
+    def _best(self, items, key, text, limit=1):
+        words = _words(text.replace("\\", ""))
+        scored = [(len(words & _words(str(item[key]))), item) for item in items]
+        scored = [s for s in scored if s[0] > 0]
+        scored.sort(key=lambda s: s[0], reverse=True)
+        return [item for _, item in scored[:limit]]
+
+    def _lookup(self, label, key, params):
+        """The template's anchor: by element id (entity context) or by full-text match."""
+        if "anchor_id" in params:
+            return self.nodes[label].get(params["anchor_id"])
+        found = self._best(self.nodes[label].values(), key, params.get("anchor", ""))
+        return found[0] if found else None
+
+    def _anchor(self, params):
+        return self._lookup("Equipment", "name", params)
+
+    def _related(self, kind, equipment):
+        return self.by_equipment.get((kind, equipment["id"]), [])
+
+    def _batched(self, handler):
+        """The UNWIND form of a template (batch.py): the template once per item, rows tagged with its key."""
+        def run(query, params):
+            return [{**row, "item": item, "_key": item["key"]}
+                    for item in params.get("batch", []) for row in handler(query, item)]
+        return run
+
+    # --- template families ---
+    def _latest(self, point):
+        """The LATEST projection of latest_measurements.py for one point."""
+        latest = self.measurements.get(point["id"], [])[:1]
+        if not latest:
+            return None, None, None
+        m = latest[0]
+        mode = self.building.modes[m["value"]]["mode"] if point["id"] == "np-mode" else None
+        return m["value"], m["recorded_time"], mode
+
+    def _system_mode(self, query, params):
+        value, recorded_time, mode = self._latest(self.points_by_name["Present System Mode"])
+        return [{"Mode": mode, "Value": value, "RecordedTime": recorded_time}]
+
+    def _point_latest(self, query, params):
+        point = self._lookup("Network Point", "network_point", params)
+        if not point:
+            return []
+        value, recorded_time, _ = self._latest(point)
+        return [{"Point": point["network_point"], "Value": value, "RecordedTime": recorded_time}]
+
+    def _equipment_location(self, query, params):
+        e = self._anchor(params)
+        if not e:
+            return []
+        room = self.rooms[e["room"]]
+        return [{"Equipment": e["name"], "Location": room["name"], "Floor": room["floor"]}]
+
+    def _equipment_in_room(self, query, params):
+        room = self._lookup("Room", "name", params)
+        if not room:
+            return []
+        return [{"Equipment": e["name"], "Identifier": e["unique_identifier"], "Room": room["name"]}
+                for e in self.building.equipment if e["room"] == room["id"]][:50]
+
+    def _equipment_parts(self, query, params):
+        e = self._anchor(params)
+        return [{"Equipment": e["name"], "Part": p["name"], "Quantity": p["quantity"]}
+                for p in self._related("parts", e)] if e else []
+
+    def _equipment_alarms(self, query, params):
+        e = self._anchor(params)
+        return [{"Equipment": e["name"], "Message": a["message"], "Status": a["status"], "Active": a["active"],
+                 "RecordedTime": a["recorded_time"]} for a in self._related("alarms", e)] if e else []
+
+    def _equipment_work_orders(self, query, params):
+        e = self._anchor(params)
+        return [{"Equipment": e["name"], "OrderNumber": w["order_number"], "Description": w["description"],
+                 "Status": w["status"], "Priority": w["priority"]} for w in self._related("work_orders", e)] if e else []
+
+    def _equipment_routines(self, query, params):
+        e = self._anchor(params)
+        return [{"Equipment": e["name"], "Routine": r["issue_description"], "Recurrence": r["recurrence"],
+                 "Status": r["status"]} for r in self._related("routines", e)] if e else []
+
+    # --- entity context ---
+    def _properties(self, label, item):
+        properties = {k: v for k, v in item.items() if k not in ("equipment", "room", "point")}
+        if label == "Network Point":
+            value, recorded_time, mode = self._latest(item)
+            properties.update(latest_value=value, latest_recorded_time=recorded_time, latest_mode=mode)
+        return list(properties.items())
+
+    def _neighbourhood(self, label, item, params):
+        related = []
+        if label == "Equipment":
+            related.append(("LOCATEDIN", True, "Room", self.rooms[item["room"]]))
+            for kind, rel_type, other in (("parts", "HASPART", "Part"), ("alarms", "HASALARM", "Alarm"),
+                                          ("work_orders", "HASORDER", "Work Order"),
+                                          ("routines", "HASROUTINE", "Maintenance Routine")):
+                related.extend((rel_type, True, other, x) for x in self._related(kind, item))
+        elif label == "Room":
+            related.extend(("LOCATEDIN", False, "Equipment", e) for e in self.building.equipment if e["room"] == item["id"])
+        neighbours = [{"type": rel_type, "outgoing": outgoing, "id": other["id"], "labels": [other_label],
+                       "properties": self._properties(other_label, other)}
+                      for rel_type, outgoing, other_label, other in related[:params["max_neighbours"]]]
+        return [{"id": item["id"], "labels": [label], "properties": self._properties(label, item),
+                 "neighbours": neighbours}]
+
+    def _anchor_context(self, query, params):
+        key = {"Equipment": "name", "Room": "name", "Network Point": "network_point"}.get(params["label"])
+        item = self._lookup(params["label"], key, params) if key else None
+        return self._neighbourhood(params["label"], item, params) if item else []
+
+    def _entity_by_id(self, query, params):
+        for label, items in self.nodes.items():
+            if params["id"] in items:
+                return self._neighbourhood(label, items[params["id"]], params)
+        return []
+
+    # --- manuals ---
+    def _hybrid(self, query, params):
+        candidates = params["candidates"]
+        anchors = {e["name"] for e in self._best(self.building.equipment, "name", params["anchor_text"],
+                                                 limit=params["anchor_limit"])}
+        rows = []
+
+        def row(retriever, index, score):
+            chunk = self.building.chunks[index]
+            return {"retriever": retriever, "id": chunk["id"], "text": chunk["text"], "source": chunk["source"],
+                    "page": chunk["page"], "score": float(score),
+                    "equipment": [n for n in chunk["equipment"] if n in anchors]}
+
+        if self.chunk_matrix is not None and len(self.chunk_matrix):
+            q = np.asarray(params["question_embedding"], dtype=np.float32)
+            scores = self.chunk_matrix @ (q / (np.linalg.norm(q) or 1))
+            for index in np.argsort(scores)[::-1][:candidates]:
+                rows.append(row("vector", int(index), scores[index]))
+
+        words = _words(params["question_text"].replace("\\", ""))
+        overlap = [(len(words & w), i) for i, w in enumerate(self.chunk_words)]
+        for score, index in sorted((o for o in overlap if o[0]), reverse=True)[:candidates]:
+            rows.append(row("fulltext", index, score))
+        return rows
+
+    # --- generated / cached Cypher ---
+    def _generic(self, query, params):
+        match = re.search(r"queryNodes\('generic_names_and_descriptions',\s*'([^']*)'", query)
+        text = match.group(1) if match else ""
+        if "HASMEASUREMENT" in query or "latest_value" in query:
+            points = self._best(self.building.points, "network_point", text)
+            if not points:
+                return []
+            value, recorded_time, _ = self._latest(points[0])
+            return [{"Point": points[0]["network_point"], "Value": value, "Time": recorded_time}]
+        found = self._best(self.building.equipment, "name", text)
+        return [{"Equipment": e["name"], "Manufacturer": e["manufacturer"], "Model": e["model"]} for e in found]
+
+
+# --- Seeding a local Neo4j ---
+SEED_STATEMENTS = [
+    ("rooms", "UNWIND $rows AS row MERGE (n:Room {id: row.id}) SET n.name = row.name, n.floor = row.floor, "
+              "n.category = row.category"),
+    ("equipment", "UNWIND $rows AS row MERGE (n:Equipment {id: row.id}) SET n.name = row.name, "
+                  "n.unique_identifier = row.unique_identifier, n.manufacturer = row.manufacturer, n.model = row.model "
+                  "WITH n, row MATCH (r:Room {id: row.room}) MERGE (n)-[:LOCATEDIN]->(r)"),
+    ("parts", "UNWIND $rows AS row MERGE (n:Part {id: row.id}) SET n.name = row.name, n.quantity = row.quantity "
+              "WITH n, row MATCH (e:Equipment {id: row.equipment}) MERGE (e)-[:HASPART]->(n)"),
+    ("alarms", "UNWIND $rows AS row MERGE (n:Alarm {id: row.id}) SET n.message = row.message, n.status = row.status, "
+               "n.active = row.active, n.recorded_time = row.recorded_time "
+               "WITH n, row MATCH (e:Equipment {id: row.equipment}) MERGE (e)-[:HASALARM]->(n)"),
+    ("work_orders", "UNWIND $rows AS row MERGE (n:`Work Order` {id: row.id}) SET n.order_number = row.order_number, "
+                    "n.description = row.description, n.status = row.status, n.priority = row.priority "
+                    "WITH n, row MATCH (e:Equipment {id: row.equipment}) MERGE (e)-[:HASORDER]->(n)"),
+    ("routines", "UNWIND $rows AS row MERGE (n:`Maintenance Routine` {id: row.id}) "
+                 "SET n.issue_description = row.issue_description, n.recurrence = row.recurrence, n.status = row.status "
+                 "WITH n, row MATCH (e:Equipment {id: row.equipment}) MERGE (e)-[:HASROUTINE]->(n)"),
+    ("points", "UNWIND $rows AS row MERGE (n:`Network Point` {id: row.id}) SET n.network_point = row.network_point"),
+    ("measurements", "UNWIND $rows AS row MERGE (n:Measurement {id: row.id}) SET n.value = row.value, "
+                     "n.recorded_time = row.recorded_time "
+                     "WITH n, row MATCH (p:`Network Point` {id: row.point}) MERGE (p)-[:HASMEASUREMENT]->(n)"),
+    ("modes", "UNWIND $rows AS row MERGE (n:`Mode Name` {mode: row.mode}) "
+              "SET n.`present system mode` = row.`present system mode` "
+              "WITH n, row MATCH (p:`Network Point` {id: 'np-mode'})-[:HASMEASUREMENT]->(m:Measurement) "
+              "WHERE m.value = row.`present system mode` MERGE (m)-[:HASNAME]->(n)"),
+    ("chunks", "UNWIND $rows AS row MERGE (c:Chunk {id: row.id}) SET c.text = row.text, c.source = row.source, "
+               "c.page = row.page, c.embedding = row.embedding "
+               "WITH c, row UNWIND row.equipment AS name MATCH (e:Equipment {name: name}) MERGE (e)-[:HAS_CHUNK]->(c)"),
+]
+
+SEED_INDEXES = [
+    "CREATE FULLTEXT INDEX generic_names_and_descriptions IF NOT EXISTS "
+    "FOR (n:Equipment|Room|Part|Alarm|`Work Order`|`Maintenance Routine`|`Network Point`) "
+    "ON EACH [n.name, n.unique_identifier, n.network_point, n.message, n.description, n.issue_description]",
+    f"CREATE FULLTEXT INDEX {manual_retrieval.FULLTEXT_INDEX} IF NOT EXISTS FOR (c:Chunk) ON EACH [c.text]",
+]
+
+
+def seed_neo4j(executor, building, batch_size=1000, dimensions=768):
+    """Write the building into Neo4j through a graph_access.GraphExecutor."""
+    for statement in SEED_INDEXES + [
+        f"CREATE VECTOR INDEX {manual_retrieval.VECTOR_INDEX} IF NOT EXISTS FOR (c:Chunk) ON (c.embedding) "
+        f"OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dimensions}, `vector.similarity_function`: 'cosine' }} }}"
+    ]:
+        executor.write(statement, name="seed:index")
+    # SEED_STATEMENTS is ordered so every node exists before the rows that link to it.
+    for kind, statement in SEED_STATEMENTS:
+        rows = getattr(building, kind)
+        if kind == "chunks":
+            rows = [dict(c, embedding=c["embedding"].tolist()) if "embedding" in c else c for c in rows]
+        for start in range(0, len(rows), batch_size):
+            executor.write(statement, {"rows": rows[start:start + batch_size]}, name=f"seed:{kind}")
+    latest_measurements.backfill(executor, batch_size=batch_size)
@@ -0,0 +1,178 @@
+# LLM calls per work order ticket: the old flow (an LLM ticket agent behind
+# an AgentTool, every reply routed and relayed by the root agent) against the
+# slot-filling state machine. Both run a scripted conversation through a real
+# ADK Runner with counting fake models; the graph is stubbed.
+#
+#   python -m KnowledgeGraphADK.benchmarks.ticket_flow
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, List
+
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from .stubs import AsyncStubGraph, DelayedChatModel
+
+CONVERSATIONS = {
+    "short_description": [
+        "I need to report a leaky pipe",
+        "Water is dripping from the pipe joint under the sink",
+        "High",
+        "Boiler room",
+        "about 2 hours ago",
+        "yes",
+    ],
+    "issue_in_request": [
+        "I need to report a leaky pipe under the boiler room sink",
+        "high",
+        "Boiler room",
+        "this morning",
+        "yes",
+    ],
+    "long_description": [
+        "Create a ticket",
+        "The chilled water valve above the ceiling tile in the corridor outside the server room has been dripping "
+        "steadily since the weekend, there is a bucket under it that fills every few hours and the ceiling tile is "
+        "starting to sag and stain",
+        "it's urgent",
+        "AHU-1",
+        "yesterday at 3pm",
+        "change the priority to critical",
+        "yes",
+    ],
+}
+
+# What the old ticket agent said at each step.
+OLD_TICKET_REPLIES = [
+    "Of course. Please describe the issue.",
+    "Got it. What is the severity: Low, Medium, High, or Critical?",
+    "Thank you. Where is the issue?",
+    "Almost done. When did you first observe it?",
+    "Here's a summary ... Do I have your permission to create this ticket?",
+    "Sounds good. I've created a ticket with the ID: WO-1.",
+]
+
+
+class CountingLlm(BaseLlm):
+    """
+    Fake ADK model. As the root agent it calls `tool` with the user's message
+    and relays the tool's result; otherwise it cycles through `replies`.
+    """
+
+    tool: str = ""
+    replies: List[str] = []
+    calls: int = 0
+    latency: float = 0.0
+    log: Any = None
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        if self.log is not None:
+            self.log.append(self.model)
+        await asyncio.sleep(self.latency)
+        last = llm_request.contents[-1] if llm_request.contents else None
+        parts = last.parts if last and last.parts else []
+        response = next((p.function_response for p in parts if p.function_response), None)
+        if self.tool and response is not None:
+            part = types.Part(text=str((response.response or {}).get("result", "")))
+        elif self.tool:
+            text = "".join(p.text or "" for p in parts)
+            part = types.Part(function_call=types.FunctionCall(name=self.tool, args={"request": text}))
+        else:
+            part = types.Part(text=self.replies[(self.calls - 1) % len(self.replies)])
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def old_root(log, latency):
+    ticket = Agent(name="ticket_agent", description="Guides a user through creating a work order ticket.",
+                   model=CountingLlm(model="ticket", replies=OLD_TICKET_REPLIES, latency=latency, log=log),
+                   instruction="Ask for the issue, severity, location and time, then create the ticket.")
+    return Agent(name="root", model=CountingLlm(model="root", tool="ticket_agent", latency=latency, log=log),
+                 instruction="Route ticket requests to ticket_agent.", tools=[AgentTool(agent=ticket)])
+
+
+def new_root(log, latency):
+    from ..ticket_agent.agent import continue_ticket, ticket_agent
+
+    return Agent(name="root", model=CountingLlm(model="root", tool="ticket_agent", latency=latency, log=log),
+                 instruction="Route ticket requests to ticket_agent.",
+                 tools=[AgentTool(agent=ticket_agent, skip_summarization=True)],
+                 before_agent_callback=continue_ticket)
+
+
+async def converse(root, messages):
+    runner = Runner(app_name="ticket_flow", agent=root, session_service=InMemorySessionService())
+    session = await runner.session_service.create_session(app_name="ticket_flow", user_id="bench")
+    replies = []
+    for text in messages:
+        reply = ""
+        async for event in runner.run_async(user_id="bench", session_id=session.id,
+                                            new_message=types.Content(role="user", parts=[types.Part(text=text)])):
+            for part in (event.content.parts if event.content else []):
+                if part.text:
+                    reply = part.text
+                elif part.function_response:
+                    reply = str((part.function_response.response or {}).get("result", ""))
+        replies.append(reply)
+    return replies
+
+
+async def run(args):
+    from .. import resources
+
+    summarizer = DelayedChatModel(responses=["Chilled water valve leaking through the corridor ceiling"],
+                                  latency=args.llm_latency)
+    resources.llm.override(summarizer)
+    graph = AsyncStubGraph(rows=[{"id": "4:e:1", "name": "AHU-1", "label": "Equipment"}],
+                           write_rows=[{"order_number": "WO-20261018-ABC123", "equipment": "AHU-1"}])
+    resources.async_graph.override(graph)
+
+    result = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args), "conversations": {}}
+    for name, messages in CONVERSATIONS.items():
+        row = {"turns": len(messages)}
+        for flow, build in (("old", old_root), ("state_machine", new_root)):
+            log, summary_calls = [], summarizer.calls
+            started = time.perf_counter()
+            await converse(build(log, args.llm_latency), messages)
+            row[flow] = {
+                "llm_calls": len(log) + summarizer.calls - summary_calls,
+                "by_model": {model: log.count(model) for model in sorted(set(log))}
+                            | ({"summary": summarizer.calls - summary_calls} if summarizer.calls > summary_calls else {}),
+                "elapsed_s": round(time.perf_counter() - started, 3),
+            }
+        result["conversations"][name] = row
+    result["work_orders_written"] = len(graph.writes)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM calls per ticket: LLM ticket agent vs the state machine.")
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--out", help="Write the JSON result here (default: stdout).")
+    args = parser.parse_args()
+
+    os.environ["AGENT_WARMUP"] = "0"
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        result = asyncio.run(run(args))
+    for name, row in result["conversations"].items():
+        print(f"{name}: {row['turns']} turns, {row['old']['llm_calls']} LLM calls -> "
+              f"{row['state_machine']['llm_calls']} ({row['old']['elapsed_s']}s -> {row['state_machine']['elapsed_s']}s)",
+              file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
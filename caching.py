@@ -0,0 +1,389 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case a question and collapse punctuation/whitespace so trivial variants share a key."""
+    question = question.lower().strip()
+    question = re.sub(r"[^\w\s\-]", " ", question)
+    return re.sub(r"\s+", " ", question).strip()
+
+
+def fingerprint(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """A small thread-safe LRU cache with an optional time-to-live per entry."""
+
+    def __init__(self, max_size=256, ttl_seconds=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def items(self):
+        """Return a snapshot of the live (non-expired) entries."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value)
+                for key, (value, expires_at) in self._data.items()
+                if expires_at is None or expires_at >= now
+            ]
+
+    def prune(self):
+        """Drop expired entries now instead of when they're next looked up or pushed out."""
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def _identifiers(question: str) -> list:
+    """Tokens with a digit in them (asset tags, numbers), which a semantic match must share."""
+    return sorted(token.casefold() for token in re.findall(r"[A-Za-z]*\d[\w-]*", question))
+
+
+class CypherCache:
+    """
+    Caches the Cypher generated for a question so repeat questions skip the
+    Cypher-generation LLM call.
+
+    Entries are keyed on the normalized question plus a fingerprint of the
+    graph schema and the generation prompt. If there is no exact match, the
+    question embedding is compared against cached questions and the closest
+    one above `similarity_threshold` is used, provided both questions name the
+    same identifiers and numbers (the Cypher has them baked in as literals).
+    """
+
+    def __init__(self, prompt_template: str, max_size=512, ttl_seconds=24 * 3600, similarity_threshold=0.95):
+        self.prompt_template = prompt_template
+        self.similarity_threshold = similarity_threshold
+        self._entries = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._schema_hash = fingerprint("", prompt_template)
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def set_schema(self, schema: str) -> bool:
+        """Record the current schema; clears the cache and returns True if it changed."""
+        schema_hash = fingerprint(schema, self.prompt_template)
+        with self._lock:
+            if schema_hash == self._schema_hash:
+                return False
+            self._schema_hash = schema_hash
+            self.invalidations += 1
+        self._entries.clear()
+        return True
+
+    def _key(self, question: str) -> str:
+        return fingerprint(self._schema_hash, normalize_question(question))
+
+    def lookup(self, question: str, embedding=None):
+        """
+        Return (cypher, key) for `question`, or (None, None) on a miss. `key`
+        is the entry that matched, which may belong to another question; pass
+        it to discard() if the Cypher turns out not to work.
+        """
+        key = self._key(question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry["cypher"], key
+
+        if embedding is not None:
+            best, best_score = None, self.similarity_threshold
+            query_vector = _unit(embedding)
+            identifiers = _identifiers(question)
+            for key, candidate in self._entries.items():
+                if candidate["embedding"] is None or candidate["embedding"].shape != query_vector.shape:
+                    continue
+                # "status of PP-13?" and "status of PP-14?" embed almost identically.
+                if candidate["identifiers"] != identifiers:
+                    continue
+                score = float(np.dot(query_vector, candidate["embedding"]))
+                if score >= best_score:
+                    best, best_score = (key, candidate), score
+            if best is not None:
+                # Touch the entry so near-duplicates keep it warm in the LRU.
+                self._entries.get(best[0])
+                with self._lock:
+                    self.hits += 1
+                    self.semantic_hits += 1
+                return best[1]["cypher"], best[0]
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def store(self, question: str, cypher: str, embedding=None):
+        if not cypher:
+            return
+        self._entries.put(self._key(question), {
+            "question": question,
+            "cypher": cypher,
+            "embedding": _unit(embedding) if embedding is not None else None,
+            "identifiers": _identifiers(question),
+        })
+
+    def discard(self, key: str):
+        """Drop the entry lookup() returned `key` for."""
+        self._entries.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# --- Answer cache ---
+# Per-label version counters live in Neo4j as (:`Label Version` {label, version})
+# nodes. Every writer bumps the labels it changed (see ingestion.py); the agent
+# polls them and treats a cached answer as stale once any label it read has moved.
+LABEL_VERSIONS_QUERY = "MATCH (v:`Label Version`) RETURN v.label AS label, v.version AS version"
+BUMP_LABEL_VERSIONS = """
+UNWIND $labels AS label
+MERGE (v:`Label Version` {label: label})
+SET v.version = coalesce(v.version, 0) + 1, v.changed_at = datetime()
+"""
+
+# Seconds an answer may be served for, by the most volatile label it read.
+# "*" applies to every label not listed.
+DEFAULT_LABEL_TTLS = {
+    "Measurement": 60,
+    "Network Point": 60,
+    "Alarm": 60,
+    "Work Order": 600,
+    "Measurement Rollup": 3600,
+    "*": 24 * 3600,
+}
+
+
+def parse_ttls(text: str, defaults=DEFAULT_LABEL_TTLS) -> dict:
+    """Parse "Measurement=30,Work Order=300,*=86400" over the defaults."""
+    ttls = dict(defaults)
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        label, _, seconds = item.rpartition("=")
+        ttls[label.strip()] = float(seconds)
+    return ttls
+
+
+# A relationship pattern with no type, e.g. (a)--(b) or (a)-[r*1..3]->(b).
+_UNTYPED_RELATIONSHIP = re.compile(r"\)\s*<?-(?:\[\s*\w*\s*(?:\*[^\]:]*)?\])?->?\s*\(")
+
+
+def labels_in(cypher: str, known_labels, relationships=()) -> tuple:
+    """
+    Labels of `known_labels` a query reads: node labels, label checks like
+    'Equipment' IN labels(n), and both ends of every relationship type it
+    traverses (from a structured_schema's `relationships`), so an unlabeled
+    node reached over [:HASALARM] still counts as Alarm. A relationship with
+    no type could reach anything, so the result is () (every label).
+    """
+    from .cypher_guard import pattern_names, strip_literals
+
+    if _UNTYPED_RELATIONSHIP.search(strip_literals(cypher)):
+        return ()
+    found = set()
+    for label in known_labels:
+        escaped = re.escape(label)
+        pattern = rf":\s*(?:`{escaped}`|{escaped}\b)|'{escaped}'"
+        if re.search(pattern, cypher):
+            found.add(label)
+    if relationships:
+        _, types = pattern_names(cypher)
+        for relationship in relationships:
+            if relationship["type"] in types:
+                found.update(l for l in (relationship["start"], relationship["end"]) if l in known_labels)
+    return tuple(sorted(found))
+
+
+def context_fingerprint(rows) -> str:
+    return fingerprint(json.dumps(rows, sort_keys=True, default=str))
+
+
+class AnswerCache:
+    """
+    Caches final answers per tool and question.
+
+    `lookup` runs before retrieval. It returns an entry while none of the labels
+    the answer read have changed version and the shortest TTL among them
+    hasn't passed. `lookup_context` runs after retrieval. It returns the answer
+    previously given for the same question over an identical context, so a
+    version bump that didn't change this question's rows still skips the LLM.
+    An answer whose labels are unknown is compared against every label.
+    """
+
+    def __init__(self, ttls=None, max_size=1024):
+        self.ttls = dict(DEFAULT_LABEL_TTLS if ttls is None else ttls)
+        self._entries = LRUCache(max_size=max_size)
+        self._by_context = LRUCache(max_size=max_size)
+        self._lock = threading.Lock()
+        self._remote_versions = {}
+        self._local_versions = {}
+        self.versions_checked_at = None
+        self.hits = 0
+        self.context_hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    # --- versions ---
+    def versions(self) -> dict:
+        with self._lock:
+            labels = set(self._remote_versions) | set(self._local_versions)
+            return {l: self._remote_versions.get(l, 0) + self._local_versions.get(l, 0) for l in labels}
+
+    def set_versions(self, versions: dict):
+        """Replace the versions read from the graph."""
+        with self._lock:
+            self._remote_versions = dict(versions)
+
+    def bump(self, *labels):
+        """Invalidate answers that read `labels`, for writes made by this process."""
+        with self._lock:
+            for label in labels:
+                self._local_versions[label] = self._local_versions.get(label, 0) + 1
+
+    async def arefresh(self, graph, interval: float):
+        """Re-read the version counters through `graph` at most every `interval` seconds."""
+        now = time.monotonic()
+        if self.versions_checked_at is not None and now - self.versions_checked_at < interval:
+            return
+        # Claim the refresh before awaiting so concurrent requests don't all poll.
+        self.versions_checked_at = now
+        try:
+            rows = await graph.query(LABEL_VERSIONS_QUERY, name="label_versions")
+            self.set_versions({row["label"]: row["version"] for row in rows})
+        except Exception as e:
+            print(f"Could not read label versions, keeping the previous ones: {e}")
+
+    def _snapshot(self, labels):
+        versions = self.versions()
+        return {label: versions.get(label, 0) for label in labels} if labels else versions
+
+    def ttl_for(self, labels) -> float:
+        default = self.ttls.get("*", 0)
+        return min((self.ttls.get(label, default) for label in labels), default=default)
+
+    # --- entries ---
+    def _key(self, tool, question, *parts):
+        return fingerprint(tool, normalize_question(question), *parts)
+
+    def lookup(self, tool: str, question: str):
+        entry = self._entries.get(self._key(tool, question))
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        if self._snapshot(entry["labels"]) != entry["versions"]:
+            self._entries.pop(self._key(tool, question))
+            with self._lock:
+                self.stale += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def lookup_context(self, tool: str, question: str, rows):
+        answer = self._by_context.get(self._key(tool, question, context_fingerprint(rows)))
+        if answer is not None:
+            with self._lock:
+                self.context_hits += 1
+        return answer
+
+    def store(self, tool: str, question: str, answer: str, rows, labels=(), cypher=None):
+        if not answer or not rows:
+            return
+        labels = tuple(labels)
+        ttl = self.ttl_for(labels or self.ttls)
+        if ttl <= 0:
+            return
+        self._entries.put(self._key(tool, question), {
+            "answer": answer,
+            "rows": rows,
+            "cypher": cypher,
+            "labels": labels,
+            "versions": self._snapshot(labels),
+        }, ttl_seconds=ttl)
+        self._by_context.put(self._key(tool, question, context_fingerprint(rows)), answer, ttl_seconds=ttl)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_context.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "context_hits": self.context_hits,
+                "stale": self.stale,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
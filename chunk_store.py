@@ -0,0 +1,271 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .manual_retrieval import CANDIDATE_POOL, TOP_K, fuse
+
+# On-disk chunk store for local manuals retrieval. One directory holds:
+#
+#   embeddings.npy   (n, dim) normalized vectors, float32 or int8, memory-mapped
+#   scales.npy       (n,) per-row dequantization scales (int8 mode only)
+#   texts.bin        every chunk text, UTF-8, back to back
+#   offsets.npy      (n + 1,) byte offsets into texts.bin
+#   ids.json         chunk elementIds, in row order
+#   pages.npy        (n,) page numbers (-1 when unknown)
+#   sources.npy      (n,) indexes into the manifest's source table (-1 when unknown)
+#   signatures.json  per-row change signatures, read only by sync_from_neo4j
+#   manifest.json    format, dtype, shape, source table and the equipment -> row ranges index
+#
+# Rows are grouped by their first equipment name, so each equipment's chunks
+# are a contiguous range. A search scores the mapped matrix in blocks and only
+# decodes the texts of the winning rows.
+
+FORMAT_VERSION = 1
+DTYPES = ("float32", "int8")
+# Rows scored per block; bounds the temporary float32 copy of an int8 block.
+BLOCK_ROWS = 4096
+
+LIST_CHUNKS = """
+MATCH (chunk:Chunk) WHERE chunk.embedding IS NOT NULL
+OPTIONAL MATCH (equipment:Equipment)-[:HAS_CHUNK]->(chunk)
+WITH chunk, equipment ORDER BY equipment.name
+RETURN elementId(chunk) AS id, chunk.source AS source, chunk.page AS page, size(chunk.text) AS text_length,
+       collect(equipment.name) AS equipment
+"""
+
+FETCH_CHUNKS = """
+MATCH (chunk:Chunk) WHERE elementId(chunk) IN $ids
+RETURN elementId(chunk) AS id, chunk.text AS text, chunk.embedding AS embedding
+"""
+
+
+def _signature(chunk):
+    # Chunk nodes carry no update timestamp; text length, source, page and
+    # equipment links are what re-chunking or re-linking changes.
+    return [chunk.get("text_length", len(chunk.get("text") or "")), chunk.get("source"), chunk.get("page"),
+            sorted(chunk.get("equipment") or [])]
+
+
+def _ranges(rows):
+    """Collapse sorted row numbers into [start, end) ranges."""
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row:
+            ranges[-1][1] = row + 1
+        else:
+            ranges.append([row, row + 1])
+    return ranges
+
+
+def write_store(path, chunks, dtype="float32"):
+    """
+    Write `chunks` (dicts with id, text, embedding, source, page, equipment)
+    to a new store at `path`, replacing any existing one once complete.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+    chunks = sorted(chunks, key=lambda c: (not c.get("equipment"), sorted(c.get("equipment") or [""])[0], str(c["id"])))
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    dim = len(chunks[0]["embedding"]) if chunks else 0
+    vectors = np.lib.format.open_memmap(os.path.join(tmp, "embeddings.npy"), mode="w+", dtype=dtype,
+                                        shape=(len(chunks), dim))
+    scales = np.ones(len(chunks), dtype=np.float32)
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    equipment_rows = {}
+    with open(os.path.join(tmp, "texts.bin"), "wb") as texts:
+        for i, chunk in enumerate(chunks):
+            vector = np.asarray(chunk["embedding"], dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1)
+            if dtype == "int8":
+                # Symmetric per-row quantization of the unit vector.
+                scales[i] = (np.abs(vector).max() or 1) / 127
+                vectors[i] = np.round(vector / scales[i]).astype(np.int8)
+            else:
+                vectors[i] = vector
+            data = (chunk.get("text") or "").encode("utf-8")
+            texts.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+            for name in chunk.get("equipment") or []:
+                equipment_rows.setdefault(name, []).append(i)
+    vectors.flush()
+    del vectors
+    if dtype == "int8":
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+    np.save(os.path.join(tmp, "offsets.npy"), offsets)
+    sources = sorted({c["source"] for c in chunks if c.get("source")})
+    source_index = {source: i for i, source in enumerate(sources)}
+    np.save(os.path.join(tmp, "sources.npy"),
+            np.array([source_index.get(c.get("source"), -1) for c in chunks], dtype=np.int32))
+    np.save(os.path.join(tmp, "pages.npy"),
+            np.array([c["page"] if c.get("page") is not None else -1 for c in chunks], dtype=np.int32))
+    with open(os.path.join(tmp, "ids.json"), "w") as f:
+        json.dump([c["id"] for c in chunks], f)
+    with open(os.path.join(tmp, "signatures.json"), "w") as f:
+        json.dump([_signature(c) for c in chunks], f)
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "dtype": dtype,
+            "count": len(chunks),
+            "dim": dim,
+            "sources": sources,
+            "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "equipment": {name: _ranges(rows) for name, rows in sorted(equipment_rows.items())},
+        }, f)
+
+    # Swap directories; readers holding the old maps keep working until they reopen.
+    old = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return len(chunks)
+
+
+class ChunkStore:
+    """Read side of a store written by write_store; search() matches LocalANNIndex.search."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store format {self.manifest['format_version']} at {path}")
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids = json.load(f)
+        self.dtype = self.manifest["dtype"]
+        self.vectors = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.dtype == "int8" else None
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.texts = (np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r")
+                      if self.offsets[-1] else np.zeros(0, dtype=np.uint8))
+        self.pages = np.load(os.path.join(path, "pages.npy"), mmap_mode="r")
+        self.sources = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        self.source_table = self.manifest["sources"]
+        self.equipment_ranges = self.manifest["equipment"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def source(self, row: int):
+        index = int(self.sources[row])
+        return self.source_table[index] if index >= 0 else None
+
+    def page(self, row: int):
+        page = int(self.pages[row])
+        return page if page >= 0 else None
+
+    def text(self, row: int) -> str:
+        return bytes(self.texts[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def vector(self, row: int):
+        """The stored vector for a row as float32 (dequantized in int8 mode)."""
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        return vector * self.scales[row] if self.scales is not None else vector
+
+    def rows_for(self, equipment_name: str):
+        return [row for start, end in self.equipment_ranges.get(equipment_name, []) for row in range(start, end)]
+
+    def signatures(self):
+        with open(os.path.join(self.path, "signatures.json")) as f:
+            return json.load(f)
+
+    def scores(self, query):
+        result = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS]
+            scores = block @ query if self.scales is None else (block.astype(np.float32) @ query)
+            if self.scales is not None:
+                scores *= self.scales[start:start + BLOCK_ROWS]
+            result[start:start + len(block)] = scores
+        return result
+
+    def search(self, question_embedding, anchor_text=None, top_k=TOP_K, candidates=CANDIDATE_POOL):
+        """Exact top-k over the whole matrix; equipment named in `anchor_text` counts as an anchor."""
+        if not self.ids:
+            return []
+        query = np.asarray(question_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = self.scores(query)
+        k = min(max(candidates, top_k), len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        # Anchored equipment comes from the range index rather than per-row metadata.
+        needle = (anchor_text or "").lower()
+        anchored = {}
+        for name, ranges in self.equipment_ranges.items():
+            if name and name.lower() in needle:
+                for start, end in ranges:
+                    for row in range(start, end):
+                        anchored.setdefault(row, []).append(name)
+
+        rows, row_of = [], {}
+        for row in map(int, top):
+            row_of[self.ids[row]] = row
+            rows.append({
+                "retriever": "vector",
+                "id": self.ids[row],
+                "text": None,
+                "source": self.source(row),
+                "page": self.page(row),
+                "score": float(scores[row]),
+                "equipment": anchored.get(row, []),
+            })
+        fused = fuse(rows, top_k)
+        # Only the winners' texts are read from the blob.
+        for chunk in fused:
+            chunk["text"] = self.text(row_of[chunk["id"]])
+        return fused
+
+    def footprint(self) -> dict:
+        """Bytes per file on disk; the matrix is mapped, not loaded."""
+        sizes = {name: os.path.getsize(os.path.join(self.path, name)) for name in sorted(os.listdir(self.path))}
+        sizes["total"] = sum(sizes.values())
+        return sizes
+
+
+def sync_from_neo4j(executor, path, dtype="float32", batch_size=500, full=False) -> dict:
+    """
+    Bring the store at `path` up to date with the Chunk nodes behind a
+    graph_access.GraphExecutor. Unchanged chunks are copied from the current
+    store; only new or changed ones are fetched, `batch_size` at a time.
+    """
+    listing = executor.read(LIST_CHUNKS, name="chunk_store:list")
+    current = None
+    if not full and os.path.exists(os.path.join(path, "manifest.json")):
+        current = ChunkStore(path)
+        if current.dtype != dtype:
+            current = None
+    known = {chunk_id: (row, signature) for row, (chunk_id, signature)
+             in enumerate(zip(current.ids, current.signatures()))} if current else {}
+
+    chunks, to_fetch, reused = [], {}, 0
+    for item in listing:
+        chunk = {"id": item["id"], "source": item["source"], "page": item["page"], "equipment": item["equipment"],
+                 "text_length": item["text_length"]}
+        previous = known.get(item["id"])
+        if previous is not None and previous[1] == _signature(chunk):
+            row = previous[0]
+            chunk["text"], chunk["embedding"] = current.text(row), current.vector(row)
+            reused += 1
+        else:
+            to_fetch[item["id"]] = chunk
+        chunks.append(chunk)
+
+    ids = list(to_fetch)
+    for start in range(0, len(ids), batch_size):
+        for row in executor.read(FETCH_CHUNKS, {"ids": ids[start:start + batch_size]}, name="chunk_store:fetch"):
+            to_fetch[row["id"]]["text"] = row["text"]
+            to_fetch[row["id"]]["embedding"] = row["embedding"]
+        print(f"Fetched {min(start + batch_size, len(ids))}/{len(ids)} new or changed chunks")
+    chunks = [c for c in chunks if c.get("embedding") is not None]
+    removed = len(set(known) - {c["id"] for c in chunks})
+    count = write_store(path, chunks, dtype=dtype)
+    return {"chunks": count, "reused": reused, "fetched": len(ids), "removed": removed}
@@ -0,0 +1,184 @@
+import difflib
+import os
+import re
+
+# Checks LLM-generated Cypher before it runs: read-only, labels and
+# relationship types that exist in the schema, a bounded result (a LIMIT is
+# injected when missing) and, when the executor can EXPLAIN, a planner
+# estimate under CYPHER_MAX_ESTIMATED_ROWS. A failed check raises
+# CypherRejected with a message meant to be fed back to the generator.
+
+# --- Configuration ---
+CYPHER_GUARD = os.getenv("CYPHER_GUARD", "1") == "1"
+CYPHER_EXPLAIN = os.getenv("CYPHER_EXPLAIN", "1") == "1"
+# Reject plans where any operator is estimated to produce more rows than this.
+CYPHER_MAX_ESTIMATED_ROWS = float(os.getenv("CYPHER_MAX_ESTIMATED_ROWS", "1000000"))
+# Operators that mean the query isn't anchored on anything.
+REJECTED_OPERATORS = ("AllNodesScan",)
+
+WRITE_CLAUSES = re.compile(
+    r"(?<![.\w$])(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|IN\s+TRANSACTIONS|ALTER|GRANT|DENY|REVOKE)\b",
+    re.IGNORECASE,
+)
+# A write keyword right after AS, or followed by a property access, separator or
+# operator (or nothing), is a variable or alias ("RETURN e.model AS set"), not a clause.
+_ALIAS_BEFORE = re.compile(r"\bAS\s*$", re.IGNORECASE)
+_NOT_CLAUSE_AFTER = re.compile(r"\s*(?:$|[.,:;)\]}|=<>+*/%^-])")
+CALL_PROCEDURE = re.compile(r"\bCALL\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+# Read-only procedures the prompts and retrieval queries use.
+ALLOWED_PROCEDURES = {
+    "db.index.vector.querynodes", "db.index.fulltext.querynodes", "db.labels", "db.relationshiptypes",
+    "db.propertykeys", "db.schema.visualization", "db.schema.nodetypeproperties", "db.schema.reltypeproperties",
+}
+NAME = r"(?:`[^`]+`|[A-Za-z_]\w*)"
+LABEL_EXPRESSION = re.compile(rf":\s*({NAME}(?:\s*[|&:]\s*:?\s*{NAME})*)")
+LIMIT = re.compile(r"\bLIMIT\s+(\d+|\$\w+)\s*$", re.IGNORECASE)
+
+
+class CypherRejected(ValueError):
+    """Generated Cypher that must not run; str(e) explains why."""
+
+
+def strip_literals(cypher: str) -> str:
+    """Replace string literals and comments with placeholders so keywords inside them are ignored."""
+    out, i, n = [], 0, len(cypher)
+    while i < n:
+        c = cypher[i]
+        if c in "'\"":
+            j = i + 1
+            while j < n and cypher[j] != c:
+                j += 2 if cypher[j] == "\\" else 1
+            out.append("''")
+            i = j + 1
+        elif cypher.startswith("//", i):
+            j = cypher.find("\n", i)
+            i = n if j < 0 else j
+        elif cypher.startswith("/*", i):
+            j = cypher.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def _names(expression):
+    return [name.strip("`") for name in re.findall(NAME, expression)]
+
+
+def pattern_names(cypher: str):
+    """
+    (labels, relationship types) referenced by the query. A colon inside a map
+    literal is a key; inside brackets after `-` or `<` it starts relationship
+    types; anywhere else it's a label (node pattern or WHERE n:Label).
+    """
+    text = strip_literals(cypher)
+    labels, types = set(), set()
+    stack = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in "([{":
+            before = text[:i].rstrip()[-1:]
+            stack.append("rel" if c == "[" and before in ("-", "<") else c)
+        elif c in ")]}":
+            if stack:
+                stack.pop()
+        elif c == ":" and (not stack or stack[-1] != "{"):
+            match = LABEL_EXPRESSION.match(text, i)
+            if match and (not stack or stack[-1] != "["):
+                (types if stack and stack[-1] == "rel" else labels).update(_names(match.group(1)))
+                i = match.end()
+                continue
+        i += 1
+    return labels, types
+
+
+def check_read_only(cypher: str):
+    text = strip_literals(cypher)
+    # Backticked names may legitimately contain keywords.
+    text = re.sub(r"`[^`]*`", "``", text)
+    for match in WRITE_CLAUSES.finditer(text):
+        if " " not in match.group(1) and (_ALIAS_BEFORE.search(text, 0, match.start())
+                                          or _NOT_CLAUSE_AFTER.match(text, match.end())):
+            continue
+        raise CypherRejected(f"The query must only read from the graph, but it uses {match.group(1).upper()}.")
+    for procedure in CALL_PROCEDURE.findall(text):
+        if procedure.lower() not in ALLOWED_PROCEDURES:
+            raise CypherRejected(f"The query calls the procedure {procedure}, which is not allowed; use MATCH patterns.")
+
+
+def _unknown(used, known, kind):
+    problems = []
+    for name in sorted(used - known):
+        close = difflib.get_close_matches(name, known, n=1, cutoff=0.6)
+        problems.append(f"{kind} {name!r} does not exist" + (f" (did you mean {close[0]!r}?)" if close else ""))
+    return problems
+
+
+def check_schema(cypher: str, schema: dict):
+    """Compare the query's labels and relationship types with a Neo4jGraph structured_schema."""
+    known_labels = set((schema or {}).get("node_props", {}))
+    known_types = set((schema or {}).get("rel_props", {})) | {r["type"] for r in (schema or {}).get("relationships", [])}
+    if not known_labels:
+        return
+    labels, types = pattern_names(cypher)
+    problems = _unknown(labels, known_labels, "Label") + (_unknown(types, known_types, "Relationship type")
+                                                          if known_types else [])
+    if problems:
+        raise CypherRejected("; ".join(problems) + ".")
+
+
+def ensure_limit(cypher: str, limit: int) -> str:
+    """Append LIMIT `limit` to the final RETURN when it has none (or cap a larger literal one)."""
+    cypher = cypher.strip().rstrip(";").rstrip()
+    tail = strip_literals(cypher)
+    match = LIMIT.search(tail)
+    if match:
+        value = match.group(1)
+        # Only rewrite when the literal is really the end of the original text (no trailing comment).
+        if value.isdigit() and int(value) > limit and cypher.endswith(tail[match.start(1):]):
+            return cypher[:match.start(1) - len(tail)] + str(limit)
+        return cypher
+    if re.search(r"\bUNION\b", tail, re.IGNORECASE):
+        return f"CALL {{\n{cypher}\n}}\nRETURN *\nLIMIT {limit}"
+    return f"{cypher}\nLIMIT {limit}"
+
+
+def _operators(plan):
+    yield plan
+    for child in plan.get("children", []):
+        yield from _operators(child)
+
+
+def check_plan(plan: dict, max_rows=CYPHER_MAX_ESTIMATED_ROWS):
+    """Reject plans that scan every node or are estimated to produce more than `max_rows` rows anywhere."""
+    for operator in _operators(plan or {}):
+        name = operator.get("operatorType", "").split("@")[0]
+        estimated = (operator.get("args") or operator.get("arguments") or {}).get("EstimatedRows", 0)
+        if name in REJECTED_OPERATORS:
+            raise CypherRejected(f"The plan scans every node ({name}); start the pattern from a labelled node.")
+        if estimated > max_rows:
+            raise CypherRejected(
+                f"The plan is estimated to touch {estimated:,.0f} rows at {name}; narrow the pattern with a "
+                f"property match or a WHERE clause on an anchored node."
+            )
+
+
+async def aguard(cypher: str, schema: dict, executor, limit: int, explain=CYPHER_EXPLAIN) -> str:
+    """Validate generated Cypher and return it with a LIMIT; raises CypherRejected."""
+    if not cypher or not cypher.strip():
+        raise CypherRejected("No query was generated.")
+    check_read_only(cypher)
+    check_schema(cypher, schema)
+    cypher = ensure_limit(cypher, limit)
+    if explain and hasattr(executor, "explain"):
+        from neo4j.exceptions import ClientError
+
+        try:
+            plan = await executor.explain(cypher, name="cypher_guard:explain")
+        except ClientError as e:
+            # Syntax errors and semantic errors (unknown functions, bad types) come back from the planner.
+            raise CypherRejected(f"Neo4j could not plan the query: {getattr(e, 'message', None) or e}") from e
+        check_plan(plan)
+    return cypher
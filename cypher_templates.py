@@ -0,0 +1,261 @@
+import re
+from dataclasses import dataclass, field
+
+# Pre-written, parameterized Cypher for the question families described in
+# prompt.CYPHER_GENERATION_TEMPLATE. A routed question is answered without any
+# LLM-generated Cypher.
+
+FULLTEXT_INDEX = "generic_names_and_descriptions"
+
+_ANCHOR = """
+CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', $anchor) YIELD node AS {var}, score
+WHERE '{label}' IN labels({var})
+WITH {var} ORDER BY score DESC LIMIT 1
+"""
+
+
+# The same query for an anchor whose element id is already known (entity_context.py).
+_BY_ID = "MATCH ({var}) WHERE elementId({var}) = $anchor_id"
+_ANCHOR_FIELDS = re.compile(r"YIELD node AS (\w+), score\nWHERE '([^']+)' IN labels")
+
+
+def _anchored(label, var, body):
+    return _ANCHOR.format(label=label, var=var).strip() + "\n" + body.strip()
+
+
+@dataclass
+class CypherTemplate:
+    family: str
+    patterns: list
+    cypher: str
+    summary: str
+    # Labels and relationship types the template reads, used by later stages
+    # (validation, caching) without parsing the query.
+    labels: tuple = ()
+    relationships: tuple = ()
+    compiled: list = field(default_factory=list, repr=False)
+    # Set for templates that start with a full-text anchor lookup.
+    anchor_label: str = field(default="", init=False)
+    cypher_by_id: str = field(default="", init=False, repr=False)
+
+    def __post_init__(self):
+        self.compiled = [re.compile(p, re.IGNORECASE) for p in self.patterns]
+        found = _ANCHOR_FIELDS.search(self.cypher)
+        if found:
+            var, label = found.groups()
+            prefix = _ANCHOR.format(label=label, var=var).strip()
+            if self.cypher.startswith(prefix):
+                self.anchor_label = label
+                self.cypher_by_id = _BY_ID.format(var=var) + self.cypher[len(prefix):]
+
+
+@dataclass
+class TemplateMatch:
+    template: CypherTemplate
+    params: dict
+
+    @property
+    def family(self):
+        return self.template.family
+
+    @property
+    def cypher(self):
+        return self.template.cypher
+
+
+_THING = r"(?:the\s+)?(?P<anchor>[\w\s\-\./#]+?)"
+_END = r"\s*\??\s*$"
+# For "is X running?" every word of X is required, so only X's own points
+# match, and these optional terms rank its run status (or capacity, e.g.
+# "Chiller 4 Capacity") point above its other readings.
+_RUN_STATUS = "(status run running state capacity)"
+
+TEMPLATES = [
+    CypherTemplate(
+        family="system_mode",
+        patterns=[
+            r"^what\s+mode\s+is\s+the\s+building\s+in" + _END,
+            r"^what(?:'s|\s+is)\s+the\s+(?:current\s+|present\s+)?(?:building\s+|system\s+)?mode" + _END,
+            r"^(?:current|present)\s+system\s+mode" + _END,
+        ],
+        # Reads the projection maintained by latest_measurements.py.
+        cypher="""
+MATCH (np:`Network Point` {network_point: 'Present System Mode'})
+RETURN np.latest_mode AS Mode, np.latest_value AS Value, np.latest_recorded_time AS RecordedTime
+""".strip(),
+        summary="The building is currently in {Mode} mode (reading {Value} at {RecordedTime}).",
+        labels=("Network Point",),
+        relationships=(),
+    ),
+    CypherTemplate(
+        family="point_latest",
+        patterns=[
+            r"^is\s+" + _THING + r"\s+(?P<state>operating|running|on)(?:\s+(?:right\s+)?now)?" + _END,
+            r"^what(?:'s|\s+is)\s+the\s+(?:current|latest|present)\s+(?P<metric>[\w\s\-\./#]+?)\s+(?:on|of|for)\s+"
+            + _THING + _END,
+        ],
+        cypher=_anchored("Network Point", "point", """
+RETURN point.network_point AS Point, point.latest_value AS Value, point.latest_recorded_time AS RecordedTime
+"""),
+        summary="{Point} is {Value} (recorded {RecordedTime}).",
+        labels=("Network Point",),
+        relationships=(),
+    ),
+    CypherTemplate(
+        family="equipment_location",
+        patterns=[
+            r"^where\s+is\s+" + _THING + r"(?:\s+located)?" + _END,
+            r"^what\s+room\s+is\s+" + _THING + r"\s+in" + _END,
+            r"^(?:what\s+is\s+the\s+)?location\s+of\s+" + _THING + _END,
+        ],
+        cypher=_anchored("Equipment", "equipment", """
+MATCH (equipment)-[:LOCATEDIN]->(room:Room)
+RETURN DISTINCT equipment.name AS Equipment, room.name AS Location, room.floor AS Floor
+"""),
+        summary="{Equipment} is located in {Location} (floor {Floor}).",
+        labels=("Equipment", "Room"),
+        relationships=("LOCATEDIN",),
+    ),
+    CypherTemplate(
+        family="equipment_in_room",
+        patterns=[
+            r"^what\s+equipment\s+is\s+(?:in|located\s+in)\s+" + _THING + _END,
+            r"^(?:list|show)(?:\s+me)?\s+(?:all\s+)?(?:the\s+)?equipment\s+(?:in|located\s+in)\s+" + _THING + _END,
+        ],
+        cypher=_anchored("Room", "room", """
+MATCH (equipment:Equipment)-[:LOCATEDIN]->(room)
+RETURN DISTINCT equipment.name AS Equipment, equipment.unique_identifier AS Identifier, room.name AS Room
+LIMIT 50
+"""),
+        summary="{Equipment} ({Identifier})",
+        labels=("Equipment", "Room"),
+        relationships=("LOCATEDIN",),
+    ),
+    CypherTemplate(
+        family="equipment_parts",
+        patterns=[
+            r"^what\s+parts\s+(?:does|do)\s+" + _THING + r"\s+have" + _END,
+            r"^(?:(?:list|show)(?:\s+me)?\s+)?(?:all\s+)?(?:the\s+)?parts\s+(?:for|of|on|in)\s+" + _THING + _END,
+            r"^what\s+(?:are\s+the\s+)?parts\s+(?:are\s+)?(?:for|of|on|in)\s+" + _THING + _END,
+        ],
+        cypher=_anchored("Equipment", "equipment", """
+MATCH (equipment)-[:HASPART]->(part:Part)
+RETURN DISTINCT equipment.name AS Equipment, part.name AS Part, part.quantity AS Quantity
+LIMIT 50
+"""),
+        summary="{Part} (quantity {Quantity})",
+        labels=("Equipment", "Part"),
+        relationships=("HASPART",),
+    ),
+    CypherTemplate(
+        family="equipment_alarms",
+        patterns=[
+            r"^(?:are\s+there\s+|list\s+|show(?:\s+me)?\s+)?(?:any\s+)?(?:the\s+)?(?:active\s+)?alarms\s+(?:for|on)\s+" + _THING + _END,
+            r"^(?:does|do)\s+" + _THING + r"\s+have\s+(?:any\s+)?(?:active\s+)?alarms" + _END,
+        ],
+        cypher=_anchored("Equipment", "equipment", """
+MATCH (equipment)-[:HASALARM]->(alarm:Alarm)
+RETURN DISTINCT equipment.name AS Equipment, alarm.message AS Message, alarm.status AS Status,
+       alarm.active AS Active, alarm.recorded_time AS RecordedTime
+ORDER BY RecordedTime DESC
+LIMIT 50
+"""),
+        summary="{Message} (status {Status}, active {Active}, {RecordedTime})",
+        labels=("Equipment", "Alarm"),
+        relationships=("HASALARM",),
+    ),
+    CypherTemplate(
+        family="equipment_work_orders",
+        patterns=[
+            r"^(?:list\s+|show(?:\s+me)?\s+)?(?:all\s+)?(?:the\s+)?(?:open\s+)?work\s+orders\s+(?:for|on)\s+" + _THING + _END,
+            r"^(?:does|do)\s+" + _THING + r"\s+have\s+(?:any\s+)?(?:open\s+)?work\s+orders" + _END,
+        ],
+        cypher=_anchored("Equipment", "equipment", """
+MATCH (equipment)-[:HASORDER]->(order:`Work Order`)
+RETURN DISTINCT equipment.name AS Equipment, order.order_number AS OrderNumber,
+       order.description AS Description, order.status AS Status, order.priority AS Priority
+LIMIT 50
+"""),
+        summary="#{OrderNumber}: {Description} (status {Status}, priority {Priority})",
+        labels=("Equipment", "Work Order"),
+        relationships=("HASORDER",),
+    ),
+    CypherTemplate(
+        family="equipment_routines",
+        patterns=[
+            r"^(?:list\s+|show(?:\s+me)?\s+|what\s+are\s+)?(?:all\s+)?(?:the\s+)?maintenance\s+routines\s+(?:for|on)\s+" + _THING + _END,
+        ],
+        cypher=_anchored("Equipment", "equipment", """
+MATCH (equipment)-[:HASROUTINE]->(routine:`Maintenance Routine`)
+RETURN DISTINCT equipment.name AS Equipment, routine.issue_description AS Routine,
+       routine.recurrence AS Recurrence, routine.status AS Status
+LIMIT 50
+"""),
+        summary="{Routine} ({Recurrence}, status {Status})",
+        labels=("Equipment", "Maintenance Routine"),
+        relationships=("HASROUTINE",),
+    ),
+]
+
+# Lucene query syntax characters that would otherwise break the full-text call.
+_LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+# Upper-case boolean operators; the analyzer lower-cases terms anyway, so
+# lower-casing them just makes them plain words.
+_LUCENE_OPERATORS = re.compile(r"\b(AND|OR|NOT)\b")
+
+
+def escape_fulltext(text: str) -> str:
+    text = _LUCENE_OPERATORS.sub(lambda m: m.group(1).lower(), text.strip())
+    return _LUCENE_SPECIAL.sub(r"\\\1", text)
+
+
+def route(question: str):
+    """Return a TemplateMatch for `question`, or None if it needs the LLM chain."""
+    text = re.sub(r"\s+", " ", question.strip())
+    for template in TEMPLATES:
+        for pattern in template.compiled:
+            match = pattern.match(text)
+            if not match:
+                continue
+            params = {}
+            if "anchor" in match.groupdict():
+                anchor = match.group("anchor").strip(" .")
+                if not anchor:
+                    continue
+                # Network points are named "<equipment> <metric>", e.g. "CH1 Condenser Flow".
+                if match.groupdict().get("metric"):
+                    anchor = f"{anchor} {match.group('metric').strip()}"
+                params["anchor"] = escape_fulltext(anchor)
+                if match.groupdict().get("state"):
+                    required = " ".join(f"+{word}" for word in params["anchor"].split())
+                    params["anchor"] = f"{required} {_RUN_STATUS}"
+            return TemplateMatch(template=template, params=params)
+    return None
+
+
+def batched_cypher(template: CypherTemplate) -> str:
+    """
+    The template as one UNWIND over `$batch` items ({key, <params>}), so many
+    questions of one family run in a single execution. Each row carries its
+    item's key as `_key`.
+    """
+    body = re.sub(r"\$(\w+)", r"item.\1", template.cypher)
+    return f"UNWIND $batch AS item\nCALL {{\nWITH item\n{body}\n}}\nRETURN *, item.key AS _key"
+
+
+def format_rows(match: TemplateMatch, rows: list) -> str:
+    """Render template results as a plain-text answer without an LLM call."""
+    template = match.template
+    lines = [template.summary.format_map(_Missing(row)) for row in rows]
+    if len(lines) == 1:
+        return lines[0]
+    anchor_key = "Room" if template.family == "equipment_in_room" else "Equipment"
+    anchor = rows[0].get(anchor_key) or "the requested item"
+    header = f"Found {len(lines)} results for {anchor}:"
+    return "\n".join([header] + [f"- {line}" for line in lines])
+
+
+class _Missing(dict):
+    def __getitem__(self, key):
+        value = dict.get(self, key)
+        return "unknown" if value is None else value
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .caching import LRUCache
+
+DEFAULT_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "knowledge_graph_adk", "embeddings.sqlite"),
+)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding store in SQLite. Vectors are stored as raw float32 blobs
+    and read back with `np.frombuffer`, so a hit is a view over the row's bytes
+    rather than a parsed list.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " namespace TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (namespace, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, namespace: str, hashes: list) -> dict:
+        found = {}
+        # SQLite limits the number of bound parameters, so look up in slices.
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE namespace = ? AND text_hash IN ({placeholders})",
+                    [namespace, *part],
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, namespace: str, items: dict):
+        rows = [(namespace, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings model with an in-memory LRU in front of an
+    on-disk EmbeddingStore. Entries are keyed by model name, query/document
+    task and the SHA-256 of the text, so only unseen text reaches the API.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, store: EmbeddingStore = None, memory_size=4096):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store if store is not None else EmbeddingStore()
+        self.memory = LRUCache(max_size=memory_size)
+        # Guards the counters; the setup scripts embed from a thread pool.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, kind, texts):
+        namespace = f"{self.model_name}:{kind}"
+        hashes = [text_hash(t) for t in texts]
+        vectors = {}
+        for h in hashes:
+            vector = self.memory.get((namespace, h))
+            if vector is not None:
+                vectors[h] = vector
+        missing = [h for h in dict.fromkeys(hashes) if h not in vectors]
+        if missing:
+            for h, vector in self.store.get_many(namespace, missing).items():
+                self.memory.put((namespace, h), vector)
+                vectors[h] = vector
+        return namespace, hashes, vectors
+
+    def _remember(self, namespace, computed):
+        for h, vector in computed.items():
+            self.memory.put((namespace, h), vector)
+        self.store.put_many(namespace, computed)
+
+    def _pending(self, texts, hashes, vectors):
+        todo = {}
+        for text, h in zip(texts, hashes):
+            if h not in vectors and h not in todo:
+                todo[h] = text
+        with self._lock:
+            self.hits += len(texts) - len(todo)
+            self.misses += len(todo)
+        return todo
+
+    def embed_documents_array(self, texts: list) -> list:
+        """Like embed_documents, but returns float32 NumPy arrays (views for cached entries)."""
+        namespace, hashes, vectors = self._lookup("document", texts)
+        todo = self._pending(texts, hashes, vectors)
+        if todo:
+            fresh = self.embeddings.embed_documents(list(todo.values()))
+            computed = {h: np.asarray(v, dtype=np.float32) for h, v in zip(todo, fresh)}
+            self._remember(namespace, computed)
+            vectors.update(computed)
+        return [vectors[h] for h in hashes]
+
+    def embed_query_array(self, text: str):
+        namespace, hashes, vectors = self._lookup("query", [text])
+        if self._pending([text], hashes, vectors):
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self._remember(namespace, {hashes[0]: vector})
+            return vector
+        return vectors[hashes[0]]
+
+    def embed_documents(self, texts: list) -> list:
+        return [v.tolist() for v in self.embed_documents_array(texts)]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_query_array(text).tolist()
+
+    # The async variants run the SQLite reads and writes in a worker thread so
+    # they don't block the event loop.
+    async def aembed_documents(self, texts: list) -> list:
+        namespace, hashes, vectors = await asyncio.to_thread(self._lookup, "document", texts)
+        todo = self._pending(texts, hashes, vectors)
+        if todo:
+            fresh = await self.embeddings.aembed_documents(list(todo.values()))
+            computed = {h: np.asarray(v, dtype=np.float32) for h, v in zip(todo, fresh)}
+            await asyncio.to_thread(self._remember, namespace, computed)
+            vectors.update(computed)
+        return [vectors[h].tolist() for h in hashes]
+
+    async def aembed_query(self, text: str) -> list:
+        namespace, hashes, vectors = await asyncio.to_thread(self._lookup, "query", [text])
+        if self._pending([text], hashes, vectors):
+            vector = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+            await asyncio.to_thread(self._remember, namespace, {hashes[0]: vector})
+            return vector.tolist()
+        return vectors[hashes[0]].tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,316 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+from .caching import LRUCache
+from .cypher_templates import FULLTEXT_INDEX
+
+# Per-session context of resolved anchor nodes, so follow-up questions about
+# the same asset ("where is PP-13?" -> "what parts does it have?" -> "any
+# active alarms?") skip the full-text resolution. An anchor is resolved
+# together with its 1-hop neighbourhood in one query; template questions
+# about it are answered from that neighbourhood while the labels they read
+# are fresh, and otherwise by template Cypher starting at the node's element
+# id. Pronouns and bare follow-ups are rewritten to name the focus entity.
+#
+# ADK session state holds a small record under STATE_KEY: a key into `store`,
+# the focus entity and the recently resolved ones. The neighbourhoods live in
+# `store`, at most ENTITY_CONTEXT_MAX_ENTITIES per session; sessions idle for
+# ENTITY_CONTEXT_IDLE_SECONDS are dropped and re-resolve by id when resumed.
+
+# --- Configuration ---
+ENTITY_CONTEXT = os.getenv("ENTITY_CONTEXT", "1") == "1"
+MAX_ENTITIES = int(os.getenv("ENTITY_CONTEXT_MAX_ENTITIES", "8"))
+MAX_NEIGHBOURS = int(os.getenv("ENTITY_CONTEXT_MAX_NEIGHBOURS", "200"))
+MAX_SESSIONS = int(os.getenv("ENTITY_CONTEXT_MAX_SESSIONS", "1000"))
+IDLE_SECONDS = float(os.getenv("ENTITY_CONTEXT_IDLE_SECONDS", "1800"))
+STATE_KEY = "entity_context"
+# Neighbours that are too numerous or too large to hold, and properties not worth copying.
+SKIP_LABELS = ["Chunk", "Measurement", "Label Version"]
+SKIP_PROPERTIES = ["embedding", "text"]
+
+# The node's key properties and up to $max_neighbours + 1 neighbours (one
+# extra to tell a complete neighbourhood from a truncated one).
+_NEIGHBOURHOOD = """
+CALL {
+  WITH node
+  OPTIONAL MATCH (node)-[r]-(other)
+  WHERE NONE(label IN labels(other) WHERE label IN $skip_labels)
+  WITH node, r, other LIMIT $max_neighbours
+  RETURN collect(CASE WHEN r IS NULL THEN null ELSE {
+    type: type(r), outgoing: startNode(r) = node, id: elementId(other), labels: labels(other),
+    properties: [key IN keys(other) WHERE NOT key IN $skip_properties | [key, other[key]]]
+  } END) AS neighbours
+}
+RETURN elementId(node) AS id, labels(node) AS labels,
+       [key IN keys(node) WHERE NOT key IN $skip_properties | [key, node[key]]] AS properties, neighbours
+"""
+
+ANCHOR_CONTEXT = f"""
+CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $anchor) YIELD node, score
+WHERE $label IN labels(node)
+WITH node ORDER BY score DESC LIMIT 1
+""" + _NEIGHBOURHOOD
+
+ENTITY_BY_ID = "MATCH (node) WHERE elementId(node) = $id" + _NEIGHBOURHOOD
+
+# "it" as in "is it possible to ..." doesn't refer to anything.
+_PRONOUN = re.compile(r"\b(?:it(?!\s+(?:possible|necessary|ok|okay)\b)|this\s+one|that\s+one|this\s+unit|that\s+unit|"
+                      r"the\s+same\s+one)\b", re.IGNORECASE)
+_POSSESSIVE = re.compile(r"\bits\b", re.IGNORECASE)
+# "any active alarms?", "and the parts?", "what about open work orders?"
+_FOLLOW_UP = re.compile(
+    r"^\s*(?:and\s+|what\s+about\s+|how\s+about\s+)?(?P<rest>(?:are\s+there\s+|show(?:\s+me)?\s+|list\s+)?(?:any\s+)?"
+    r"(?:the\s+)?(?:active\s+|open\s+)?(?:alarms|work\s+orders|parts|maintenance\s+routines))\s*\??\s*$",
+    re.IGNORECASE,
+)
+
+
+def _alias(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").replace("\\", "")).strip().casefold()
+
+
+def _name(properties: dict):
+    return properties.get("name") or properties.get("network_point") or properties.get("unique_identifier")
+
+
+def _entity(row, versions) -> dict:
+    neighbours = row["neighbours"] or []
+    properties = dict(row["properties"])
+    return {
+        "id": row["id"],
+        "labels": list(row["labels"]),
+        "name": _name(properties),
+        "properties": properties,
+        "neighbours": [{**n, "properties": dict(n["properties"])} for n in neighbours[:MAX_NEIGHBOURS]],
+        "complete": len(neighbours) <= MAX_NEIGHBOURS,
+        "aliases": {_alias(_name(properties))} - {""},
+        "fetched_at": time.monotonic(),
+        "versions": dict(versions or {}),
+    }
+
+
+class EntityStore:
+    """Session key -> LRUCache of entities by element id. Sessions idle for `idle_seconds` are dropped."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_seconds=IDLE_SECONDS, max_entities=MAX_ENTITIES):
+        self.max_entities = max_entities
+        self.idle_seconds = idle_seconds
+        self._sessions = LRUCache(max_size=max_sessions, ttl_seconds=idle_seconds)
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def entities(self, key) -> LRUCache:
+        now = time.monotonic()
+        if now - self._pruned_at > min(self.idle_seconds, 60):
+            self._pruned_at = now
+            self._sessions.prune()
+        entities = self._sessions.get(key)
+        if entities is None:
+            entities = LRUCache(max_size=self.max_entities)
+        # Re-putting restarts the idle timer.
+        self._sessions.put(key, entities)
+        return entities
+
+    def count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"sessions": len(self._sessions), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+store = EntityStore()
+
+
+class SessionContext:
+    """
+    One session's view of the store, built from ADK session state (a
+    tool_context.state). Changes to the focus are written back to the state.
+    """
+
+    def __init__(self, state, entity_store: EntityStore = store):
+        self.state = state
+        self.record = dict(state.get(STATE_KEY) or {})
+        self.record.setdefault("key", uuid.uuid4().hex)
+        self.record.setdefault("recent", [])
+        self.store = entity_store
+        self._entities = None
+
+    @property
+    def entities(self) -> LRUCache:
+        # Taken from the store on first use, so a session that never resolves
+        # an anchor doesn't add a store entry (and evict others) per question.
+        if self._entities is None:
+            self._entities = self.store.entities(self.record["key"])
+        return self._entities
+
+    @property
+    def focus(self):
+        return self.record.get("focus")
+
+    def _save(self):
+        self.state[STATE_KEY] = self.record
+
+    def rewrite(self, question: str) -> str:
+        """Name the focus entity in pronoun and bare follow-up questions."""
+        focus = self.focus
+        if not focus:
+            return question
+        follow_up = _FOLLOW_UP.match(question)
+        if follow_up:
+            return f"{follow_up.group('rest')} for {focus['name']}?"
+        question = _POSSESSIVE.sub(f"{focus['name']}'s", question)
+        return _PRONOUN.sub(focus["name"], question)
+
+    def mentioned(self, question: str, label=None):
+        """The focus entity's name if the question mentions it (by name or a resolved alias)."""
+        focus, text = self.focus, _alias(question)
+        if focus and (label is None or focus["label"] == label) and any(alias and alias in text for alias in [_alias(focus["name"])] + focus.get("aliases", [])):
+            return focus["name"]
+        return None
+
+    def observe(self, question: str):
+        """Forget the focus once the conversation moves on to something else."""
+        if self.focus and not self.mentioned(question):
+            self.record["focus"] = None
+            self._save()
+
+    def _find(self, alias, label):
+        if not self.record["recent"]:
+            return None
+        for _, entity in self.entities.items():
+            if alias in entity["aliases"] and label in entity["labels"]:
+                return self.entities.get(entity["id"])
+        return None
+
+    async def resolve(self, anchor: str, label: str, executor, versions=None):
+        """
+        (entity, source) for an anchor text: from this session's cache, by id
+        for an entity the session resolved before its cache was evicted, or by
+        full-text search. source is "session", "by_id" or "fulltext";
+        entity is None when nothing matches.
+        """
+        alias = _alias(anchor)
+        entity, source = self._find(alias, label), "session"
+        if entity is None:
+            params = {"skip_labels": SKIP_LABELS, "skip_properties": SKIP_PROPERTIES,
+                      "max_neighbours": MAX_NEIGHBOURS + 1}
+            known = next((r for r in self.record["recent"] if r["label"] == label and alias in r["aliases"]), None)
+            if known:
+                source = "by_id"
+                rows = await executor.query(ENTITY_BY_ID, {**params, "id": known["id"]}, name="entity_context:by_id")
+            else:
+                source = "fulltext"
+                rows = await executor.query(ANCHOR_CONTEXT, {**params, "anchor": anchor, "label": label},
+                                            name="entity_context:resolve")
+            if not rows:
+                self.store.count(False)
+                return None, source
+            entity = _entity(rows[0], versions)
+        self.store.count(source == "session")
+        entity["aliases"].add(alias)
+        self.entities.put(entity["id"], entity)
+        self._remember(entity, label)
+        return entity, source
+
+    def _remember(self, entity, label):
+        aliases = sorted(entity["aliases"])[:4]
+        summary = {"id": entity["id"], "name": entity["name"] or aliases[0], "label": label, "aliases": aliases}
+        recent = [r for r in self.record["recent"] if r["id"] != entity["id"]] + [summary]
+        self.record["recent"] = recent[-self.store.max_entities:]
+        self.record["focus"] = summary
+        self._save()
+
+
+# --- Template answers from a cached neighbourhood ---
+def _neighbours(entity, rel_type, label, outgoing=True):
+    return [n["properties"] for n in entity["neighbours"]
+            if n["type"] == rel_type and n["outgoing"] == outgoing and label in n["labels"]]
+
+
+def _distinct(rows, limit=50):
+    seen, result = set(), []
+    for row in rows:
+        key = tuple(sorted((k, repr(v)) for k, v in row.items()))
+        if key not in seen:
+            seen.add(key)
+            result.append(row)
+    return result[:limit]
+
+
+def _point_latest(e):
+    p = e["properties"]
+    return [{"Point": p.get("network_point"), "Value": p.get("latest_value"), "RecordedTime": p.get("latest_recorded_time")}]
+
+
+def _equipment_location(e):
+    return _distinct([{"Equipment": e["name"], "Location": room.get("name"), "Floor": room.get("floor")}
+                      for room in _neighbours(e, "LOCATEDIN", "Room")])
+
+
+def _equipment_in_room(e):
+    return _distinct([{"Equipment": eq.get("name"), "Identifier": eq.get("unique_identifier"), "Room": e["name"]}
+                      for eq in _neighbours(e, "LOCATEDIN", "Equipment", outgoing=False)])
+
+
+def _equipment_parts(e):
+    return _distinct([{"Equipment": e["name"], "Part": part.get("name"), "Quantity": part.get("quantity")}
+                      for part in _neighbours(e, "HASPART", "Part")])
+
+
+def _equipment_alarms(e):
+    rows = [{"Equipment": e["name"], "Message": a.get("message"), "Status": a.get("status"), "Active": a.get("active"),
+             "RecordedTime": a.get("recorded_time")} for a in _neighbours(e, "HASALARM", "Alarm")]
+    rows.sort(key=lambda row: (row["RecordedTime"] is not None, str(row["RecordedTime"])), reverse=True)
+    return _distinct(rows)
+
+
+def _equipment_work_orders(e):
+    return _distinct([{"Equipment": e["name"], "OrderNumber": w.get("order_number"), "Description": w.get("description"),
+                       "Status": w.get("status"), "Priority": w.get("priority")}
+                      for w in _neighbours(e, "HASORDER", "Work Order")])
+
+
+def _equipment_routines(e):
+    return _distinct([{"Equipment": e["name"], "Routine": r.get("issue_description"), "Recurrence": r.get("recurrence"),
+                       "Status": r.get("status")} for r in _neighbours(e, "HASROUTINE", "Maintenance Routine")])
+
+
+# Template family -> the rows its Cypher would return, computed from the anchor's neighbourhood.
+PROJECTIONS = {
+    "point_latest": _point_latest,
+    "equipment_location": _equipment_location,
+    "equipment_in_room": _equipment_in_room,
+    "equipment_parts": _equipment_parts,
+    "equipment_alarms": _equipment_alarms,
+    "equipment_work_orders": _equipment_work_orders,
+    "equipment_routines": _equipment_routines,
+}
+
+
+def rows_from_context(template, entity, versions: dict, ttl: float):
+    """
+    The template's rows from the entity's neighbourhood, or None when that
+    can't be trusted: no projection, a truncated neighbourhood, fetched more
+    than `ttl` seconds ago, or one of the template's labels changed version.
+    """
+    project = PROJECTIONS.get(template.family)
+    if project is None or not entity["complete"] or time.monotonic() - entity["fetched_at"] > ttl:
+        return None
+    if any((versions or {}).get(label, 0) != entity["versions"].get(label, 0) for label in template.labels):
+        return None
+    return project(entity)
@@ -0,0 +1,447 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+
+from .caching import fingerprint
+
+# Process-wide gateway for Gemini and embedding calls. Every client the
+# package builds (resources.llm, resources.embeddings, the root agent's model)
+# goes through `gateway`, which per model:
+#   - rate limits with a token bucket (LLM_GATEWAY_RATES requests/s),
+#   - runs identical in-flight requests once and shares the result,
+#   - caps concurrent calls with an AIMD limit: +1 per round of fast, successful
+#     calls, halved on a 429 or once latency passes LLM_GATEWAY_TARGET_LATENCY,
+#   - serves waiting callers by lane, interactive before batch,
+#   - retries 429/503 with backoff after pausing the model's bucket, so one
+#     throttled call holds everyone back instead of each retrying on its own.
+# Synchronous calls (setup scripts) share the rate limit and the retries but
+# not the concurrency limit or the lanes.
+
+# --- Configuration ---
+GATEWAY = os.getenv("LLM_GATEWAY", "1") == "1"
+# Requests per second by model, e.g. "gemini-2.5-flash=10,models/text-embedding-004=25"; "*" for the rest.
+DEFAULT_RATES = {"*": 20.0}
+# Calls a model may save up while idle. Quotas are enforced over sliding windows,
+# so a bucket that bursts after an idle spell can still trip them.
+BURST = float(os.getenv("LLM_GATEWAY_BURST", "1"))
+INITIAL_CONCURRENCY = int(os.getenv("LLM_GATEWAY_CONCURRENCY", "8"))
+MAX_CONCURRENCY = int(os.getenv("LLM_GATEWAY_MAX_CONCURRENCY", "64"))
+# Seconds to the first token (or the whole response when not streaming) above which the limit shrinks.
+TARGET_LATENCY = float(os.getenv("LLM_GATEWAY_TARGET_LATENCY", "5"))
+# Share of overloaded calls among the last ERROR_WINDOW above which the limit shrinks.
+MAX_ERROR_RATE = float(os.getenv("LLM_GATEWAY_MAX_ERROR_RATE", "0.2"))
+ERROR_WINDOW = 20
+MAX_RETRIES = int(os.getenv("LLM_GATEWAY_MAX_RETRIES", "4"))
+RETRY_BACKOFF = float(os.getenv("LLM_GATEWAY_RETRY_BACKOFF", "0.5"))
+
+# Lower runs first.
+LANES = {"interactive": 0, "batch": 1}
+_lane = contextvars.ContextVar("llm_gateway_lane", default="interactive")
+
+
+def parse_rates(text: str, defaults=DEFAULT_RATES) -> dict:
+    """Parse "gemini-2.5-flash=10,*=20" over the defaults."""
+    rates = dict(defaults)
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        model, _, rate = item.rpartition("=")
+        rates[model.strip()] = float(rate)
+    return rates
+
+
+@contextmanager
+def lane(name: str):
+    """Calls made inside (including tasks started inside) queue in this lane."""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane {name!r}; expected one of {sorted(LANES)}.")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def classify(error) -> str:
+    """"throttled" (429), "overloaded" (503, timeouts) or "failed" (anything else)."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        code = None
+    text = f"{type(error).__name__} {error}"
+    if code == 429 or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text:
+        return "throttled"
+    if code in (500, 503, 504) or isinstance(error, (asyncio.TimeoutError, TimeoutError)) or any(
+            name in text for name in ("ServiceUnavailable", "DeadlineExceeded", "UNAVAILABLE")):
+        return "overloaded"
+    return "failed"
+
+
+class ModelLimiter:
+    """Token bucket, AIMD concurrency limit and lane-ordered waiters for one model."""
+
+    def __init__(self, model, rate, burst=BURST, concurrency=INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 target_latency=TARGET_LATENCY, max_error_rate=MAX_ERROR_RATE):
+        self.model = model
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.limit = float(min(concurrency, max_concurrency))
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.active = 0
+        self.latency = None
+        self.outcomes = deque(maxlen=ERROR_WINDOW)
+        self.decreased_at = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+        # Guards the bucket, which synchronous callers share from other threads.
+        self._lock = threading.Lock()
+        self.calls = self.throttled = self.overloaded = self.retries = 0
+
+    # --- rate ---
+    def _take_token(self) -> float:
+        """0 when a token was taken, otherwise seconds until one may be."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.rate <= 0:
+                return 0.0
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """No new calls for `seconds` (after a 429), and no saved-up burst afterwards."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def acquire_sync(self):
+        while True:
+            wait = self._take_token()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    # --- concurrency ---
+    async def acquire(self, lane_name=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (LANES[lane_name or current_lane()], next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted a slot just as the caller was cancelled: hand it back.
+            if future.done() and not future.cancelled():
+                self.active -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self):
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= max(1, int(self.limit)):
+                return
+            wait = self._take_token()
+            if wait:
+                self._wake(wait)
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            future.set_result(None)
+
+    def _wake(self, wait):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+
+    def release(self, latency: float, outcome="ok", counted=True):
+        """End a call started by acquire(); `latency` and `outcome` adjust the limit."""
+        if counted:
+            self.active -= 1
+        self.calls += 1
+        now = time.monotonic()
+        if outcome != "failed":
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.outcomes.append(outcome != "ok")
+        if outcome == "throttled":
+            self.throttled += 1
+        elif outcome == "overloaded":
+            self.overloaded += 1
+        error_rate = sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+        if outcome == "throttled" or error_rate > self.max_error_rate or (self.latency or 0) > self.target_latency:
+            # At most once per round trip, so a burst of 429s from one window halves the limit once.
+            if now - self.decreased_at > (self.latency or 1.0):
+                self.limit = max(1.0, self.limit / 2)
+                self.decreased_at = now
+        elif outcome == "ok":
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        if counted:
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate, "limit": round(self.limit, 2), "active": self.active, "queued": len(self._waiters),
+            "latency_s": round(self.latency, 3) if self.latency is not None else None,
+            "calls": self.calls, "throttled": self.throttled, "overloaded": self.overloaded, "retries": self.retries,
+        }
+
+
+class Gateway:
+    def __init__(self, rates=None, max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF, **limiter_options):
+        self.rates = dict(rates if rates is not None else parse_rates(os.getenv("LLM_GATEWAY_RATES", "")))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limiter_options = limiter_options
+        self.limiters = {}
+        self._flights = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def limiter(self, model) -> ModelLimiter:
+        with self._lock:
+            limiter = self.limiters.get(model)
+            if limiter is None:
+                rate = self.rates.get(model, self.rates.get("*", 0))
+                limiter = self.limiters[model] = ModelLimiter(model, rate, **self.limiter_options)
+            return limiter
+
+    def _retry_delay(self, error, attempt):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return float(retry_after)
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _should_retry(self, limiter, error, outcome, attempt):
+        if outcome == "failed" or attempt >= self.max_retries:
+            return False
+        limiter.retries += 1
+        delay = self._retry_delay(error, attempt)
+        print(f"Gateway: {limiter.model} {outcome} ({error}); pausing {delay:.2f}s, retry {attempt + 1}")
+        limiter.pause(delay)
+        return True
+
+    async def _call(self, model, fn, lane_name):
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(lane_name)
+            started = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                outcome = classify(e)
+                limiter.release(time.perf_counter() - started, outcome)
+                if self._should_retry(limiter, e, outcome, attempt):
+                    continue
+                raise
+            except BaseException:
+                limiter.release(time.perf_counter() - started, "failed")
+                raise
+            limiter.release(time.perf_counter() - started)
+            return result
+
+    async def call(self, model: str, fn, key=None, lane_name=None):
+        """
+        `await fn()` within the model's limits, retrying 429s and 503s. Calls
+        with the same `key` in flight at the same time share one request; the
+        shared request is cancelled only when every caller has given up.
+        """
+        if key is None:
+            return await self._call(model, fn, lane_name)
+        flight_key = (model, key)
+        entry = self._flights.get(flight_key)
+        if entry is None:
+            task = asyncio.ensure_future(self._call(model, fn, lane_name))
+            entry = self._flights[flight_key] = [task, 0]
+            task.add_done_callback(lambda t: self._flights.pop(flight_key, None)
+                                   if self._flights.get(flight_key, [None])[0] is t else None)
+        else:
+            self.coalesced += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    async def stream(self, model: str, factory, key=None, lane_name=None):
+        """
+        Iterate `factory()` (an async iterator) within the model's limits. A
+        call is retried only if it fails before its first chunk. With a `key`,
+        a caller arriving while the same stream is in flight gets its chunks
+        once it completes (or makes its own call if that stream is abandoned).
+        """
+        if key is not None:
+            shared = self._streams.get((model, key))
+            if shared is not None:
+                chunks = await asyncio.shield(shared)
+                if chunks is not None:
+                    self.coalesced += 1
+                    for chunk in chunks:
+                        yield chunk
+                    return
+        limiter = self.limiter(model)
+        shared = None
+        if key is not None and (model, key) not in self._streams:
+            shared = self._streams[(model, key)] = asyncio.get_running_loop().create_future()
+        chunks = []
+        try:
+            for attempt in range(self.max_retries + 1):
+                await limiter.acquire(lane_name)
+                started = time.perf_counter()
+                first_chunk_s, outcome = None, "failed"
+                try:
+                    async for chunk in factory():
+                        if first_chunk_s is None:
+                            first_chunk_s = time.perf_counter() - started
+                        chunks.append(chunk)
+                        yield chunk
+                    outcome = "ok"
+                except Exception as e:
+                    outcome = classify(e)
+                    if first_chunk_s is None and self._should_retry(limiter, e, outcome, attempt):
+                        continue
+                    raise
+                finally:
+                    limiter.release(first_chunk_s if first_chunk_s is not None else time.perf_counter() - started,
+                                    outcome)
+                break
+            if shared is not None:
+                shared.set_result(chunks)
+        finally:
+            if shared is not None:
+                if not shared.done():
+                    shared.set_result(None)
+                self._streams.pop((model, key), None)
+
+    def call_sync(self, model: str, fn):
+        """Blocking `fn()` under the model's rate limit, with the same retries."""
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire_sync()
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                outcome = classify(e)
+                limiter.release(time.perf_counter() - started, outcome, counted=False)
+                if self._should_retry(limiter, e, outcome, attempt):
+                    time.sleep(max(0.0, limiter.paused_until - time.monotonic()))
+                    continue
+                raise
+            limiter.release(time.perf_counter() - started, counted=False)
+            return result
+
+    def stats(self) -> dict:
+        return {"coalesced": self.coalesced, "models": {m: l.stats() for m, l in sorted(self.limiters.items())}}
+
+
+gateway = Gateway()
+
+
+def _message_key(messages, stop, kwargs):
+    return fingerprint(json.dumps([(m.type, m.content) for m in messages], default=str),
+                       json.dumps(stop), json.dumps(kwargs, sort_keys=True, default=str))
+
+
+# --- Clients ---
+class GatewayChatModel(BaseChatModel):
+    """A LangChain chat model whose calls go through the gateway under `model`."""
+
+    inner: BaseChatModel
+    model: str
+    gateway: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.inner._llm_type}"
+
+    @property
+    def _gateway(self) -> Gateway:
+        return self.gateway or gateway
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return self._gateway.call_sync(
+            self.model, lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return await self._gateway.call(
+            self.model, lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            key=_message_key(messages, stop, kwargs))
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        async for chunk in self._gateway.stream(
+                self.model, lambda: self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                key=_message_key(messages, stop, kwargs)):
+            yield chunk
+
+
+class GatewayEmbeddings(Embeddings):
+    """Embeddings whose requests go through the gateway under `model`; identical in-flight texts are embedded once."""
+
+    def __init__(self, embeddings: Embeddings, model: str, lane_name=None, gateway_: Gateway = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.lane_name = lane_name
+        self.gateway = gateway_ or gateway
+
+    def embed_documents(self, texts):
+        return self.gateway.call_sync(self.model, lambda: self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text):
+        return self.gateway.call_sync(self.model, lambda: self.embeddings.embed_query(text))
+
+    async def aembed_documents(self, texts):
+        return await self.gateway.call(self.model, lambda: self.embeddings.aembed_documents(texts),
+                                       key=fingerprint("documents", *texts), lane_name=self.lane_name)
+
+    async def aembed_query(self, text):
+        return await self.gateway.call(self.model, lambda: self.embeddings.aembed_query(text),
+                                       key=fingerprint("query", text), lane_name=self.lane_name)
+
+
+def adk_model(name: str):
+    """The root agent's model: ADK's Gemini client with its calls routed through the gateway."""
+    if not GATEWAY:
+        return name
+    from google.adk.models import Gemini
+
+    class GatewayGemini(Gemini):
+        async def generate_content_async(self, llm_request, stream=False):
+            parent = super().generate_content_async
+            async for response in gateway.stream(self.model, lambda: parent(llm_request, stream)):
+                yield response
+
+    return GatewayGemini(model=name)
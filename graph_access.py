@@ -0,0 +1,256 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from langchain_community.graphs import Neo4jGraph
+
+# Shared Neo4j access for every tool: bounded connection pools, a per-query
+# timeout, read-only transactions routed to a read replica when one is
+# configured, retry with backoff on transient errors, and per-query metrics.
+
+# --- Configuration ---
+POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "50"))
+ACQUIRE_TIMEOUT = float(os.getenv("NEO4J_ACQUIRE_TIMEOUT", "10"))
+QUERY_TIMEOUT = float(os.getenv("NEO4J_QUERY_TIMEOUT", "15"))
+READ_URI = os.getenv("NEO4J_READ_URI")
+MAX_RETRIES = int(os.getenv("NEO4J_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("NEO4J_RETRY_BACKOFF", "0.2"))
+PROFILE = os.getenv("NEO4J_PROFILE", "0") == "1"
+
+# Latency histogram bucket upper bounds, in milliseconds.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+def _transient_errors():
+    from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+    return (ServiceUnavailable, SessionExpired, TransientError)
+
+
+def _db_hits(profile):
+    if not profile:
+        return 0
+    return profile.get("dbHits", 0) + sum(_db_hits(child) for child in profile.get("children", []))
+
+
+class QueryMetrics:
+    """Per-query-name latency histogram, row counts and (when profiling) db hits."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _get(self, name):
+        series = self._series.get(name)
+        if series is None:
+            series = self._series[name] = {
+                "count": 0, "errors": 0, "retries": 0, "rows": 0, "db_hits": 0,
+                "latency_ms_sum": 0.0, "latency_ms_buckets": [0] * len(self.buckets),
+            }
+        return series
+
+    def observe(self, name, latency_ms, rows=0, db_hits=0):
+        with self._lock:
+            series = self._get(name)
+            series["count"] += 1
+            series["rows"] += rows
+            series["db_hits"] += db_hits
+            series["latency_ms_sum"] += latency_ms
+            series["latency_ms_buckets"][bisect_left(self.buckets, latency_ms)] += 1
+
+    def error(self, name):
+        with self._lock:
+            self._get(name)["errors"] += 1
+
+    def retry(self, name):
+        with self._lock:
+            self._get(name)["retries"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(series, latency_ms_buckets=dict(zip(map(str, self.buckets), series["latency_ms_buckets"])))
+                for name, series in self._series.items()
+            }
+
+
+metrics = QueryMetrics()
+
+
+class _ExecutorBase:
+    def __init__(self, url, username, password, database=None, read_url=READ_URI, pool_size=POOL_SIZE,
+                 acquire_timeout=ACQUIRE_TIMEOUT, query_timeout=QUERY_TIMEOUT, max_retries=MAX_RETRIES,
+                 retry_backoff=RETRY_BACKOFF, profile=PROFILE, metrics=metrics):
+        self.database = database
+        self.query_timeout = query_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.profile = profile
+        self.metrics = metrics
+        self._driver_args = (username, password)
+        self._driver_config = {
+            "max_connection_pool_size": pool_size,
+            "connection_acquisition_timeout": acquire_timeout,
+            # Retries are handled here, with metrics, rather than inside the driver.
+            "max_transaction_retry_time": 0,
+        }
+        self.url = url
+        self.read_url = read_url
+
+    def _backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _prepare(self, query):
+        if self.profile and not query.lstrip().upper().startswith(("PROFILE", "EXPLAIN")):
+            return "PROFILE " + query
+        return query
+
+
+class GraphExecutor(_ExecutorBase):
+    """Synchronous executor over the neo4j driver."""
+
+    def __init__(self, url, username, password, **kwargs):
+        from neo4j import GraphDatabase
+
+        super().__init__(url, username, password, **kwargs)
+        self.driver = GraphDatabase.driver(url, auth=self._driver_args, **self._driver_config)
+        self.read_driver = (
+            GraphDatabase.driver(self.read_url, auth=self._driver_args, **self._driver_config)
+            if self.read_url else self.driver
+        )
+
+    def _run(self, driver, access_mode, query, params, name, with_summary=False):
+        transient = _transient_errors()
+        text = self._prepare(query)
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                with driver.session(database=self.database, default_access_mode=access_mode) as session:
+                    with session.begin_transaction(timeout=self.query_timeout) as tx:
+                        result = tx.run(text, params or {})
+                        rows = [record.data() for record in result]
+                        summary = result.consume()
+                        tx.commit()
+            except transient:
+                if attempt == self.max_retries:
+                    self.metrics.error(name)
+                    raise
+                self.metrics.retry(name)
+                time.sleep(self._backoff(attempt))
+                continue
+            except Exception:
+                self.metrics.error(name)
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.metrics.observe(name, latency_ms, len(rows), _db_hits(summary.profile))
+            return (rows, summary) if with_summary else rows
+
+    def read(self, query, params=None, name="read"):
+        from neo4j import READ_ACCESS
+
+        return self._run(self.read_driver, READ_ACCESS, query, params, name)
+
+    def write(self, query, params=None, name="write"):
+        from neo4j import WRITE_ACCESS
+
+        return self._run(self.driver, WRITE_ACCESS, query, params, name)
+
+    def explain(self, query, params=None, name="explain"):
+        """The planner's plan for `query` (a dict tree with EstimatedRows per operator), without running it."""
+        from neo4j import READ_ACCESS
+
+        _, summary = self._run(self.read_driver, READ_ACCESS, "EXPLAIN " + query, params, name, with_summary=True)
+        return summary.plan
+
+    def close(self):
+        self.driver.close()
+        if self.read_driver is not self.driver:
+            self.read_driver.close()
+
+
+class AsyncGraphExecutor(_ExecutorBase):
+    """Async executor over the neo4j async driver, with the same policies as GraphExecutor."""
+
+    def __init__(self, url, username, password, **kwargs):
+        from neo4j import AsyncGraphDatabase
+
+        super().__init__(url, username, password, **kwargs)
+        self.driver = AsyncGraphDatabase.driver(url, auth=self._driver_args, **self._driver_config)
+        self.read_driver = (
+            AsyncGraphDatabase.driver(self.read_url, auth=self._driver_args, **self._driver_config)
+            if self.read_url else self.driver
+        )
+
+    async def _run(self, driver, access_mode, query, params, name, with_summary=False):
+        transient = _transient_errors()
+        text = self._prepare(query)
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                async with driver.session(database=self.database, default_access_mode=access_mode) as session:
+                    tx = await session.begin_transaction(timeout=self.query_timeout)
+                    async with tx:
+                        result = await tx.run(text, params or {})
+                        rows = [record.data() async for record in result]
+                        summary = await result.consume()
+                        await tx.commit()
+            except transient:
+                if attempt == self.max_retries:
+                    self.metrics.error(name)
+                    raise
+                self.metrics.retry(name)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except Exception:
+                self.metrics.error(name)
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.metrics.observe(name, latency_ms, len(rows), _db_hits(summary.profile))
+            return (rows, summary) if with_summary else rows
+
+    async def read(self, query, params=None, name="read"):
+        from neo4j import READ_ACCESS
+
+        return await self._run(self.read_driver, READ_ACCESS, query, params, name)
+
+    async def write(self, query, params=None, name="write"):
+        from neo4j import WRITE_ACCESS
+
+        return await self._run(self.driver, WRITE_ACCESS, query, params, name)
+
+    async def query(self, query, params=None, name="read"):
+        """Read query returning rows as dicts, like Neo4jGraph.query."""
+        return await self.read(query, params, name=name)
+
+    async def explain(self, query, params=None, name="explain"):
+        from neo4j import READ_ACCESS
+
+        _, summary = await self._run(self.read_driver, READ_ACCESS, "EXPLAIN " + query, params, name,
+                                     with_summary=True)
+        return summary.plan
+
+    async def close(self):
+        await self.driver.close()
+        if self.read_driver is not self.driver:
+            await self.read_driver.close()
+
+
+class ExecutorNeo4jGraph(Neo4jGraph):
+    """
+    Neo4jGraph whose queries (including schema introspection and the Cypher
+    generated by GraphCypherQAChain) go through a GraphExecutor as read-only
+    transactions.
+    """
+
+    def __init__(self, executor: GraphExecutor, **kwargs):
+        self.executor = executor
+        # The base class still opens its own driver; keep it to one connection.
+        kwargs.setdefault("driver_config", {"max_connection_pool_size": 1})
+        super().__init__(**kwargs)
+
+    def query(self, query, params={}):
+        return self.executor.read(query, params, name="langchain")
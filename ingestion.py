@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .caching import BUMP_LABEL_VERSIONS
+from .graph_access import _transient_errors
+from .latest_measurements import ADVANCE_LATEST, MODE_POINT, POINT_IDS
+
+# Streaming ingestion of live BMS data: Measurement readings on Network
+# Points and Alarms on Equipment. Producers put records on a bounded local
+# queue (put() waits when it is full, which is the backpressure); writer tasks
+# drain it into one UNWIND ... MERGE per record kind and batch, keyed on the
+# natural ids, and keep the LATEST projection current in the same transaction.
+# Old raw measurements are rolled up into hourly `Measurement Rollup` nodes.
+#
+#   python -m KnowledgeGraphADK.ingestion measurements.csv alarms.jsonl --kind measurement --kind alarm
+#   bms-export | python -m KnowledgeGraphADK.ingestion - --kind measurement
+#   python -m KnowledgeGraphADK.ingestion --rollup-only
+
+# --- Configuration ---
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "50000"))
+WRITERS = int(os.getenv("INGEST_WRITERS", "2"))
+RAW_RETENTION_DAYS = float(os.getenv("INGEST_RAW_RETENTION_DAYS", "30"))
+ROLLUP_UNIT = os.getenv("INGEST_ROLLUP_UNIT", "hour")
+ROLLUP_INTERVAL = float(os.getenv("INGEST_ROLLUP_INTERVAL", "0"))
+
+LATENCY_SAMPLES = 10000
+
+MEASUREMENT_UPSERT = """
+UNWIND $rows AS row
+MERGE (np:`Network Point` {network_point: row.network_point})
+MERGE (m:Measurement {id: row.id})
+SET m.value = row.value, m.error = row.error, m.recorded_time = datetime(row.recorded_time)
+MERGE (np)-[:HASMEASUREMENT]->(m)
+WITH np, m, row
+OPTIONAL MATCH (e:Equipment {id: row.equipment_id})
+FOREACH (_ IN CASE WHEN e IS NULL THEN [] ELSE [1] END | MERGE (e)-[:HASMEASUREMENT]->(m))
+WITH np, m
+OPTIONAL MATCH (mode:`Mode Name` {`present system mode`: toInteger(trim(toString(m.value)))})
+WHERE np.network_point = $mode_point
+FOREACH (_ IN CASE WHEN mode IS NULL THEN [] ELSE [1] END | MERGE (m)-[:HASNAME]->(mode))
+WITH np, m
+""".strip() + "\n" + ADVANCE_LATEST
+
+ALARM_UPSERT = """
+UNWIND $rows AS row
+MERGE (a:Alarm {id: row.id})
+SET a.message = row.message, a.status = row.status, a.type = row.type, a.active = row.active,
+    a.recorded_time = datetime(row.recorded_time)
+WITH a, row
+OPTIONAL MATCH (e:Equipment {id: row.equipment_id})
+FOREACH (_ IN CASE WHEN e IS NULL THEN [] ELSE [1] END | MERGE (e)-[:HASALARM]->(a))
+RETURN count(a) AS written
+"""
+
+# Folds raw measurements older than $cutoff into one rollup node per point and
+# time bucket, then deletes them. Counts and sums accumulate, so a bucket can
+# be rolled up over several passes. The LATEST measurement is always kept.
+ROLLUP = """
+MATCH (np:`Network Point`) WHERE elementId(np) IN $point_ids
+MATCH (np)-[:HASMEASUREMENT]->(m:Measurement)
+WHERE m.recorded_time < datetime($cutoff) AND NOT (np)-[:LATEST]->(m)
+WITH np, m ORDER BY m.recorded_time LIMIT $limit
+WITH np, datetime.truncate($unit, m.recorded_time) AS bucket, collect(m) AS ms
+WITH np, bucket, ms, [x IN ms | toFloat(x.value)] AS values, last(ms) AS newest
+MERGE (r:`Measurement Rollup` {id: np.network_point + '|' + toString(bucket)})
+ON CREATE SET r.network_point = np.network_point, r.bucket_start = bucket, r.unit = $unit,
+              r.count = 0, r.sum = 0.0
+MERGE (np)-[:HASROLLUP]->(r)
+SET r.count = r.count + size(ms),
+    r.sum = r.sum + reduce(s = 0.0, v IN values | s + coalesce(v, 0.0)),
+    r.min = reduce(lo = r.min, v IN values | CASE WHEN v IS NULL OR (lo IS NOT NULL AND lo <= v) THEN lo ELSE v END),
+    r.max = reduce(hi = r.max, v IN values | CASE WHEN v IS NULL OR (hi IS NOT NULL AND hi >= v) THEN hi ELSE v END)
+SET r.avg = r.sum / r.count,
+    r.last_value = CASE WHEN r.last_time IS NULL OR newest.recorded_time > r.last_time
+                        THEN newest.value ELSE r.last_value END
+SET r.last_time = CASE WHEN r.last_time IS NULL OR newest.recorded_time > r.last_time
+                       THEN newest.recorded_time ELSE r.last_time END
+FOREACH (x IN ms | DETACH DELETE x)
+RETURN sum(size(ms)) AS rolled_up
+"""
+
+
+# --- 1. Records ---
+def _iso_time(value):
+    """
+    ISO-8601 for Cypher's datetime(): accepts ISO strings (with a space or T,
+    naive ones taken as UTC), epoch seconds and datetimes. Anything else is
+    rejected here, since one unparsable time fails the whole UNWIND batch.
+    """
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().replace(".", "", 1).isdigit()):
+        return datetime.fromtimestamp(float(value), tz=timezone.utc).isoformat()
+    if not value:
+        raise ValueError("missing recorded_time")
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            raise ValueError(f"unparsable recorded_time {value!r}") from None
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+
+
+def _blank(value):
+    return None if value is None or value == "" else value
+
+
+def normalize_measurement(record: dict) -> dict:
+    recorded_time = _iso_time(record.get("recorded_time"))
+    network_point = _blank(record.get("network_point"))
+    if network_point is None:
+        raise ValueError("missing network_point")
+    return {
+        # Readings without an id are keyed on point and time, so a re-sent reading merges.
+        "id": str(_blank(record.get("id")) or f"{network_point}|{recorded_time}"),
+        "network_point": network_point,
+        "value": record.get("value"),
+        "error": _blank(record.get("error")),
+        "recorded_time": recorded_time,
+        "equipment_id": _blank(record.get("equipment_id")),
+    }
+
+
+def normalize_alarm(record: dict) -> dict:
+    if not _blank(record.get("id")):
+        raise ValueError("missing id")
+    active = record.get("active")
+    if not isinstance(active, bool):
+        active = str(active).strip().lower() in ("1", "true", "yes")
+    return {
+        "id": str(record["id"]),
+        "message": record.get("message"),
+        "status": record.get("status"),
+        "type": record.get("type"),
+        "active": active,
+        "recorded_time": _iso_time(record.get("recorded_time")),
+        "equipment_id": _blank(record.get("equipment_id")),
+    }
+
+
+KINDS = {
+    "measurement": (normalize_measurement, MEASUREMENT_UPSERT),
+    "alarm": (normalize_alarm, ALARM_UPSERT),
+}
+# Labels whose version is bumped after a write, invalidating cached answers that read them.
+CHANGED_LABELS = {
+    "measurement": ["Measurement", "Network Point"],
+    "alarm": ["Alarm"],
+}
+
+
+def read_records(path):
+    """Yield dicts from a CSV or JSONL file ("-" reads JSONL from stdin)."""
+    if path == "-":
+        for line in sys.stdin:
+            if line.strip():
+                yield json.loads(line)
+        return
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# --- 2. Stats ---
+class IngestStats:
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.received = 0
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.blocked_s = 0.0
+        self.max_depth = 0
+        self.write_latencies = deque(maxlen=size)
+        self.started = None
+        self.finished = None
+
+    def summary(self):
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        latencies = np.asarray(self.write_latencies) * 1000
+        return {
+            "received": self.received,
+            "written": self.written,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches,
+            "elapsed_s": round(elapsed, 3),
+            "points_per_s": round(self.written / elapsed, 1) if elapsed else 0.0,
+            "avg_batch": round(self.written / self.batches, 1) if self.batches else 0,
+            "write_ms": {
+                f"p{p}": round(float(np.percentile(latencies, p)), 2) for p in (50, 95, 99)
+            } if len(latencies) else {},
+            "backpressure_s": round(self.blocked_s, 3),
+            "max_queue_depth": self.max_depth,
+        }
+
+
+# --- 3. Ingestor ---
+class Ingestor:
+    """
+    Bounded queue plus `writers` tasks writing through a graph_access
+    AsyncGraphExecutor (anything with `async write(query, params, name)`).
+    Use as `async with Ingestor(executor) as ingestor: await ingestor.put(...)`.
+    """
+
+    def __init__(self, executor, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING,
+                 writers=WRITERS, rollup_interval=ROLLUP_INTERVAL, mode_point=MODE_POINT):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writers = writers
+        self.rollup_interval = rollup_interval
+        self.mode_point = mode_point
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.stats = IngestStats()
+        self._tasks = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        self.stats.started = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._writer()) for _ in range(self.writers)]
+        if self.rollup_interval > 0:
+            self._tasks.append(asyncio.create_task(self._periodic_rollup()))
+
+    async def put(self, kind: str, record: dict):
+        """Queue one record; waits while the queue is full."""
+        normalize, _ = KINDS[kind]
+        try:
+            row = normalize(record)
+        except (ValueError, TypeError) as e:
+            self.stats.rejected += 1
+            print(f"Rejected {kind} record {record!r}: {e}")
+            return
+        self.stats.received += 1
+        if self.queue.full():
+            started = time.perf_counter()
+            await self.queue.put((kind, row))
+            self.stats.blocked_s += time.perf_counter() - started
+        else:
+            self.queue.put_nowait((kind, row))
+        self.stats.max_depth = max(self.stats.max_depth, self.queue.qsize())
+
+    async def put_many(self, kind: str, records):
+        for record in records:
+            await self.put(kind, record)
+
+    async def close(self):
+        """Flush everything queued, then stop the writers."""
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.stats.finished = time.perf_counter()
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _writer(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.write_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def write_batch(self, batch):
+        # Coalesce per kind; a record re-sent within the batch keeps its last version.
+        grouped = {}
+        for kind, row in batch:
+            grouped.setdefault(kind, {})[row["id"]] = row
+        changed = []
+        for kind, rows in grouped.items():
+            started = time.perf_counter()
+            written = await self._write_rows(kind, list(rows.values()))
+            if not written:
+                continue
+            self.stats.write_latencies.append(time.perf_counter() - started)
+            self.stats.written += written
+            self.stats.batches += 1
+            changed.extend(CHANGED_LABELS[kind])
+        if changed:
+            try:
+                await self.executor.write(BUMP_LABEL_VERSIONS, {"labels": changed}, name="ingest:versions")
+            except Exception as e:
+                print(f"Could not bump label versions {changed}: {e}")
+
+    async def _write_rows(self, kind, rows) -> int:
+        """
+        Write `rows` in one statement. If it fails on the data (not on the
+        connection, which the executor already retried), halve the batch until
+        the bad records are isolated, so one bad record doesn't drop the rest.
+        Returns how many rows were written.
+        """
+        _, statement = KINDS[kind]
+        try:
+            await self.executor.write(statement, {"rows": rows, "mode_point": self.mode_point}, name=f"ingest:{kind}")
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1 or isinstance(e, _transient_errors()):
+                self.stats.failed += len(rows)
+                print(f"Failed to write {len(rows)} {kind} records: {e}")
+                return 0
+        middle = len(rows) // 2
+        return await self._write_rows(kind, rows[:middle]) + await self._write_rows(kind, rows[middle:])
+
+    async def _periodic_rollup(self):
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+            try:
+                await rollup(self.executor)
+            except Exception as e:
+                print(f"Rollup failed: {e}")
+
+
+# --- 4. Rollups ---
+async def rollup(executor, older_than_days=RAW_RETENTION_DAYS, unit=ROLLUP_UNIT, point_batch=100, limit=50000,
+                 now=None) -> int:
+    """Roll up raw measurements older than `older_than_days`; returns how many were folded."""
+    cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=older_than_days)).isoformat()
+    point_ids = [row["id"] for row in await executor.read(POINT_IDS, name="ingest:points")]
+    total = 0
+    for start in range(0, len(point_ids), point_batch):
+        params = {"point_ids": point_ids[start:start + point_batch], "cutoff": cutoff, "unit": unit, "limit": limit}
+        while True:
+            rows = await executor.write(ROLLUP, params, name="ingest:rollup")
+            folded = (rows[0]["rolled_up"] or 0) if rows else 0
+            total += folded
+            if folded < limit:
+                break
+    if total:
+        await executor.write(BUMP_LABEL_VERSIONS, {"labels": ["Measurement", "Measurement Rollup"]},
+                             name="ingest:versions")
+    print(f"Rolled up {total} measurements older than {cutoff} into {unit} buckets")
+    return total
+
+
+# --- 5. Command line ---
+async def _main(args):
+    from . import resources
+
+    executor = resources.async_graph.get()
+    try:
+        if args.files:
+            kinds = args.kind or ["measurement"]
+            async with Ingestor(executor, batch_size=args.batch_size, writers=args.writers) as ingestor:
+                for i, path in enumerate(args.files):
+                    await ingestor.put_many(kinds[min(i, len(kinds) - 1)], read_records(path))
+            print(json.dumps(ingestor.stats.summary(), indent=2))
+        if args.rollup or args.rollup_only:
+            await rollup(executor, older_than_days=args.retention_days)
+    finally:
+        await executor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest Measurement and Alarm records into Neo4j.")
+    parser.add_argument("files", nargs="*", help="CSV or JSONL files; '-' reads JSONL from stdin.")
+    parser.add_argument("--kind", action="append", choices=sorted(KINDS),
+                        help="Record kind per file, in order (the last one repeats). Default: measurement.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--writers", type=int, default=WRITERS)
+    parser.add_argument("--rollup", action="store_true", help="Roll up old measurements after ingesting.")
+    parser.add_argument("--rollup-only", action="store_true")
+    parser.add_argument("--retention-days", type=float, default=RAW_RETENTION_DAYS)
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Latest-value projection for Network Points. Each point keeps a LATEST
+# relationship to its newest Measurement and caches that reading on itself,
+# with the Present System Mode reading already resolved to its mode name:
+#
+#   (np:`Network Point`)-[:LATEST]->(m:Measurement)
+#   np.latest_value, np.latest_recorded_time, np.latest_mode
+#
+# so "what mode is the building in?" and "is Chiller 4 operating?" read one
+# node instead of sorting a point's whole measurement history.
+# ingestion.py keeps the projection current as measurements arrive (see
+# ADVANCE_LATEST); backfill() rebuilds it for data loaded before it existed.
+
+from .caching import BUMP_LABEL_VERSIONS
+
+MODE_POINT = "Present System Mode"
+BATCH_SIZE = 500
+
+# Expects rows of (np, newest). Only moves LATEST forward, so replaying an
+# older batch never overwrites a newer reading.
+_PROJECT = """
+OPTIONAL MATCH (np)-[old:LATEST]->(current:Measurement)
+WITH np, newest, old, current
+WHERE current IS NULL OR newest.recorded_time >= current.recorded_time
+DELETE old
+MERGE (np)-[:LATEST]->(newest)
+WITH np, newest
+OPTIONAL MATCH (mode:`Mode Name` {`present system mode`: toInteger(trim(toString(newest.value)))})
+WHERE np.network_point = $mode_point
+SET np.latest_value = newest.value,
+    np.latest_recorded_time = newest.recorded_time,
+    np.latest_mode = mode.mode
+RETURN count(np) AS updated
+"""
+
+# Tail for a write that ends with rows of (np, m) for newly written
+# measurements, so ingestion maintains LATEST in the same transaction.
+ADVANCE_LATEST = """
+WITH np, m ORDER BY m.recorded_time DESC
+WITH np, head(collect(m)) AS newest
+""".strip() + "\n" + _PROJECT.strip()
+
+# The same for measurements that are already written.
+UPDATE_LATEST = """
+UNWIND $measurement_ids AS measurement_id
+MATCH (np:`Network Point`)-[:HASMEASUREMENT]->(m:Measurement {id: measurement_id})
+""".strip() + "\n" + ADVANCE_LATEST
+
+BACKFILL_LATEST = """
+MATCH (np:`Network Point`) WHERE elementId(np) IN $point_ids
+CALL {
+  WITH np
+  MATCH (np)-[:HASMEASUREMENT]->(m:Measurement)
+  RETURN m AS newest ORDER BY m.recorded_time DESC LIMIT 1
+}
+""".strip() + "\n" + _PROJECT.strip()
+
+POINT_IDS = "MATCH (np:`Network Point`) RETURN elementId(np) AS id"
+
+
+def update_latest(executor, measurement_ids, mode_point=MODE_POINT) -> int:
+    """Advance the projection for the points these measurements belong to; returns points updated."""
+    if not measurement_ids:
+        return 0
+    rows = executor.write(UPDATE_LATEST, {"measurement_ids": list(measurement_ids), "mode_point": mode_point},
+                          name="latest:update")
+    return rows[0]["updated"] if rows else 0
+
+
+def backfill(executor, batch_size=BATCH_SIZE, mode_point=MODE_POINT) -> int:
+    """Rebuild the projection for every Network Point, `batch_size` points per transaction."""
+    point_ids = [row["id"] for row in executor.read(POINT_IDS, name="latest:points")]
+    updated = 0
+    for start in range(0, len(point_ids), batch_size):
+        rows = executor.write(BACKFILL_LATEST, {"point_ids": point_ids[start:start + batch_size],
+                                                "mode_point": mode_point}, name="latest:backfill")
+        updated += rows[0]["updated"] if rows else 0
+        print(f"Backfilled {min(start + batch_size, len(point_ids))}/{len(point_ids)} network points")
+    executor.write(BUMP_LABEL_VERSIONS, {"labels": ["Network Point"]}, name="latest:versions")
+    return updated
@@ -0,0 +1,316 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+# Structure-aware chunking, near-duplicate detection and equipment linking for
+# manual ingestion (setup/embeddings.py).
+#
+# A manual's pages are cut into sections at headings: numbered ("3.2 Filter
+# replacement"), keyword ("Chapter 4", "Appendix B"), all-caps lines, and the
+# titles in the PDF's outline when it has one. Running headers and footers
+# (lines repeated on most pages), page numbers and table-of-contents entries
+# are dropped. Paragraphs are packed into chunks that never cross a section,
+# each starting with its heading path so the chunk stands on its own.
+#
+# SimHash over word shingles finds chunks that are near-copies of one already
+# kept (legal pages, safety notices, warranty terms repeated across manuals)
+# so they are neither embedded nor written. Equipment is linked by model and
+# manufacturer against one bulk read of the graph's Equipment nodes.
+
+# --- Configuration ---
+CHUNK_SIZE = int(os.getenv("MANUALS_CHUNK_SIZE", "1000"))
+# Chunks shorter than this are merged into the next one in the same top-level section.
+MIN_CHUNK_SIZE = int(os.getenv("MANUALS_MIN_CHUNK_SIZE", "400"))
+# Only used when a single paragraph is longer than CHUNK_SIZE.
+CHUNK_OVERLAP = 100
+# A line on at least this share of a manual's pages (and at least 3) is a running header or footer.
+REPEATED_LINE_SHARE = 0.5
+SHINGLE_WORDS = 3
+# Differing SimHash bits up to which two chunks count as near-duplicates.
+SIMHASH_DISTANCE = int(os.getenv("MANUALS_SIMHASH_DISTANCE", "3"))
+SIMHASH_BANDS = 4
+# Lines after a "1." line searched for the "2." that makes it a procedure step rather than a heading.
+STEP_LOOKAHEAD = 3
+# Section titles whose content is dropped.
+SKIP_SECTIONS = re.compile(r"^(table of )?contents$|^index$", re.IGNORECASE)
+
+EQUIPMENT_CATALOG = """
+MATCH (e:Equipment)
+RETURN elementId(e) AS id, e.name AS name, e.model AS model, e.manufacturer AS manufacturer
+"""
+
+_NUMBERED = re.compile(r"^(?P<number>\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+(?P<title>[A-Z][^.!?:;]{1,80})$")
+_KEYWORD = re.compile(r"^(?:chapter|section|appendix|part)\s+[0-9A-Z]{1,3}\b[.:\-]?\s*(?P<title>.{0,80})$", re.IGNORECASE)
+_NOT_HEADINGS = {"WARNING", "CAUTION", "NOTE", "DANGER", "IMPORTANT"}
+_TOC_ENTRY = re.compile(r"(?:\.\s*){4,}\d+$|\s{3,}\d+$")
+_PAGE_NUMBER = re.compile(r"^(?:page\s+)?\d+(?:\s*(?:/|of)\s*\d+)?$", re.IGNORECASE)
+_STEP = re.compile(r"^(?P<number>\d{1,2})[.)]\s+\S")
+_LIST_ITEM = re.compile(r"^(?:[-•*▪]|\(?\d{1,2}[.)]|[a-z][.)])\s+")
+
+
+def _normalize(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().casefold()
+
+
+def _line_key(line: str) -> str:
+    # Digits vary between copies of a running footer ("Page 3 of 40").
+    return re.sub(r"\d+", "#", _normalize(line))
+
+
+def repeated_lines(pages) -> set:
+    """Keys of lines that repeat on most pages of one manual: running headers and footers."""
+    if len(pages) < 3:
+        return set()
+    counts = {}
+    for text, _ in pages:
+        for key in {_line_key(line) for line in text.splitlines() if line.strip()}:
+            counts[key] = counts.get(key, 0) + 1
+    threshold = max(3, REPEATED_LINE_SHARE * len(pages))
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def heading_level(line: str, outline=None):
+    """The heading level of `line` (1 = top), or None if it reads as body text."""
+    if outline and _normalize(line) in outline:
+        return outline[_normalize(line)]
+    match = _NUMBERED.match(line)
+    if match and len(match.group("title").split()) <= 10:
+        return match.group("number").count(".") + 1
+    if _KEYWORD.match(line):
+        return 1
+    letters = re.sub(r"[^A-Za-z]", "", line)
+    if (len(letters) >= 4 and line.isupper() and len(line) <= 60 and len(line.split()) <= 8
+            and line.strip(" :") not in _NOT_HEADINGS and not line.rstrip().endswith((".", ","))):
+        return 1
+    return None
+
+
+def flatten_outline(outline, level=1, titles=None) -> dict:
+    """A pypdf outline (nested lists of destinations) as {normalized title: level}."""
+    titles = {} if titles is None else titles
+    for item in outline or []:
+        if isinstance(item, list):
+            flatten_outline(item, level + 1, titles)
+        elif getattr(item, "title", None):
+            titles.setdefault(_normalize(item.title), level)
+    return titles
+
+
+def _step_number(lines, i, last_step, outline=None):
+    """
+    The number of line `i` if it is a step of a numbered procedure ("1. Turn
+    off power at the disconnect") rather than a heading: it carries on from
+    the previous step, or the next numbered line within STEP_LOOKAHEAD lines
+    carries on from it.
+    """
+    match = _STEP.match(lines[i][0])
+    if not match or (outline and _normalize(lines[i][0]) in outline):
+        return None
+    number = int(match.group("number"))
+    if last_step and number == last_step + 1:
+        return number
+    for line, _ in lines[i + 1:i + 1 + STEP_LOOKAHEAD]:
+        following = _STEP.match(line)
+        if following:
+            return number if int(following.group("number")) == number + 1 else None
+    return None
+
+
+def sections(pages, outline=None):
+    """
+    Yield (heading path, page, paragraph) for every body paragraph of a manual,
+    given its pages as (text, page number) pairs. Headers, footers, page
+    numbers and contents entries are dropped.
+    """
+    boilerplate = repeated_lines(pages)
+    path, paragraph, paragraph_page, step = (), [], None, 0
+    lines = [(raw.strip(), page) for text, page in pages for raw in text.splitlines()]
+    for i, (line, page) in enumerate(lines):
+        if not line or _PAGE_NUMBER.match(line) or _line_key(line) in boilerplate or _TOC_ENTRY.search(line):
+            if paragraph and not line:
+                yield path, paragraph_page, " ".join(paragraph)
+                paragraph = []
+            continue
+        # Numbered steps read like "1 Installation" headings; they stay body text (list items).
+        number = _step_number(lines, i, step, outline)
+        level = heading_level(line, outline) if number is None else None
+        if number is not None:
+            step = number
+        if level is not None:
+            if paragraph:
+                yield path, paragraph_page, " ".join(paragraph)
+                paragraph = []
+            path, step = path[:level - 1] + (line,), 0
+            continue
+        if paragraph and _LIST_ITEM.match(line):
+            yield path, paragraph_page, " ".join(paragraph)
+            paragraph = []
+        if not paragraph:
+            paragraph_page = page
+        paragraph.append(line)
+    if paragraph:
+        yield path, paragraph_page, " ".join(paragraph)
+
+
+def _split_long(text, chunk_size):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=CHUNK_OVERLAP).split_text(text)
+
+
+def _common_path(a, b):
+    n = 0
+    while n < min(len(a), len(b)) and a[n] == b[n]:
+        n += 1
+    return a[:n]
+
+
+def chunk_manual(pages, outline=None, chunk_size=CHUNK_SIZE, min_size=MIN_CHUNK_SIZE):
+    """
+    Split a manual into chunks that follow its sections. Returns dicts with
+    `text` (heading path, then the body), `body`, `section`, `page` and
+    `simhash` (of the body, as 16 hex digits).
+    """
+    pieces = []  # [path, page, body]
+    for path, page, paragraph in sections(pages, outline):
+        if any(SKIP_SECTIONS.match(title) for title in path):
+            continue
+        parts = _split_long(paragraph, chunk_size) if len(paragraph) > chunk_size else [paragraph]
+        for part in parts:
+            last = pieces[-1] if pieces else None
+            if last and last[0] == path and len(last[2]) + 1 + len(part) <= chunk_size:
+                last[2] += "\n" + part
+            else:
+                pieces.append([path, page, part])
+
+    # Fold short chunks into the next one under the same top-level heading.
+    merged = []
+    for piece in pieces:
+        last = merged[-1] if merged else None
+        if (last and len(last[2]) < min_size and last[0][:1] == piece[0][:1]
+                and len(last[2]) + len(piece[2]) + sum(map(len, last[0] + piece[0])) <= chunk_size):
+            # Headings below the shared path stay in the text.
+            common = _common_path(last[0], piece[0])
+            last[2] = "\n".join(filter(None, [" > ".join(last[0][len(common):]), last[2],
+                                              " > ".join(piece[0][len(common):]), piece[2]]))
+            last[0] = common
+        else:
+            merged.append(piece)
+
+    chunks = []
+    for path, page, body in merged:
+        section = " > ".join(path)
+        chunks.append({
+            "text": f"{section}\n{body}" if section else body,
+            "body": body,
+            "section": section or None,
+            "page": page,
+            "simhash": f"{simhash(body):016x}",
+        })
+    return chunks
+
+
+# --- Near-duplicates ---
+def simhash(text: str) -> int:
+    """64-bit SimHash of the text's word shingles."""
+    words = re.findall(r"\w+", text.casefold())
+    shingles = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+                       for s in shingles], dtype="<u8")
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+class SimHashIndex:
+    """
+    SimHashes of kept chunks. Each hash is split into SIMHASH_BANDS bands;
+    two hashes within SIMHASH_DISTANCE bits (fewer than the number of bands)
+    share at least one band exactly, so only those candidates are compared.
+    """
+
+    def __init__(self, distance=SIMHASH_DISTANCE, bands=SIMHASH_BANDS):
+        if distance >= bands:
+            raise ValueError("SimHash distance must be smaller than the number of bands.")
+        self.distance = distance
+        self.width = 64 // bands
+        self.bands = [{} for _ in range(bands)]
+
+    def _keys(self, value):
+        mask = (1 << self.width) - 1
+        return [(value >> (i * self.width)) & mask for i in range(len(self.bands))]
+
+    def find(self, value: int):
+        """The id of a kept chunk within `distance` bits of `value`, or None."""
+        for band, key in zip(self.bands, self._keys(value)):
+            for other, chunk_id in band.get(key, ()):
+                if bin(value ^ other).count("1") <= self.distance:
+                    return chunk_id
+        return None
+
+    def add(self, value: int, chunk_id):
+        for band, key in zip(self.bands, self._keys(value)):
+            band.setdefault(key, []).append((value, chunk_id))
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.bands[0].values())
+
+
+# --- Equipment linking ---
+def _alternation(terms):
+    terms = sorted({t for t in terms if t}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"(?<![\w-])(" + "|".join(re.escape(t) for t in terms) + r")(?![\w-])", re.IGNORECASE)
+
+
+class EquipmentMatcher:
+    """
+    Finds the Equipment a manual and its chunks are about, from rows of
+    EQUIPMENT_CATALOG. A manual applies to the equipment whose model appears
+    in its file name or first pages (lead_text); a chunk that names models of its own is
+    linked to those instead. When a manufacturer of the candidates is
+    mentioned, equipment from other manufacturers is left out, so a model
+    number two vendors share is not linked to both.
+    """
+
+    def __init__(self, rows, min_model_length=3):
+        self.by_model = {}
+        self.manufacturers = set()
+        for row in rows:
+            model = (row.get("model") or "").strip()
+            if len(model) >= min_model_length:
+                self.by_model.setdefault(model.casefold(), []).append(row)
+            if row.get("manufacturer"):
+                self.manufacturers.add(row["manufacturer"].strip())
+        self._models = _alternation(self.by_model)
+        self._manufacturers = _alternation(self.manufacturers)
+
+    def _mentioned(self, text):
+        if not self._models:
+            return []
+        return [row for model in {m.casefold() for m in self._models.findall(text)} for row in self.by_model[model]]
+
+    def _filter(self, rows, text):
+        makers = {m.casefold() for m in self._manufacturers.findall(text)} if self._manufacturers else set()
+        if makers and any((r.get("manufacturer") or "").casefold() in makers for r in rows):
+            rows = [r for r in rows if (r.get("manufacturer") or "").casefold() in makers]
+        return sorted({r["id"] for r in rows})
+
+    def for_manual(self, lead: str):
+        """Equipment ids for a manual, given its lead_text()."""
+        return self._filter(self._mentioned(lead), lead)
+
+    def for_chunk(self, text: str, manual_equipment, lead=""):
+        rows = self._mentioned(text)
+        if not rows:
+            return list(manual_equipment)
+        return self._filter(rows, text + " " + lead)
+
+
+def lead_text(source: str, pages, lead_pages=2) -> str:
+    """A manual's file name and first pages, where its model and manufacturer are normally stated."""
+    name = os.path.splitext(os.path.basename(source))[0]
+    return " ".join([re.sub(r"[_]+", " ", name)] + [text for text, _ in pages[:lead_pages]])
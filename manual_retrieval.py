@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+
+from .cypher_templates import escape_fulltext
+
+# --- Configuration ---
+VECTOR_INDEX = "manual_chunks_langchain"
+FULLTEXT_INDEX = "manual_chunks_fulltext"
+TOP_K = int(os.getenv("MANUALS_TOP_K", "10"))
+# How many hits each retriever contributes before fusion. Larger pools trade
+# latency for recall.
+CANDIDATE_POOL = int(os.getenv("MANUALS_CANDIDATE_POOL", "100"))
+# "rrf" (reciprocal-rank fusion) or "weighted" (min-max normalized scores).
+FUSION = os.getenv("MANUALS_FUSION", "rrf")
+RRF_K = 60
+RETRIEVER_WEIGHTS = {"vector": 1.0, "fulltext": 1.0}
+# Added to the fused score of chunks linked to an equipment node that matches the
+# question. The default is on the scale of one top-ranked RRF contribution.
+ANCHOR_BONUS = float(os.getenv("MANUALS_ANCHOR_BONUS", "0.02"))
+ANCHOR_LIMIT = 3
+
+
+# One round-trip: resolve candidate equipment anchors, then run the vector and
+# chunk full-text searches and return every hit with the anchors it belongs to.
+# The anchor subquery returns a single (possibly empty) collected row, so the
+# searches still run when nothing matches.
+HYBRID_SEARCH = """
+CALL {
+  CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', $anchor_text, {limit: 25}) YIELD node, score
+  WHERE 'Equipment' IN labels(node)
+  WITH node ORDER BY score DESC LIMIT $anchor_limit
+  RETURN collect(node) AS anchors
+}
+CALL {
+  CALL db.index.vector.queryNodes($vector_index, $candidates, $question_embedding) YIELD node, score
+  RETURN 'vector' AS retriever, node AS chunk, score
+  UNION ALL
+  CALL db.index.fulltext.queryNodes($fulltext_index, $question_text, {limit: $candidates}) YIELD node, score
+  RETURN 'fulltext' AS retriever, node AS chunk, score
+}
+RETURN retriever, elementId(chunk) AS id, chunk.text AS text, chunk.source AS source, chunk.page AS page, score,
+       [equipment IN anchors WHERE (equipment)-[:HAS_CHUNK]->(chunk) | equipment.name] AS equipment
+"""
+
+EXPORT_CHUNKS = """
+MATCH (chunk:Chunk) WHERE chunk.embedding IS NOT NULL
+OPTIONAL MATCH (equipment:Equipment)-[:HAS_CHUNK]->(chunk)
+RETURN elementId(chunk) AS id, chunk.text AS text, chunk.embedding AS embedding,
+       chunk.source AS source, chunk.page AS page, collect(equipment.name) AS equipment
+"""
+
+
+def fuse(rows, top_k=TOP_K, method=FUSION, weights=RETRIEVER_WEIGHTS, anchor_bonus=ANCHOR_BONUS):
+    """
+    Merge per-retriever hits into one ranking. Each returned chunk carries its
+    fused `score`, the per-retriever scores, its source metadata and the
+    matching equipment names.
+    """
+    by_retriever = {}
+    for row in rows:
+        by_retriever.setdefault(row["retriever"], []).append(row)
+
+    fused = {}
+    for retriever, hits in by_retriever.items():
+        hits.sort(key=lambda r: r["score"], reverse=True)
+        weight = weights.get(retriever, 1.0)
+        if method == "weighted":
+            high, low = hits[0]["score"], hits[-1]["score"]
+            span = high - low
+        for rank, hit in enumerate(hits):
+            chunk = fused.setdefault(hit["id"], {
+                "id": hit["id"],
+                "text": hit["text"],
+                "source": hit.get("source"),
+                "page": hit.get("page"),
+                "equipment": hit.get("equipment") or [],
+                "scores": {},
+                "score": 0.0,
+            })
+            if retriever in chunk["scores"]:
+                continue
+            chunk["scores"][retriever] = hit["score"]
+            if method == "weighted":
+                # Min-max normalized; a retriever's only hit (or tied hits) counts fully.
+                chunk["score"] += weight * ((hit["score"] - low) / span if span else 1.0)
+            else:
+                chunk["score"] += weight / (RRF_K + rank + 1)
+
+    for chunk in fused.values():
+        if chunk["equipment"]:
+            chunk["score"] += anchor_bonus
+    return sorted(fused.values(), key=lambda c: c["score"], reverse=True)[:top_k]
+
+
+def _search_params(question, question_embedding, anchor_text, candidates):
+    return {
+        "vector_index": VECTOR_INDEX,
+        "fulltext_index": FULLTEXT_INDEX,
+        "question_text": escape_fulltext(question),
+        "anchor_text": escape_fulltext(anchor_text or question),
+        "anchor_limit": ANCHOR_LIMIT,
+        "question_embedding": question_embedding,
+        "candidates": candidates,
+    }
+
+
+def hybrid_search(graph, question, question_embedding, anchor_text=None, top_k=TOP_K, candidates=CANDIDATE_POOL):
+    """
+    Vector plus full-text chunk retrieval in a single query, fused in Python.
+    `anchor_text` narrows the equipment match (e.g. an LLM-extracted name);
+    by default the question itself is matched against equipment names.
+    """
+    rows = graph.query(HYBRID_SEARCH, params=_search_params(question, question_embedding, anchor_text, max(candidates, top_k)))
+    return fuse(rows, top_k)
+
+
+async def ahybrid_search(async_graph, question, question_embedding, anchor_text=None, top_k=TOP_K,
+                         candidates=CANDIDATE_POOL):
+    """Async version of hybrid_search, for an AsyncGraphExecutor."""
+    rows = await async_graph.query(
+        HYBRID_SEARCH, params=_search_params(question, question_embedding, anchor_text, max(candidates, top_k)),
+        name="manuals_hybrid",
+    )
+    return fuse(rows, top_k)
+
+
+class LocalANNIndex:
+    """
+    In-process IVF index over a float32 embedding matrix, for testing retrieval
+    without a database. Vectors are clustered with a few rounds of k-means; a
+    search scores only the `n_probe` closest clusters and re-ranks exactly.
+    """
+
+    def __init__(self, embeddings, texts, equipment=None, sources=None, pages=None, n_lists=None, n_probe=8, seed=0):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+        self.texts = list(texts)
+        self.equipment = [list(e) for e in equipment] if equipment is not None else [[] for _ in self.texts]
+        self.sources = list(sources) if sources is not None else [None] * len(self.texts)
+        self.pages = list(pages) if pages is not None else [None] * len(self.texts)
+        self.n_probe = n_probe
+        n_lists = n_lists or max(1, int(np.sqrt(len(self.vectors))))
+        self.centroids, self.assignments = _kmeans(self.vectors, n_lists, seed=seed)
+        self.lists = [np.flatnonzero(self.assignments == i) for i in range(len(self.centroids))]
+
+    @classmethod
+    def from_npz(cls, path, **kwargs):
+        data = np.load(path, allow_pickle=True)
+        optional = {name: data[name] for name in ("sources", "pages") if name in data}
+        return cls(data["embeddings"], data["texts"], data["equipment"], **optional, **kwargs)
+
+    def search(self, question_embedding, anchor_text=None, top_k=TOP_K, candidates=CANDIDATE_POOL):
+        """Return fused-format chunks; equipment whose name appears in `anchor_text` counts as an anchor."""
+        query = np.asarray(question_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        probe = np.argsort(self.centroids @ query)[::-1][:self.n_probe]
+        ids = np.concatenate([self.lists[i] for i in probe]) if len(probe) else np.array([], dtype=int)
+        scores = self.vectors[ids] @ query
+        order = np.argsort(scores)[::-1][:max(candidates, top_k)]
+
+        needle = (anchor_text or "").lower()
+        rows = []
+        for i in order:
+            index = int(ids[i])
+            rows.append({
+                "retriever": "vector",
+                "id": index,
+                "text": self.texts[index],
+                "source": self.sources[index],
+                "page": self.pages[index],
+                "score": float(scores[i]),
+                "equipment": [name for name in self.equipment[index] if name and name.lower() in needle],
+            })
+        return fuse(rows, top_k)
+
+
+def export_chunk_embeddings(graph, path):
+    """Dump every chunk's text, embedding, source and linked equipment names to an .npz file."""
+    rows = graph.query(EXPORT_CHUNKS)
+    equipment = np.empty(len(rows), dtype=object)
+    for i, row in enumerate(rows):
+        equipment[i] = row["equipment"]
+    np.savez(
+        path,
+        ids=np.array([r["id"] for r in rows], dtype=object),
+        texts=np.array([r["text"] for r in rows], dtype=object),
+        embeddings=np.array([r["embedding"] for r in rows], dtype=np.float32),
+        sources=np.array([r["source"] for r in rows], dtype=object),
+        pages=np.array([r["page"] for r in rows], dtype=object),
+        equipment=equipment,
+    )
+    return len(rows)
+
+
+def _kmeans(vectors, k, iterations=10, seed=0):
+    k = min(k, len(vectors))
+    if k == 0:
+        return np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32), np.zeros(0, dtype=int)
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(k):
+            members = vectors[assignments == i]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[i] = centroid / (np.linalg.norm(centroid) or 1)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
@@ -9,7 +9,7 @@ The database contains the following nodes and relationships. You must use these
 * `Equipment`: Represents physical assets. Properties: `id`, 'unique_identifier', `name`, `manufacturer`, `model`, `year_installed`, `replacement_cost`, 'lifespan'.
 * `Room`: Represents physical locations. Properties: `id`, `name`, `floor`, `category`.
 * `Part`: Represents spare parts for equipment. Properties: `id`, `namwhe`, `quantity`.
-* `SPECIFICATION`: Represents technical details for parts. Properties: `id`, `name`, `value`.
+* `Specification`: Represents technical details for parts. Properties: `id`, `name`. The value is on the `HASSPECIFICATION` relationship (`value`).
 * `Vendor`: Represents external suppliers. Properties: `id`, `name`, `service_provided`, `phone_numbers`, `emails`.
 * `Work Order`: Represents maintenance tasks. Properties: `id`, `order_number`, `description`, `status`, `priority`, `requestor`, `assigned_to`.
 * `Alarm`: Represents system alerts. Properties: `id`, `message`, `status`, `type`, `active`, `recorded_time`.
@@ -17,8 +17,9 @@ The database contains the following nodes and relationships. You must use these
 * `Maintenance Routine`: Represents scheduled maintenance. Properties: `id`, `issue_description`, `recurrence`, `status`.
 * `Asset Class`: A hierarchical classification for equipment. Properties: `id`, `name`.
 * `Storage Location`: Where parts or other items are stored. Properties: `id`, `location`, `floor`, `content`.
-* `Network Point`: Represents a point in the building where a measurement is taken. Properties: `id`, `network_point`, `value`, 'control_program'.
+* `Network Point`: Represents a point in the building where a measurement is taken. Properties: `id`, `network_point`, `value`, 'control_program', `latest_value`, `latest_recorded_time`, `latest_mode`. The `latest_*` properties hold the point's newest measurement (`latest_mode` is the resolved mode name, only on 'Present System Mode').
 * `Mode Name`: Stores the name of a modes for the 'Present System Mode' network point. Properties: `mode`, `present system mode`.
+* `Measurement Rollup`: Hourly summary of a network point's older measurements (raw readings are only kept for recent weeks). Properties: `network_point`, `bucket_start`, `unit`, `count`, `min`, `max`, `avg`, `last_value`, `last_time`.
 
 **Relationship Types:**
 * `(:Equipment)-[:LOCATEDIN]->(:Room)`
@@ -28,9 +29,11 @@ The database contains the following nodes and relationships. You must use these
 * `(:Equipment)-[:HASORDER]->(:`Work Order`)`
 * `(:Equipment)-[:HASROUTINE]->(:Maintenance Routine)`
 * `(:Equipment)-[:PARTOF]->(:`Asset Class`)`
-* `(:Part)-[:HASSPECIFICATION]->(:SPECIFICATION)`
+* `(:Part)-[:HASSPECIFICATION {value}]->(:Specification)`
 * `(:`Asset Class`)-[:HASPARENTCLASS]->(:`Asset Class`)`
 * '(:`Network Point`)-[:HASMEASUREMENT]->(:Measurement)'
+* '(:`Network Point`)-[:LATEST]->(:Measurement)' (the point's newest measurement only)
+* '(:`Network Point`)-[:HASROLLUP]->(:`Measurement Rollup`)'
 * '(:`Measurement`)-[:HASNAME]->(:`Mode Name`)'
 
 ---
@@ -71,7 +74,7 @@ From your anchor node, `MATCH` to the related nodes you need. If the user's ques
     // Take the top result and continue
     WITH equipment ORDER BY score DESC LIMIT 1
     // Step 3: Traverse from the anchor to find the location
-    MATCH (equipment)-[:LOCATED_IN]->(room:Room)
+    MATCH (equipment)-[:LOCATEDIN]->(room:Room)
     RETURN room.name AS Location
     ```
 
@@ -85,7 +88,7 @@ From your anchor node, `MATCH` to the related nodes you need. If the user's ques
     // Take the top result and continue
     WITH room ORDER BY score DESC LIMIT 1
     // Step 3: Traverse from the anchor to find all connected equipment
-    MATCH (equipment:Equipment)-[:LOCATED_IN]->(room)
+    MATCH (equipment:Equipment)-[:LOCATEDIN]->(room)
     RETURN equipment.name AS EquipmentName
     ```
 
@@ -99,9 +102,9 @@ From your anchor node, `MATCH` to the related nodes you need. If the user's ques
     // Take the top result and continue
     WITH room ORDER BY score DESC LIMIT 1
     // Step 3 (Traverse): Find all equipment located in that room
-    MATCH (equipment:Equipment)-[:LOCATED_IN]->(room)
+    MATCH (equipment:Equipment)-[:LOCATEDIN]->(room)
     // Step 3 (Filter): Apply the secondary filter for "pumps" using a WHERE clause
-    WHERE equipment.category =~ '(?i)pump' OR equipment.name =~ '(?i).*pump.*'
+    WHERE equipment.name =~ '(?i).*pump.*'
     RETURN equipment.name AS PumpName, equipment.unique_identifier as Identifier
     ```
 
@@ -123,7 +126,7 @@ Use the `DISTINCT` keyword when aggregating or listing results to avoid duplicat
 
 **5. Be Helpful—Avoid Empty Results**
 
-If a query for a specific detail (like a single `SPECIFICATION`) might fail, broaden the search to provide context. For instance, if you can't find a "voltage" spec for a part, return *all* available specifications for that part instead of returning nothing.
+If a query for a specific detail (like a single `Specification`) might fail, broaden the search to provide context. For instance, if you can't find a "voltage" spec for a part, return *all* available specifications for that part instead of returning nothing.
 
 **6. Combine  Search with Traversal:** For complex questions, first use the strategies above to find the starting nodes, then traverse the relationships to find the answer.
     * **Example:** "What is the phone number for the vendor that supplies parts for the main air handler?"
@@ -155,7 +158,7 @@ Example: 'Is Chiller 4 operating?' There is a network point called 'Chiller 4 Ca
 
 Example: :MATCH (np:`Network Point`) instead of :MATCH (np:Network Point)
 
-Once you find the correct netework point, you can return a relevant measurement. 
+Once you find the correct netework point, you can return a relevant measurement. For the current value, return the point's `latest_value` and `latest_recorded_time` properties instead of sorting its measurements; only traverse HASMEASUREMENT for history (e.g. "over the last week").
 
 **12. Present System Modes**
 
@@ -163,9 +166,9 @@ The "present system mode" network point is a special and commonly accessed node
 
 Example question: "What mode is the building in?", "Are we using mechanical cooling?"
 
-This network point's measurement values are integers. If it is an integer, you should use the `Mode Name` node to get the name of the mode.
+This network point's measurement values are integers that map to `Mode Name` nodes. The current mode's name is already stored on the point as `latest_mode`, so no traversal is needed.
 
-Example query: "Are we using mechanical cooling?" -> We infer that the user is asking if the buildings current present system mode is mechanical cooling. So, we find the latest measurement value from the 'Present System Mode' network point and then use the `Mode Name` node to get the name of the mode and check if it's "mode" property contains the word 'mechanical cooling'.
+Example query: "Are we using mechanical cooling?" -> We infer that the user is asking if the buildings current present system mode is mechanical cooling. So, we match the 'Present System Mode' network point and check if its `latest_mode` property contains the word 'mechanical cooling'.
 
 ---
 
@@ -176,6 +179,163 @@ Based on the rules above, generate a single, complete, and runnable Cypher query
 **Cypher Query:**
 """
 
+# Compact Cypher-generation prompt assembled per question by prompt_builder.py:
+# only the relevant part of the live schema, the rules for those labels, and
+# the few most similar examples from CYPHER_EXAMPLES.
+CYPHER_CORE_TEMPLATE = """
+You convert a building maintenance operator's question into one runnable Cypher query for Neo4j.
+
+**Schema (use these exact labels, relationship types and property names):**
+{schema}
+
+**Rules:**
+1. Find the single primary subject (the anchor: a piece of equipment, a room, a network point) with the full-text index first: `CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', '<text>') YIELD node, score`, optionally `WHERE '<Label>' IN labels(node)`, then `WITH node ORDER BY score DESC LIMIT 1`.
+2. Traverse from the anchor with `MATCH`; apply secondary filters (e.g. "pumps", "open work orders") with `WHERE`.
+3. String filters are case-insensitive regexes: `WHERE n.name =~ '(?i).*pump.*'`.
+4. Wrap labels containing spaces in backticks, e.g. (:`Work Order`).
+5. Use `RETURN DISTINCT` for lists. If a specific detail may be missing, return the broader context instead of nothing.
+{rules}
+**Examples:**
+{examples}
+
+**User Question:** {question}
+
+**Cypher Query:**
+"""
+
+# Extra rules included only when their label is part of the selected schema.
+CYPHER_LABEL_RULES = {
+    "Network Point": "- Measurements and statuses usually hang off a `Network Point`; full-text search for the point (e.g. 'condenser flow', 'Chiller 4 Capacity') and return its `latest_value` and `latest_recorded_time` for the current reading. Only traverse HASMEASUREMENT for history.",
+    "Mode Name": "- The current building mode is `latest_mode` on the 'Present System Mode' `Network Point`; use (:Measurement)-[:HASNAME]->(:`Mode Name`) only for past modes.",
+    "Measurement Rollup": "- Raw measurements are only kept for recent weeks; for older history use the point's (:`Network Point`)-[:HASROLLUP]->(:`Measurement Rollup`) buckets by `bucket_start`.",
+    "Equipment": "- Equipment identifiers are usually in `name` or `unique_identifier`.",
+}
+
+# Few-shot bank for prompt_builder. `labels` feed the schema selection.
+CYPHER_EXAMPLES = [
+    {
+        "question": "Where is PP-13 located?",
+        "labels": ["Equipment", "Room"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'PP-13') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:LOCATEDIN]->(room:Room)
+RETURN room.name AS Location""",
+    },
+    {
+        "question": "What equipment is in the cafeteria?",
+        "labels": ["Equipment", "Room"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'cafeteria') YIELD node AS room, score
+WHERE 'Room' IN labels(room)
+WITH room ORDER BY score DESC LIMIT 1
+MATCH (equipment:Equipment)-[:LOCATEDIN]->(room)
+RETURN DISTINCT equipment.name AS EquipmentName""",
+    },
+    {
+        "question": "List all pumps in the steam room.",
+        "labels": ["Equipment", "Room"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'steam room') YIELD node AS room, score
+WHERE 'Room' IN labels(room)
+WITH room ORDER BY score DESC LIMIT 1
+MATCH (equipment:Equipment)-[:LOCATEDIN]->(room)
+WHERE equipment.name =~ '(?i).*pump.*'
+RETURN DISTINCT equipment.name AS PumpName, equipment.unique_identifier AS Identifier""",
+    },
+    {
+        "question": "What parts does AHU-2 have and what are their specifications?",
+        "labels": ["Equipment", "Part", "Specification"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'AHU-2') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:HASPART]->(part:Part)
+OPTIONAL MATCH (part)-[hs:HASSPECIFICATION]->(spec:Specification)
+RETURN part.name AS Part, collect(spec.name + ': ' + hs.value) AS Specifications""",
+    },
+    {
+        "question": "Are there any active alarms on Chiller 4?",
+        "labels": ["Equipment", "Alarm"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'Chiller 4') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:HASALARM]->(alarm:Alarm)
+WHERE toString(alarm.active) =~ '(?i)true' OR alarm.status =~ '(?i).*active.*'
+RETURN alarm.message AS Message, alarm.type AS Type, alarm.recorded_time AS Time
+ORDER BY Time DESC""",
+    },
+    {
+        "question": "Show me the open work orders for the boiler.",
+        "labels": ["Equipment", "Work Order"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'boiler') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:HASORDER]->(wo:`Work Order`)
+WHERE wo.status =~ '(?i).*open.*'
+RETURN wo.order_number AS OrderNumber, wo.description AS Description, wo.priority AS Priority, wo.assigned_to AS AssignedTo""",
+    },
+    {
+        "question": "What maintenance routines are scheduled for CT-1?",
+        "labels": ["Equipment", "Maintenance Routine"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'CT-1') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:HASROUTINE]->(routine:`Maintenance Routine`)
+RETURN routine.issue_description AS Routine, routine.recurrence AS Recurrence, routine.status AS Status""",
+    },
+    {
+        "question": "What asset class is EF-3 in?",
+        "labels": ["Equipment", "Asset Class"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'EF-3') YIELD node AS equipment, score
+WHERE 'Equipment' IN labels(equipment)
+WITH equipment ORDER BY score DESC LIMIT 1
+MATCH (equipment)-[:PARTOF]->(class:`Asset Class`)
+OPTIONAL MATCH (class)-[:HASPARENTCLASS*1..]->(parent:`Asset Class`)
+RETURN class.name AS AssetClass, collect(parent.name) AS ParentClasses""",
+    },
+    {
+        "question": "What is the condenser flow rate on CH1?",
+        "labels": ["Network Point"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'CH1 condenser flow') YIELD node AS point, score
+WHERE 'Network Point' IN labels(point)
+WITH point ORDER BY score DESC LIMIT 1
+RETURN point.network_point AS Point, point.latest_value AS Value, point.latest_recorded_time AS Time""",
+    },
+    {
+        "question": "Are we using mechanical cooling?",
+        "labels": ["Network Point", "Mode Name"],
+        "cypher": """MATCH (point:`Network Point` {network_point: 'Present System Mode'})
+RETURN point.latest_value AS ModeValue, point.latest_mode AS Mode,
+       point.latest_mode =~ '(?i).*mechanical cooling.*' AS MechanicalCooling""",
+    },
+    {
+        "question": "Where are the spare filters stored?",
+        "labels": ["Storage Location"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'filters') YIELD node, score
+WHERE 'Storage Location' IN labels(node)
+RETURN node.location AS Location, node.floor AS Floor, node.content AS Content
+ORDER BY score DESC LIMIT 5""",
+    },
+    {
+        "question": "What is the phone number of the elevator service vendor?",
+        "labels": ["Vendor"],
+        "cypher": """CALL db.index.fulltext.queryNodes('generic_names_and_descriptions', 'elevator') YIELD node AS vendor, score
+WHERE 'Vendor' IN labels(vendor)
+WITH vendor ORDER BY score DESC LIMIT 3
+RETURN vendor.name AS Vendor, vendor.service_provided AS Service, vendor.phone_numbers AS Phone""",
+    },
+]
+
+# Appended to the Cypher prompt when cypher_guard rejected the first attempt.
+CYPHER_FEEDBACK_TEMPLATE = """
+
+Your previous query for this question was rejected before it ran:
+{cypher}
+
+Reason: {problem}
+
+Write a corrected read-only Cypher query that uses only the labels and relationship types in the schema.
+Return only the query.
+"""
+
 QA_TEMPLATE = """
 You are an assistant that takes the result of a Cypher query and answers the user's question in a clear, human-readable format.
 The user asked the following question: {question}
@@ -229,27 +389,20 @@ You have three tools to answer questions. You must choose the correct one based
     * **Keywords**: "how to," "troubleshoot," "maintenance procedure," "error code," "what is the process for."
     * **Example**: "How do I reset the pressure on the main pump?" -> Use `answer_from_manuals`
 
-3.  **`ticket_creation_agent(...)`**: Use this agent when the user wants to **create a ticket, report a problem, or file a work order.** Your job is to hand off the task to this agent to handle the conversation.
+3.  **`ticket_agent(request: str)`**: Use this agent when the user wants to **create a ticket, report a problem, or file a work order.** Pass the user's message as `request`; the agent asks its own follow-up questions.
     * **Keywords**: "create a ticket," "report an issue," "file a work order," "I have a problem to report."
-    * **Example**: If the user says "I need to report a leaky pipe," you MUST delegate to the `ticket_creation_agent`.
-    * **Note**: This agent is not a tool, it is an agent. You must use the `AgentTool` to call it. Treat is like an agent. 
-
-**Ticket Creation Tips** ONLY USE THIS TOOL IF THE USER IS ASKING TO CREATE A TICKET/IN THE PROCESS OF CREATING A TICKET.
-
-1.  **Analyze the User's NEW Input:** Look at the user's most recent message.
-2.  **Check the PREVIOUS Assistant Message:** Review the last thing the assistant said.
-3.  **Decide the Correct Action:**
-
-    * **Scenario A: The user is starting a NEW task.**
-        * If the user asks a new question (e.g., "where is MAC-2?", "how do I fix the pump?", "create a ticket"), route them to the appropriate tool based on the keywords below.
-
-    * **Scenario B: The user is CONTINUING a task.**
-        * **This is the most important rule.** If the assistant's last message was a question (e.g., "What is the severity?", "Please describe the issue"), and the user's new message appears to be the answer, you **MUST** route the user's answer back to the **SAME agent** that asked the question.
-        * **Example:** If the last message was "What would you classify the severity of this issue as?" and the user replies "Medium," you MUST call the `ticket_creation_agent` again.
+    * **Example**: If the user says "I need to report a leaky pipe," you MUST call `ticket_agent` with that message.
+    * **Note**: Only call it to START a ticket. The user's answers to the ticket questions (severity, location, time, confirmation) are handled without you, so you will not see them.
 
 **Workflow:**
 1.  User asks a question (e.g., "where is MAC-2 located?").
 2.  You will determine whether this question should be answered by the knowledge graph.
 3.  You will call the correct tool with the user's original question as the `query` parameter.
 4.  You will return the tool's final output to the user and stop. Do not keep re running the tool until you get the perfect result.
+"""
+
+# Appended to ROOT_AGENT_INSTRUCTIONS when SPECULATIVE_ROUTING=1.
+SPECULATIVE_ROUTING_INSTRUCTIONS = """
+**Ambiguous Questions:**
+If you are not sure whether a question is for `query_knowledge_graph` or `answer_from_manuals`, call `answer_building_question(query: str)` once instead of trying one tool and then the other. It searches both sources and returns the best answer.
 """
\ No newline at end of file
@@ -0,0 +1,186 @@
+import math
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import prompt
+
+# Per-question Cypher-generation prompt: the labels and relationships relevant
+# to the question (taken from the live structured schema), the rules for those
+# labels, and the few most similar examples from prompt.CYPHER_EXAMPLES,
+# instead of the full hand-maintained CYPHER_GENERATION_TEMPLATE.
+
+N_EXAMPLES = 3
+# Roughly four characters per token for English text and Cypher on Gemini
+# models; used to track prompt size without a counting round-trip.
+CHARS_PER_TOKEN = 4
+
+# Words in a question that make a label relevant, besides the label's own name.
+LABEL_KEYWORDS = {
+    "Equipment": ("equipment", "unit", "pump", "chiller", "fan", "boiler", "ahu", "asset", "manufacturer", "model",
+                  "installed", "lifespan", "replacement"),
+    "Room": ("room", "where", "located", "location", "floor", "area", "in the"),
+    "Part": ("part", "parts", "spare", "component", "filter", "belt"),
+    "Specification": ("spec", "specs", "specification", "specifications", "rating", "voltage", "size", "dimension"),
+    "Vendor": ("vendor", "supplier", "contractor", "phone", "email", "contact", "service provider"),
+    "Work Order": ("work order", "order", "ticket", "request", "assigned", "requestor"),
+    "Alarm": ("alarm", "alert", "fault", "warning"),
+    "Measurement": ("measurement", "reading", "value", "temperature", "pressure", "flow", "humidity", "capacity",
+                    "status", "operating", "running", "latest", "current"),
+    "Maintenance Routine": ("maintenance", "routine", "preventive", "preventative", "pm", "scheduled", "recurrence"),
+    "Asset Class": ("class", "category", "type of", "classification"),
+    "Storage Location": ("storage", "stored", "stock", "inventory", "shelf"),
+    "Network Point": ("point", "sensor", "setpoint", "mode", "temperature", "pressure", "flow", "capacity",
+                      "status", "operating", "running"),
+    "Mode Name": ("mode", "cooling", "heating", "economizer", "occupied", "unoccupied"),
+    "Measurement Rollup": ("history", "historical", "trend", "average", "last month", "last year", "hourly", "daily"),
+}
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    labels: list
+    examples: list
+    tokens: int
+    baseline_tokens: int
+
+    @property
+    def reduction(self):
+        return 1 - self.tokens / self.baseline_tokens if self.baseline_tokens else 0.0
+
+
+@dataclass
+class PromptStats:
+    requests: int = 0
+    tokens: int = 0
+    baseline_tokens: int = 0
+
+    def record(self, built: BuiltPrompt):
+        self.requests += 1
+        self.tokens += built.tokens
+        self.baseline_tokens += built.baseline_tokens
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "avg_tokens": round(self.tokens / self.requests, 1) if self.requests else 0,
+            "avg_baseline_tokens": round(self.baseline_tokens / self.requests, 1) if self.requests else 0,
+            "reduction": round(1 - self.tokens / self.baseline_tokens, 3) if self.baseline_tokens else 0.0,
+        }
+
+
+class CypherPromptBuilder:
+    """
+    Composes the Cypher-generation prompt for one question. Example questions
+    are embedded once and matched against the question embedding; without
+    embeddings, word overlap is used instead.
+    """
+
+    def __init__(self, template=prompt.CYPHER_CORE_TEMPLATE, examples=prompt.CYPHER_EXAMPLES,
+                 label_rules=prompt.CYPHER_LABEL_RULES, baseline_template=prompt.CYPHER_GENERATION_TEMPLATE,
+                 n_examples=N_EXAMPLES):
+        self.template = template
+        self.examples = examples
+        self.label_rules = label_rules
+        self.n_examples = n_examples
+        self.baseline_tokens = count_tokens(baseline_template)
+        self.stats = PromptStats()
+        self._example_vectors = None
+
+    @property
+    def version_text(self) -> str:
+        """Everything that shapes the generated Cypher besides the schema, for cache keys."""
+        return self.template + repr(self.examples) + repr(self.label_rules)
+
+    async def _aexample_vectors(self, embeddings):
+        if self._example_vectors is None and embeddings is not None:
+            vectors = await embeddings.aembed_documents([e["question"] for e in self.examples])
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._example_vectors = matrix / np.where(norms == 0, 1, norms)
+        return self._example_vectors
+
+    def select_examples(self, question, question_embedding=None, example_vectors=None):
+        if question_embedding is not None and example_vectors is not None:
+            query = np.asarray(question_embedding, dtype=np.float32)
+            scores = example_vectors @ (query / (np.linalg.norm(query) or 1))
+        else:
+            words = _words(question)
+            scores = [len(words & _words(e["question"])) / (len(_words(e["question"])) or 1) for e in self.examples]
+        order = np.argsort(scores)[::-1][:self.n_examples]
+        return [self.examples[i] for i in order]
+
+    def select_labels(self, question, examples, structured_schema):
+        known = set(structured_schema.get("node_props", {}))
+        text = " " + question.lower() + " "
+        selected = set()
+        for label in known:
+            keywords = LABEL_KEYWORDS.get(label, ()) + (label.lower(),)
+            if any(re.search(r"\b" + re.escape(k) + r"\b", text) for k in keywords):
+                selected.add(label)
+        # The closest example's labels cover the traversal it demonstrates.
+        for example in examples[:1]:
+            selected.update(label for label in example.get("labels", ()) if label in known)
+        if not selected and "Equipment" in known:
+            selected.add("Equipment")
+        return sorted(selected)
+
+    def render_schema(self, labels, structured_schema):
+        label_set = set(labels)
+        lines = []
+        for label in labels:
+            props = ", ".join(
+                f"{p['property']}: {p['type']}" for p in structured_schema.get("node_props", {}).get(label, [])
+            )
+            lines.append(f"- (:`{label}` {{{props}}})")
+        for rel in structured_schema.get("relationships", []):
+            if rel["start"] in label_set and rel["end"] in label_set:
+                lines.append(f"- (:`{rel['start']}`)-[:{rel['type']}]->(:`{rel['end']}`)")
+        return "\n".join(lines)
+
+    def _compose(self, question, structured_schema, examples):
+        labels = self.select_labels(question, examples, structured_schema)
+        rules = "".join(self.label_rules[label] + "\n" for label in labels if label in self.label_rules)
+        example_text = "\n\n".join(
+            f"Question: {e['question']}\n```cypher\n{e['cypher']}\n```" for e in examples
+        )
+        text = self.template.format(
+            schema=self.render_schema(labels, structured_schema),
+            rules=rules,
+            examples=example_text,
+            question=question,
+        )
+        built = BuiltPrompt(text, labels, [e["question"] for e in examples], count_tokens(text), self.baseline_tokens)
+        self.stats.record(built)
+        return built
+
+    async def abuild(self, question, structured_schema, question_embedding=None, embeddings=None):
+        """
+        Return a BuiltPrompt, or None if there is no structured schema to select
+        from. `embeddings` embeds the example bank on first use.
+        """
+        if not structured_schema or not structured_schema.get("node_props"):
+            return None
+        try:
+            example_vectors = await self._aexample_vectors(embeddings)
+        except Exception as e:
+            print(f"Could not embed Cypher examples, falling back to word overlap: {e}")
+            example_vectors = None
+        examples = self.select_examples(question, question_embedding, example_vectors)
+        return self._compose(question, structured_schema, examples)
+
+    def build(self, question, structured_schema):
+        """Synchronous variant that selects examples by word overlap."""
+        if not structured_schema or not structured_schema.get("node_props"):
+            return None
+        return self._compose(question, structured_schema, self.select_examples(question))
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# After load_dotenv: the gateway reads its limits from the environment.
+from . import gateway
+
+# --- Configuration ---
+project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+location = os.getenv("GOOGLE_CLOUD_LOCATION")
+api_key = os.getenv("GOOGLE_API_KEY")
+url = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+username = os.getenv("NEO4J_USERNAME", "neo4j")
+password = os.getenv("NEO4J_PASSWORD", "#Warriors30.")
+
+LLM_MODEL = "gemini-2.5-flash"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# The schema is cached on disk so startup does not wait on introspection.
+# Bump SCHEMA_CACHE_VERSION whenever the cached format changes.
+SCHEMA_CACHE_PATH = os.getenv(
+    "SCHEMA_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "knowledge_graph_adk", "schema.json"),
+)
+SCHEMA_CACHE_VERSION = 1
+
+
+class Lazy:
+    """
+    A resource built on first use. Construction is guarded by a lock so
+    concurrent callers share one instance; a failed build is not cached, so the
+    next caller retries (e.g. once Neo4j is reachable again).
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                started = time.perf_counter()
+                self._value = self.factory()
+                self._ready = True
+                print(f"Initialized {self.name} in {time.perf_counter() - started:.2f}s")
+        return self._value
+
+    def override(self, value):
+        """Install a pre-built value, e.g. a stub in benchmarks."""
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+    @property
+    def ready(self):
+        return self._ready
+
+
+# Called with the schema string whenever it is loaded or changes.
+schema_listeners = []
+
+
+def _notify_schema(schema):
+    for listener in schema_listeners:
+        listener(schema)
+
+
+def load_cached_schema(path=SCHEMA_CACHE_PATH):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != SCHEMA_CACHE_VERSION or data.get("url") != url:
+        return None
+    return data
+
+
+def save_cached_schema(graph, path=SCHEMA_CACHE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            "version": SCHEMA_CACHE_VERSION,
+            "url": url,
+            "saved_at": time.time(),
+            "schema": graph.schema,
+            "structured_schema": graph.structured_schema,
+        }, f, default=str)
+    os.replace(tmp, path)
+
+
+def refresh_schema(graph):
+    """Introspect the live schema, persist it, and notify listeners."""
+    graph.refresh_schema()
+    try:
+        save_cached_schema(graph)
+    except OSError as e:
+        print(f"Could not write schema cache: {e}")
+    _notify_schema(graph.schema)
+
+
+def _refresh_in_background(graph):
+    def run():
+        try:
+            refresh_schema(graph)
+        except Exception as e:
+            print(f"Background schema refresh failed: {e}")
+
+    threading.Thread(target=run, name="schema-refresh", daemon=True).start()
+
+
+def connect_graph():
+    from .graph_access import ExecutorNeo4jGraph
+
+    return ExecutorNeo4jGraph(executor.get(), url=url, username=username, password=password, refresh_schema=False)
+
+
+def _build_graph():
+    graph = connect_graph()
+    cached = load_cached_schema()
+    if cached:
+        # Serve the cached schema immediately and reconcile with the database
+        # in the background.
+        graph.schema = cached["schema"]
+        graph.structured_schema = cached["structured_schema"]
+        _notify_schema(graph.schema)
+        _refresh_in_background(graph)
+    else:
+        refresh_schema(graph)
+    return graph
+
+
+def _build_executor():
+    from .graph_access import GraphExecutor
+
+    return GraphExecutor(url, username, password)
+
+
+def _build_async_executor():
+    from .graph_access import AsyncGraphExecutor
+
+    return AsyncGraphExecutor(url, username, password)
+
+
+def _build_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=api_key)
+    if not gateway.GATEWAY:
+        return llm
+    # Rate limits, retries and in-flight dedup are shared by every caller of this model.
+    return gateway.GatewayChatModel(inner=llm, model=LLM_MODEL)
+
+
+def _build_embeddings():
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from .embedding_cache import CachedEmbeddings
+
+    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    if gateway.GATEWAY:
+        embeddings = gateway.GatewayEmbeddings(embeddings, EMBEDDING_MODEL)
+    # Embeddings are cached on disk by model and text hash, so repeated questions skip the API.
+    return CachedEmbeddings(embeddings, model_name=EMBEDDING_MODEL)
+
+
+# All Neo4j access goes through graph_access executors (pooling, timeouts, retries, metrics).
+executor = Lazy("graph_executor", _build_executor)
+graph = Lazy("graph", _build_graph)
+# Used by the async tools so graph reads don't hold a worker thread.
+async_graph = Lazy("async_graph", _build_async_executor)
+llm = Lazy("llm", _build_llm)
+# The Cypher-generation chain shares the answer client (and so its gateway
+# limits); it stays a separate resource so benchmarks can stub it on its own.
+cypher_llm = Lazy("cypher_llm", lambda: llm.get())
+embeddings = Lazy("embeddings", _build_embeddings)
+
+# Every lazily built resource, in warm-up order. Modules that add their own
+# (e.g. agent.py's chains) append to this list.
+registry = [embeddings, llm, cypher_llm, executor, graph, async_graph]
+
+
+def warm_up(background=True):
+    """Build every registered resource, optionally on a daemon thread."""
+    def run():
+        for resource in list(registry):
+            try:
+                resource.get()
+            except Exception as e:
+                print(f"Warm-up of {resource.name} failed: {e}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="agent-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return all(resource.ready for resource in registry)
@@ -0,0 +1,21 @@
+# Builds the LATEST projection (latest_measurements.py) for measurements that
+# were loaded before it existed, e.g. after running graph.cypher on an older
+# dump. Safe to re-run; it only ever points LATEST at each point's newest reading.
+#
+# Run from the directory that contains the agent package:
+#   python -m KnowledgeGraphADK.setup.backfill_latest [batch_size]
+import sys
+import time
+
+from .. import resources
+from ..latest_measurements import BATCH_SIZE, backfill
+
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_SIZE
+
+executor = resources.executor.get()
+started = time.perf_counter()
+try:
+    updated = backfill(executor, batch_size=batch_size)
+finally:
+    executor.close()
+print(f"Updated the latest measurement on {updated} network points in {time.perf_counter() - started:.1f}s.")
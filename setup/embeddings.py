@@ -1,9 +1,21 @@
+# Embeds the PDF manuals into the Neo4j vector index. Run it as a module from
+# the directory that contains the agent package so it can share its caches:
+#   python -m KnowledgeGraphADK.setup.embeddings --manuals ./manuals
+import argparse
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
 from langchain_google_vertexai import VertexAIEmbeddings
 from langchain_community.document_loaders import PyPDFLoader # Or any other suitable loader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores.neo4j_vector import Neo4jVector
+from neo4j import GraphDatabase
+
+from .. import manual_chunking
+from ..caching import BUMP_LABEL_VERSIONS
+from ..embedding_cache import CachedEmbeddings
+from ..gateway import GatewayEmbeddings
 
 load_dotenv()
 
@@ -15,44 +27,398 @@ NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USERNAME = "neo4j"
 NEO4J_PASSWORD = "#Warriors30."
 
+# Label versions bumped after each manual is written (see caching.AnswerCache).
+CHANGED_LABELS = ("Chunk", "Equipment")
+
 MANUALS_DIRECTORY = "./manuals"
+MANIFEST_FILE = ".ingest_manifest.json"
+
+VECTOR_INDEX = "manual_chunks_langchain"
+EMBEDDING_DIMENSIONS = 768
+
+CHUNK_SIZE = manual_chunking.CHUNK_SIZE
+EMBED_BATCH_SIZE = 64       # texts per embedding request
+EMBED_CONCURRENCY = 4       # embedding requests in flight
+WRITE_BATCH_SIZE = 500      # chunks per UNWIND transaction
+PARSE_WORKERS = os.cpu_count() or 2
+
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT chunk_id_uniq IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+    "CREATE INDEX chunk_source IF NOT EXISTS FOR (c:Chunk) ON (c.source)",
+    "CREATE INDEX chunk_simhash IF NOT EXISTS FOR (c:Chunk) ON (c.simhash)",
+    # Keyword side of the hybrid manuals retrieval.
+    "CREATE FULLTEXT INDEX manual_chunks_fulltext IF NOT EXISTS FOR (c:Chunk) ON EACH [c.text]",
+    f"""CREATE VECTOR INDEX {VECTOR_INDEX} IF NOT EXISTS FOR (c:Chunk) ON (c.embedding)
+        OPTIONS {{ indexConfig: {{ `vector.dimensions`: {EMBEDDING_DIMENSIONS}, `vector.similarity_function`: 'cosine' }} }}""",
+]
+
+WRITE_CHUNKS = """
+UNWIND $rows AS row
+MERGE (c:Chunk {id: row.id})
+SET c.text = row.text, c.embedding = row.embedding, c.source = row.source,
+    c.page = row.page, c.section = row.section, c.content_hash = row.content_hash, c.simhash = row.simhash
+WITH c, row
+UNWIND row.equipment AS equipment_id
+MATCH (e:Equipment) WHERE elementId(e) = equipment_id
+MERGE (e)-[:HAS_CHUNK]->(c)
+"""
+
+# A near-duplicate chunk isn't written; its manual's equipment is linked to the
+# copy that was kept instead. Re-ingesting the manual that holds the kept copy
+# deletes it, so the manuals that depend on it (manifest "depends_on") are
+# re-ingested along with it.
+LINK_DUPLICATES = """
+UNWIND $rows AS row
+MATCH (c:Chunk {id: row.id})
+UNWIND row.equipment AS equipment_id
+MATCH (e:Equipment) WHERE elementId(e) = equipment_id
+MERGE (e)-[:HAS_CHUNK]->(c)
+"""
+
+DUPLICATE_SOURCES = """
+MATCH (c:Chunk) WHERE c.id IN $ids
+RETURN DISTINCT c.source AS source
+"""
+
+# SimHashes of chunks from manuals this run leaves alone, so their content isn't written again.
+KEPT_SIMHASHES = """
+MATCH (c:Chunk) WHERE c.simhash IS NOT NULL AND NOT c.source IN $sources
+RETURN c.id AS id, c.simhash AS simhash
+"""
+
+# Sources of chunks that aren't one of the manuals in the directory: manuals
+# since removed, or ones written under their full path by earlier runs.
+STALE_SOURCES = """
+MATCH (c:Chunk) WHERE NOT c.source IN $sources
+RETURN DISTINCT c.source AS source
+"""
+
+DELETE_SOURCE_CHUNKS = """
+MATCH (c:Chunk {source: $source})
+WITH c LIMIT $batch
+DETACH DELETE c
+RETURN count(*) AS deleted
+"""
+
+
+# --- 1. Parse PDFs (runs in worker processes) ---
+def _outline(path):
+    try:
+        from pypdf import PdfReader
+
+        return manual_chunking.flatten_outline(PdfReader(path).outline)
+    except Exception as e:
+        print(f"No outline for {path}: {e}")
+        return {}
+
+
+def parse_manual(path):
+    """
+    Load one PDF and split it along its sections (manual_chunking.chunk_manual).
+    Returns (page_count, lead text, chunks).
+    """
+    pages = [(page.page_content, page.metadata.get("page")) for page in PyPDFLoader(path).load()]
+    chunks = manual_chunking.chunk_manual(pages, _outline(path), chunk_size=CHUNK_SIZE)
+    return len(pages), manual_chunking.lead_text(path, pages), chunks
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def iter_parsed_manuals(paths, workers):
+    """
+    Parse manuals in a process pool and yield (path, page_count, lead, chunks) in
+    submission order. At most `workers * 2` manuals are parsed ahead of the
+    consumer, so memory does not grow with the corpus.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        paths = iter(paths)
+        for path in paths:
+            pending.append((path, pool.submit(parse_manual, path)))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            path, future = pending.pop(0)
+            try:
+                yield (path, *future.result())
+            except Exception as e:
+                print(f"Failed to parse {path}: {e}")
+                yield path, 0, "", None
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(parse_manual, next_path)))
+
+
+# --- 2. Drop near-duplicates and link equipment ---
+def iter_chunk_rows(source, chunks, kept, matcher=None, lead="", report=None):
+    """
+    Rows for the chunks of `source` (a manual's file name) that aren't near-copies of one in `kept`
+    (a SimHashIndex, added to as chunks are kept), each with the ids of the
+    Equipment `matcher` links it to. `report` collects the skipped duplicates
+    as {id of the kept copy, equipment} and counts the linked rows.
+    """
+    report = {"duplicates": [], "linked": 0} if report is None else report
+    manual_equipment = matcher.for_manual(lead) if matcher else []
+    for index, chunk in enumerate(chunks):
+        chunk_id = hashlib.sha256(f"{source}:{index}".encode("utf-8")).hexdigest()
+        equipment = matcher.for_chunk(chunk["body"], manual_equipment, lead) if matcher else []
+        simhash = int(chunk["simhash"], 16)
+        original = kept.find(simhash)
+        if original is not None:
+            report["duplicates"].append({"id": original, "equipment": equipment})
+            continue
+        kept.add(simhash, chunk_id)
+        report["linked"] += bool(equipment)
+        yield {
+            "id": chunk_id,
+            "text": chunk["text"],
+            "source": source,
+            "page": chunk["page"],
+            "section": chunk["section"],
+            "content_hash": hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest(),
+            "simhash": chunk["simhash"],
+            "equipment": equipment,
+        }
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- 3. Embed in fixed-size batches with bounded concurrency ---
+def iter_embedded(rows, embeddings, batch_size, concurrency):
+    """Yield rows with an `embedding` field, keeping at most `concurrency` requests in flight."""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = []
+        for batch in batched(rows, batch_size):
+            pending.append((batch, pool.submit(embeddings.embed_documents, [r["text"] for r in batch])))
+            if len(pending) >= concurrency:
+                yield from _attach(*pending.pop(0))
+        while pending:
+            yield from _attach(*pending.pop(0))
+
+
+def _attach(batch, future):
+    for row, vector in zip(batch, future.result()):
+        row["embedding"] = vector
+        yield row
+
+
+# --- 4. Write to Neo4j in batched UNWIND transactions ---
+def delete_source(driver, source):
+    while True:
+        records, _, _ = driver.execute_query(DELETE_SOURCE_CHUNKS, source=source, batch=WRITE_BATCH_SIZE)
+        if not records or records[0]["deleted"] == 0:
+            return
+
+
+def remove_stale(driver, manifest, manifest_path, filenames):
+    """
+    Delete the chunks of manuals no longer in the directory and of manuals
+    stored under another path. Returns (removed file names, file names to
+    re-ingest).
+    """
+    records, _, _ = driver.execute_query(STALE_SOURCES, sources=list(filenames))
+    stale = sorted(record["source"] for record in records if record["source"])
+    removed = sorted(set(manifest) - set(filenames))
+    rekeyed = sorted({os.path.basename(source) for source in stale} & set(filenames))
+    # Forget them first, so a crash part-way through re-runs them rather than leaving them half-deleted.
+    for filename in removed + rekeyed:
+        manifest.pop(filename, None)
+    save_manifest(manifest_path, manifest)
+    for source in stale:
+        print(f"Deleting chunks stored under {source}: not the file name of a manual in the directory.")
+        delete_source(driver, source)
+    if stale:
+        driver.execute_query(BUMP_LABEL_VERSIONS, labels=list(CHANGED_LABELS))
+    return removed, rekeyed
+
+
+def write_rows(driver, rows, batch_size):
+    written = 0
+    for batch in batched(rows, batch_size):
+        driver.execute_query(WRITE_CHUNKS, rows=batch)
+        written += len(batch)
+    return written
+
+
+def link_duplicates(driver, duplicates, batch_size):
+    rows = [row for row in duplicates if row["equipment"]]
+    for batch in batched(rows, batch_size):
+        driver.execute_query(LINK_DUPLICATES, rows=batch)
+    return len(rows)
+
+
+def duplicate_sources(driver, duplicates, source):
+    """File names of the other manuals holding the kept copies of `source`'s near-duplicates."""
+    if not duplicates:
+        return []
+    records, _, _ = driver.execute_query(DUPLICATE_SOURCES, ids=sorted({row["id"] for row in duplicates}))
+    return sorted({os.path.basename(r["source"]) for r in records if r["source"] != source})
+
+
+def with_dependents(todo, manifest, digests, manuals_dir, removed=()):
+    """
+    `todo` plus the unchanged manuals that were deduplicated against one in it
+    or in `removed` (and so on), since deleting a manual's chunks deletes the
+    copies they link to.
+    """
+    names = {os.path.basename(path) for path, _ in todo} | set(removed)
+    while True:
+        dependents = sorted(name for name, entry in manifest.items()
+                            if name in digests and name not in names and names & set(entry.get("depends_on", ())))
+        if not dependents:
+            return todo
+        for name in dependents:
+            print(f"{name}: re-ingesting, it shares content with a changed manual.")
+            todo.append((os.path.join(manuals_dir, name), digests[name]))
+        names.update(dependents)
+
+
+def load_kept(driver, skip_sources):
+    """A SimHashIndex of the chunks already in the graph, apart from those of `skip_sources`."""
+    kept = manual_chunking.SimHashIndex()
+    records, _, _ = driver.execute_query(KEPT_SIMHASHES, sources=list(skip_sources))
+    for record in records:
+        kept.add(int(record["simhash"], 16), record["id"])
+    return kept
+
+
+def ingest(manuals_dir, force=False, parse_workers=PARSE_WORKERS, embed_batch_size=EMBED_BATCH_SIZE,
+           embed_concurrency=EMBED_CONCURRENCY, write_batch_size=WRITE_BATCH_SIZE):
+    manifest_path = os.path.join(manuals_dir, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+
+    digests = {filename: file_hash(os.path.join(manuals_dir, filename))
+               for filename in sorted(os.listdir(manuals_dir)) if filename.endswith(".pdf")}
+
+    print(f"Attempting to connect to Neo4j at: {NEO4J_URI}")
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+    for statement in SCHEMA_STATEMENTS:
+        driver.execute_query(statement)
+
+    # Chunks are keyed by file name, like the manifest, so the same manual
+    # reached through another path isn't written twice.
+    removed, rekeyed = remove_stale(driver, manifest, manifest_path, digests)
+    todo = [(os.path.join(manuals_dir, filename), digest) for filename, digest in digests.items()
+            if force or manifest.get(filename, {}).get("sha256") != digest]
+    todo = with_dependents(todo, manifest, digests, manuals_dir, removed)
+
+    print(f"{len(todo)} new or changed manuals to ingest ({len(manifest)} in manifest, "
+          f"{len(removed)} removed, {len(rekeyed)} re-keyed).")
+    if not todo:
+        driver.close()
+        return
+
+    # Unchanged chunks of a re-ingested manual are served from the embedding cache;
+    # the rest go through the gateway's rate limit and 429 retries.
+    embeddings = CachedEmbeddings(
+        GatewayEmbeddings(
+            VertexAIEmbeddings(
+                model_name="text-embedding-004",
+                project=GCP_PROJECT_ID,
+            ),
+            "vertexai/text-embedding-004",
+            lane_name="batch",
+        ),
+        model_name="vertexai/text-embedding-004",
+    )
+
+    started = time.perf_counter()
+    total_pages = total_chunks = total_duplicates = total_linked = 0
+    try:
+        # One bulk read each: the equipment to link against and the content already kept.
+        catalog, _, _ = driver.execute_query(manual_chunking.EQUIPMENT_CATALOG)
+        matcher = manual_chunking.EquipmentMatcher([record.data() for record in catalog])
+        kept = load_kept(driver, [os.path.basename(p) for p, _ in todo])
+        print(f"Linking against {len(catalog)} equipment nodes; {len(kept)} chunks already kept.")
+
+        for path, page_count, lead, chunks in iter_parsed_manuals([p for p, _ in todo], parse_workers):
+            if chunks is None:
+                continue
+            filename = os.path.basename(path)
+            manual_started = time.perf_counter()
+
+            # Replace the manual's previous chunks; the manifest entry is only
+            # written once all new chunks are committed, so a crash re-runs it.
+            delete_source(driver, filename)
+            report = {"duplicates": [], "linked": 0}
+            rows = iter_embedded(iter_chunk_rows(filename, chunks, kept, matcher, lead, report),
+                                 embeddings, embed_batch_size, embed_concurrency)
+            written = write_rows(driver, rows, write_batch_size)
+            link_duplicates(driver, report["duplicates"], write_batch_size)
+            depends_on = duplicate_sources(driver, report["duplicates"], filename)
+            # Cached manuals answers read Chunk and Equipment; moving their versions retires them.
+            driver.execute_query(BUMP_LABEL_VERSIONS, labels=list(CHANGED_LABELS))
+            duplicates, linked = len(report["duplicates"]), report["linked"]
+
+            manifest[filename] = {"sha256": digests[filename], "pages": page_count, "chunks": written,
+                                  "duplicates": duplicates, "linked": linked, "depends_on": depends_on}
+            save_manifest(manifest_path, manifest)
+
+            total_pages += page_count
+            total_chunks += written
+            total_duplicates += duplicates
+            total_linked += linked
+            elapsed = time.perf_counter() - manual_started
+            print(f"{filename}: {page_count} pages, {written} chunks ({duplicates} near-duplicates skipped, "
+                  f"{linked} linked to equipment) in {elapsed:.1f}s")
+    finally:
+        driver.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Ingested {total_pages} pages / {total_chunks} chunks in {elapsed:.1f}s "
+          f"({total_pages / elapsed:.1f} pages/s, {total_chunks / elapsed:.1f} chunks/s); "
+          f"{total_duplicates} near-duplicates skipped, {total_linked} chunks linked to equipment.")
+    print(f"Embedding cache: {embeddings.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed PDF manuals into the Neo4j vector index.")
+    parser.add_argument("--manuals", default=MANUALS_DIRECTORY)
+    parser.add_argument("--force", action="store_true", help="Re-ingest manuals even if unchanged.")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--write-batch-size", type=int, default=WRITE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    ingest(
+        args.manuals,
+        force=args.force,
+        parse_workers=args.parse_workers,
+        embed_batch_size=args.embed_batch_size,
+        embed_concurrency=args.embed_concurrency,
+        write_batch_size=args.write_batch_size,
+    )
 
-# --- 1. Load Documents ---
-
-all_docs = []
-for filename in os.listdir(MANUALS_DIRECTORY):
-    print(filename)
-    if filename.endswith(".pdf"):
-        loader = PyPDFLoader(os.path.join(MANUALS_DIRECTORY, filename))
-        all_docs.extend(loader.load())
-
-
-print(f"Loaded {len(all_docs)} documents.")
-
-# --- 2. Initialize Components ---
-embeddings = VertexAIEmbeddings(
-    model_name="text-embedding-004",
-    project=GCP_PROJECT_ID,
-)
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-
-docs_for_vectorstore = text_splitter.split_documents(all_docs)
-print(f"Split documents into {len(docs_for_vectorstore)} chunks.")
-
-# --- 3. Ingest into Neo4j using LangChain ---
-print(f"Attempting to connect to Neo4j at: {NEO4J_URI}") # Add this line
-print("Starting ingestion into Neo4j Vector Store...")
-neo4j_vectorstore = Neo4jVector.from_documents(
-    docs_for_vectorstore,
-    embedding=embeddings,
-    url=NEO4J_URI,
-    username=NEO4J_USERNAME,
-    password=NEO4J_PASSWORD,
-    index_name="manual_chunks_langchain",  # Name for the vector index
-    node_label="Chunk",                    # Label for the nodes created
-    text_node_property="text",             # Property to store the chunk text
-    embedding_node_property="embedding",   # Property to store the vector embedding
-    create_id_index=True,                  # Creates an index on the node ID
-)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# Exports chunk embeddings from Neo4j so retrieval can be tested against the
+# in-process ANN index (set MANUALS_ANN_INDEX to the output file).
+#
+# Run from the directory that contains the agent package:
+#   python -m KnowledgeGraphADK.setup.export_chunks chunks.npz
+import sys
+
+from dotenv import load_dotenv
+from langchain_community.graphs import Neo4jGraph
+
+from ..manual_retrieval import export_chunk_embeddings
+
+load_dotenv()
+
+# Neo4j connection details
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_USERNAME = "neo4j"
+NEO4J_PASSWORD = "#Warriors30."
+
+OUTPUT_PATH = sys.argv[1] if len(sys.argv) > 1 else "chunks.npz"
+
+graph = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD, refresh_schema=False)
+count = export_chunk_embeddings(graph, OUTPUT_PATH)
+print(f"Exported {count} chunks to {OUTPUT_PATH}.")
@@ -62,6 +62,10 @@ REQUIRE (n.`network_point`) IS UNIQUE;
 CREATE CONSTRAINT `present_system mode_Mode_Name_uniq` IF NOT EXISTS
 FOR (n: `Mode Name`)
 REQUIRE (n.`present system mode`) IS UNIQUE;
+// Written by ingestion.py when old measurements are rolled up.
+CREATE CONSTRAINT `id_Measurement_Rollup_uniq` IF NOT EXISTS
+FOR (n: `Measurement Rollup`)
+REQUIRE (n.`id`) IS UNIQUE;
 
 :param {
   idsToSkip: []
@@ -364,6 +368,25 @@ CALL {
   MERGE (source)-[r: `HASNAME`]->(target)
 } IN TRANSACTIONS OF 10000 ROWS;
 
+// LATEST projection: each Network Point points at its newest Measurement and
+// caches it (mode name resolved for 'Present System Mode'). Same result as
+// latest_measurements.BACKFILL_LATEST / python -m KnowledgeGraphADK.setup.backfill_latest.
+MATCH (np: `Network Point`)
+CALL {
+  WITH np
+  MATCH (np)-[:HASMEASUREMENT]->(m: `Measurement`)
+  WITH np, m ORDER BY m.`recorded_time` DESC LIMIT 1
+  OPTIONAL MATCH (np)-[old: `LATEST`]->()
+  DELETE old
+  MERGE (np)-[:`LATEST`]->(m)
+  WITH np, m
+  OPTIONAL MATCH (mode: `Mode Name` { `present system mode`: toInteger(trim(m.`value`)) })
+  WHERE np.`network_point` = 'Present System Mode'
+  SET np.`latest_value` = m.`value`
+  SET np.`latest_recorded_time` = m.`recorded_time`
+  SET np.`latest_mode` = mode.`mode`
+} IN TRANSACTIONS OF 1000 ROWS;
+
 
 
 // CREATE FULLTEXT INDEX generic_names_and_descriptions FOR (n:Equipment|Room|Measurement|Part|SPECIFICATION|Alarm|`Asset Class`|`Maintenance Routine`|`Storage Location`|Vendor|`Work Order`|`Network Point`) ON EACH [
@@ -384,3 +407,5 @@ CALL {
 //  `vector.dimensions`: 768,
 //  `vector.similarity_function`: 'cosine'
 // }}
+
+// CREATE FULLTEXT INDEX manual_chunks_fulltext FOR (c:Chunk) ON EACH [c.text]
@@ -0,0 +1,30 @@
+# Creates or incrementally updates the memory-mapped chunk store (chunk_store.py)
+# from the Chunk nodes in Neo4j. Chunks whose text length, source, page and
+# equipment links are unchanged are copied from the existing store; only new or
+# changed ones are fetched. Point MANUALS_CHUNK_STORE at the directory to use it.
+#
+# Run from the directory that contains the agent package:
+#   python -m KnowledgeGraphADK.setup.sync_chunks chunk_store [--int8] [--full]
+import argparse
+import time
+
+from .. import resources
+from ..chunk_store import ChunkStore, sync_from_neo4j
+
+parser = argparse.ArgumentParser(description="Sync the local chunk store from Neo4j.")
+parser.add_argument("path", nargs="?", default="chunk_store")
+parser.add_argument("--int8", action="store_true", help="Store int8-quantized embeddings instead of float32.")
+parser.add_argument("--full", action="store_true", help="Refetch every chunk instead of only new or changed ones.")
+parser.add_argument("--batch-size", type=int, default=500)
+args = parser.parse_args()
+
+executor = resources.executor.get()
+started = time.perf_counter()
+try:
+    stats = sync_from_neo4j(executor, args.path, dtype="int8" if args.int8 else "float32",
+                            batch_size=args.batch_size, full=args.full)
+finally:
+    executor.close()
+print(f"Synced {stats['chunks']} chunks to {args.path} in {time.perf_counter() - started:.1f}s "
+      f"({stats['reused']} reused, {stats['fetched']} fetched, {stats['removed']} removed).")
+print(f"Footprint: {ChunkStore(args.path).footprint()}")
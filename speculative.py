@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from . import prompt
+from .cypher_templates import route
+
+# Speculative routing between the knowledge-graph and manuals pipelines. A
+# nearest-neighbour intent classifier over question embeddings sends clear-cut
+# questions to one pipeline; for ambiguous ones both pipelines start at once,
+# the first confident answer wins and the other is cancelled. Instead of
+# "try the graph, then the manuals" (two pipelines back to back plus an extra
+# agent turn), an ambiguous question costs roughly the slower of the two.
+
+# --- Configuration ---
+# Speculate when the two intents' similarities are closer than this.
+SPECULATION_MARGIN = float(os.getenv("SPECULATION_MARGIN", "0.05"))
+# Neighbours per intent averaged into its score.
+NEIGHBOURS = 3
+
+KNOWLEDGE_GRAPH = "knowledge_graph"
+MANUALS = "manuals"
+
+INTENT_EXAMPLES = {
+    KNOWLEDGE_GRAPH: [e["question"] for e in prompt.CYPHER_EXAMPLES] + [
+        "What mode is the building in?",
+        "Is Chiller 4 operating?",
+        "What is the current supply air temperature on AHU-1?",
+        "What equipment is in the mechanical room?",
+        "Show me the open work orders for PP-13",
+        "Are there any active alarms on the boiler?",
+        "Who is the vendor for the elevators?",
+        "When was CT-2 installed?",
+    ],
+    MANUALS: [
+        "How do I reset the pressure on the main pump?",
+        "How do I replace the filters on the air handler?",
+        "What does fault code E4 mean on the chiller?",
+        "What is the procedure for lubricating the fan bearings?",
+        "How should I troubleshoot a motor that trips on overload?",
+        "How often should the cooling tower be cleaned according to the manual?",
+        "What torque should the pump coupling bolts be tightened to?",
+        "How do I recharge refrigerant on the rooftop unit?",
+        "What are the steps to start up the boiler after a shutdown?",
+        "Where in the manual is the wiring diagram for the VFD?",
+        "What does a flashing red light on the controller mean?",
+        "How do I calibrate the pressure sensor?",
+    ],
+}
+
+# Answers that mean the pipeline found nothing, so the other one should win.
+NOT_FOUND = (
+    "No answer found.",
+    "Sorry, I could not find any relevant information in the manuals.",
+)
+
+
+class IntentClassifier:
+    """
+    k-nearest-neighbour classifier over normalized question embeddings. The
+    examples are embedded once on first use. Race winners are not fed back:
+    the faster pipeline isn't necessarily the right intent.
+    """
+
+    def __init__(self, examples=INTENT_EXAMPLES, neighbours=NEIGHBOURS, margin=SPECULATION_MARGIN):
+        self.examples = {intent: list(questions) for intent, questions in examples.items()}
+        self.neighbours = neighbours
+        self.margin = margin
+        self._matrices = None
+
+    async def _ensure(self, embeddings):
+        if self._matrices is None:
+            matrices = {}
+            for intent, questions in self.examples.items():
+                matrices[intent] = _normalize(np.asarray(await embeddings.aembed_documents(questions), dtype=np.float32))
+            self._matrices = matrices
+        return self._matrices
+
+    def scores(self, question_embedding) -> dict:
+        query = _normalize(np.asarray(question_embedding, dtype=np.float32))
+        result = {}
+        for intent, matrix in self._matrices.items():
+            similarities = matrix @ query
+            top = np.sort(similarities)[::-1][:self.neighbours]
+            result[intent] = float(top.mean())
+        return result
+
+    async def classify(self, question, question_embedding, embeddings):
+        """Return (intent or None when ambiguous, scores)."""
+        await self._ensure(embeddings)
+        scores = self.scores(question_embedding)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if scores[ranked[0]] - scores[ranked[1]] < self.margin:
+            return None, scores
+        return ranked[0], scores
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class SpeculationStats:
+    def __init__(self):
+        self.decisions = Counter()
+        self.winners = Counter()
+        self.cancelled = 0
+        self.both_finished = 0
+
+    def summary(self):
+        return {
+            "decisions": dict(self.decisions),
+            "winners": dict(self.winners),
+            "cancelled": self.cancelled,
+            "both_finished": self.both_finished,
+        }
+
+
+async def _drain(events):
+    """Run a pipeline to completion; returns (answer, row count)."""
+    answer, rows = "", 0
+    async for event in events:
+        if event["type"] == "rows":
+            rows = len(event["rows"])
+        elif event["type"] == "answer":
+            answer = event["text"]
+    return answer, rows
+
+
+def confident(answer, rows) -> bool:
+    return bool(rows) and bool(answer) and answer not in NOT_FOUND and not answer.startswith("Sorry,")
+
+
+class SpeculativeRouter:
+    """
+    Answers with `pipelines[intent](question)` (async generators of streaming
+    events), running both when the classifier can't tell them apart.
+    `embeddings` is a resources.Lazy, resolved per call.
+    """
+
+    def __init__(self, pipelines: dict, embeddings, classifier: IntentClassifier = None):
+        self.pipelines = pipelines
+        self.embeddings = embeddings
+        self.classifier = classifier or IntentClassifier()
+        self.stats = SpeculationStats()
+
+    async def answer(self, question: str) -> str:
+        try:
+            if route(question):
+                # A template family is a graph question; no embedding needed.
+                intent, scores = KNOWLEDGE_GRAPH, {}
+            else:
+                question_embedding = await self.embeddings.get().aembed_query(question)
+                intent, scores = await self.classifier.classify(question, question_embedding, self.embeddings.get())
+        except Exception as e:
+            print(f"Intent classification failed, speculating: {e}")
+            intent, scores = None, {}
+        print(f"Intent: {intent or 'ambiguous'} {({k: round(v, 3) for k, v in scores.items()})}")
+        self.stats.decisions[intent or "speculate"] += 1
+
+        if intent is not None:
+            answer, rows = await _drain(self.pipelines[intent](question))
+            if confident(answer, rows):
+                return answer
+            # Same fallback the router instructions describe, for the rare misclassification.
+            other = MANUALS if intent == KNOWLEDGE_GRAPH else KNOWLEDGE_GRAPH
+            print(f"{intent} had no answer, falling back to {other}.")
+            fallback, fallback_rows = await _drain(self.pipelines[other](question))
+            return fallback if confident(fallback, fallback_rows) else answer
+        return await self._race(question)
+
+    async def _race(self, question):
+        started = time.perf_counter()
+        tasks = {asyncio.create_task(_drain(stream(question))): intent for intent, stream in self.pipelines.items()}
+        results = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    intent = tasks[task]
+                    try:
+                        results[intent] = task.result()
+                    except Exception as e:
+                        print(f"Speculative {intent} pipeline failed: {e}")
+                        results[intent] = ("", 0)
+                    if confident(*results[intent]):
+                        finished = time.perf_counter() - started
+                        print(f"Speculation: {intent} won after {finished:.2f}s")
+                        self.stats.winners[intent] += 1
+                        self.stats.cancelled += len(pending)
+                        return results[intent][0]
+        finally:
+            for task in pending:
+                task.cancel()
+        self.stats.both_finished += 1
+        self.stats.winners["none"] += 1
+        # Neither was confident: prefer whichever said something.
+        for intent in (KNOWLEDGE_GRAPH, MANUALS):
+            if results.get(intent, ("", 0))[0]:
+                return results[intent][0]
+        return NOT_FOUND[0]
@@ -0,0 +1,114 @@
+import json
+import time
+from collections import deque
+from statistics import median
+from typing import Any, AsyncIterator, Callable
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.genai import types
+
+# Streaming answers. The tools' answer pipelines are async generators of
+# events, so the same code serves the blocking FunctionTools (which drain the
+# stream) and the streaming agents below (which forward it as ADK events).
+#
+# Event dicts:
+#   {"type": "rows", "cypher": str | None, "rows": [...]}   graph rows / retrieved chunks, before the summary
+#   {"type": "token", "text": str}                          a piece of the answer as the LLM produces it
+#   {"type": "answer", "text": str, "path": str}            the complete answer, always last
+
+SAMPLE_SIZE = 1000
+
+
+class StreamStats:
+    """Time to first rows, time to first token and total latency per stream name."""
+
+    def __init__(self, size=SAMPLE_SIZE):
+        self.size = size
+        self.samples = {}
+
+    def record(self, name, sample):
+        self.samples.setdefault(name, deque(maxlen=self.size)).append(sample)
+
+    def summary(self):
+        result = {}
+        for name, samples in self.samples.items():
+            result[name] = {"count": len(samples)}
+            for key in ("first_rows_s", "ttft_s", "total_s"):
+                values = [s[key] for s in samples if s[key] is not None]
+                result[name][f"{key}_p50"] = round(median(values), 4) if values else None
+        return result
+
+
+stream_stats = StreamStats()
+
+
+async def timed_stream(name: str, events: AsyncIterator[dict], stats: StreamStats = stream_stats):
+    """Pass events through, recording when the first rows and first token arrived."""
+    started = time.perf_counter()
+    sample = {"first_rows_s": None, "ttft_s": None, "total_s": None}
+    async for event in events:
+        elapsed = time.perf_counter() - started
+        if event["type"] == "rows" and sample["first_rows_s"] is None:
+            sample["first_rows_s"] = elapsed
+        # A template or fallback answer arrives whole; it still counts as the first token.
+        if event["type"] in ("token", "answer") and sample["ttft_s"] is None:
+            sample["ttft_s"] = elapsed
+        yield event
+    sample["total_s"] = time.perf_counter() - started
+    stats.record(name, sample)
+    print(f"{name}: first rows {_fmt(sample['first_rows_s'])}, "
+          f"first token {_fmt(sample['ttft_s'])}, total {_fmt(sample['total_s'])}")
+
+
+def _fmt(seconds):
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+
+async def collect(events: AsyncIterator[dict]) -> str:
+    """Drain a stream and return the final answer text."""
+    answer = ""
+    async for event in events:
+        if event["type"] == "answer":
+            answer = event["text"]
+    return answer
+
+
+class StreamingAnswerAgent(BaseAgent):
+    """
+    Answers the user's message with one of the streaming pipelines, emitting
+    each token as a partial ADK event (visible with RunConfig(streaming_mode=
+    StreamingMode.SSE)) and the complete answer as the final event. Rows are
+    attached to a partial event's custom_metadata before the summary starts.
+    """
+
+    stream: Callable[[str], AsyncIterator[dict]]
+    error_message: str = "Sorry, I encountered an error while answering."
+
+    async def _run_async_impl(self, ctx) -> AsyncIterator[Event]:
+        question = "".join(part.text or "" for part in (ctx.user_content.parts if ctx.user_content else []))
+        try:
+            async for event in timed_stream(self.name, self.stream(question)):
+                if event["type"] == "rows":
+                    yield self._event(ctx, None, partial=True, metadata={
+                        "cypher": event.get("cypher"),
+                        "rows": json.loads(json.dumps(event["rows"], default=str)),
+                    })
+                elif event["type"] == "token":
+                    yield self._event(ctx, event["text"], partial=True)
+                else:
+                    yield self._event(ctx, event["text"], metadata={"path": event.get("path")})
+        except Exception as e:
+            print(f"Error in {self.name}: {e}")
+            yield self._event(ctx, self.error_message)
+
+    def _event(self, ctx, text, partial=None, metadata: Any = None):
+        content = types.Content(role="model", parts=[types.Part(text=text)]) if text is not None else None
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=content,
+            partial=partial,
+            custom_metadata=metadata,
+        )
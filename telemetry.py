@@ -0,0 +1,301 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-stage instrumentation for the tool pipelines. Every stage updates the
+# Prometheus-style registry below (a few microseconds); when tracing is
+# on it also emits an OpenTelemetry span, exported as JSON lines to
+# AGENT_TRACE_FILE. With tracing off no span objects are created.
+
+# --- Configuration ---
+TRACE_FILE = os.getenv("AGENT_TRACE_FILE")
+TRACING = os.getenv("AGENT_TRACING", "1" if TRACE_FILE else "0") == "1"
+METRICS_PORT = os.getenv("AGENT_METRICS_PORT")
+# Set to 0.0.0.0 to let a scraper on another host reach /metrics.
+METRICS_HOST = os.getenv("AGENT_METRICS_HOST", "127.0.0.1")
+SERVICE_NAME = "knowledge-graph-adk"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000, 5000, 25000)
+
+
+# --- 1. Metrics registry (Prometheus text exposition format) ---
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        """Observations so far for one label set."""
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _label_text(self.labelnames + ("le",), key + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # Callables returning extra exposition lines, e.g. graph_access query metrics.
+        self.collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+stage_duration = registry.histogram(
+    "kg_stage_duration_seconds", "Duration of each tool pipeline stage.", ("tool", "stage"))
+stage_size = registry.histogram(
+    "kg_stage_output_size", "Output size of each stage (rows, results or characters).", ("tool", "stage"),
+    buckets=SIZE_BUCKETS)
+stage_errors = registry.counter("kg_stage_errors_total", "Stages that raised.", ("tool", "stage"))
+
+
+def _graph_query_lines():
+    from .graph_access import metrics
+
+    snapshot = sorted(metrics.snapshot().items())
+    lines = ["# HELP kg_graph_query_duration_ms Neo4j query latency by query name.",
+             "# TYPE kg_graph_query_duration_ms histogram"]
+    for name, series in snapshot:
+        label = f'query="{_escape(name)}"'
+        cumulative = 0
+        for bound, n in series["latency_ms_buckets"].items():
+            cumulative += n
+            lines.append(f'kg_graph_query_duration_ms_bucket{{{label},le="{"+Inf" if bound == "inf" else bound}"}} {cumulative}')
+        lines.append(f"kg_graph_query_duration_ms_sum{{{label}}} {series['latency_ms_sum']}")
+        lines.append(f"kg_graph_query_duration_ms_count{{{label}}} {series['count']}")
+    for field in ("rows", "db_hits", "retries", "errors"):
+        lines.append(f"# TYPE kg_graph_query_{field}_total counter")
+        lines.extend(f'kg_graph_query_{field}_total{{query="{_escape(name)}"}} {series[field]}' for name, series in snapshot)
+    return lines
+
+
+registry.collectors.append(_graph_query_lines)
+
+
+def _gateway_lines():
+    from .gateway import gateway
+
+    models = sorted(gateway.stats()["models"].items())
+    lines = ["# TYPE kg_llm_gateway_coalesced_total counter",
+             f"kg_llm_gateway_coalesced_total {gateway.coalesced}"]
+    for field, kind in (("limit", "gauge"), ("active", "gauge"), ("queued", "gauge"),
+                        ("calls", "counter"), ("throttled", "counter"), ("overloaded", "counter"), ("retries", "counter")):
+        name = f"kg_llm_gateway_{field}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{model="{_escape(model)}"}} {series[field]}' for model, series in models)
+    return lines
+
+
+registry.collectors.append(_gateway_lines)
+
+
+# --- 2. Tracing ---
+_tracer = None
+
+
+def _file_exporter(path):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    out = open(path, "a", buffering=1)
+    return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def configure_tracing(path=TRACE_FILE):
+    """
+    Install an OpenTelemetry tracer provider that appends spans as JSON lines
+    to `path`. ADK's own spans go to the same provider, so tool stages nest
+    under the agent's tool-call spans.
+    """
+    global _tracer
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+        trace.set_tracer_provider(provider)
+    if path:
+        provider.add_span_processor(BatchSpanProcessor(_file_exporter(path)))
+    _tracer = trace.get_tracer(SERVICE_NAME)
+    return _tracer
+
+
+class Stage:
+    """Handle for a running stage; `size` and extra attributes are recorded on exit."""
+
+    __slots__ = ("tool", "name", "size", "attributes", "span", "started")
+
+    def __init__(self, tool, name, attributes):
+        self.tool = tool
+        self.name = name
+        self.size = None
+        self.attributes = attributes
+        self.span = None
+        self.started = time.perf_counter()
+
+    def set(self, size=None, **attributes):
+        if size is not None:
+            self.size = size
+        if attributes:
+            self.attributes.update(attributes)
+
+
+@contextmanager
+def stage(tool, name, **attributes):
+    """Time one pipeline stage, e.g. `with stage("knowledge_graph", "cypher_execution") as s: ...; s.set(size=len(rows))`."""
+    current = Stage(tool, name, attributes)
+    if _tracer is not None:
+        # start_span rather than start_as_current_span: stages may span a yield
+        # in the streaming generators, where a context token can't be detached.
+        current.span = _tracer.start_span(f"{tool}.{name}")
+    try:
+        yield current
+    except (asyncio.CancelledError, GeneratorExit):
+        # e.g. the losing pipeline of a speculative race (speculative.py), or a
+        # streaming consumer that stopped reading; not an error.
+        current.attributes["cancelled"] = True
+        raise
+    except BaseException as e:
+        stage_errors.inc(tool=tool, stage=name)
+        if current.span is not None:
+            current.span.record_exception(e)
+            from opentelemetry.trace import Status, StatusCode
+
+            current.span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        elapsed = time.perf_counter() - current.started
+        stage_duration.observe(elapsed, tool=tool, stage=name)
+        if current.size is not None:
+            stage_size.observe(current.size, tool=tool, stage=name)
+        if current.span is not None:
+            span = current.span
+            span.set_attribute("kg.tool", tool)
+            span.set_attribute("kg.stage", name)
+            if current.size is not None:
+                span.set_attribute("kg.size", current.size)
+            for key, value in current.attributes.items():
+                if value is not None:
+                    span.set_attribute(f"kg.{key}", value if isinstance(value, (bool, int, float, str)) else str(value))
+            span.end()
+
+
+@contextmanager
+def tool_span(tool, **attributes):
+    """Parent span for one tool call; a no-op when tracing is off."""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(f"tool.{tool}", attributes={f"kg.{k}": v for k, v in attributes.items()}):
+        yield
+
+
+# --- 3. /metrics endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host=METRICS_HOST):
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on {host}:{port}/metrics")
+    return server
+
+
+if TRACING:
+    configure_tracing()
+if METRICS_PORT:
+    serve_metrics(METRICS_PORT)
@@ -1,12 +1,63 @@
-from google.adk.agents import Agent
-from . import prompt
+from typing import AsyncIterator
 
-import datetime
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.genai import types
 
-ticket_agent = Agent(
+from . import flow
+
+
+def _text(content):
+    return "".join(part.text or "" for part in (content.parts if content else [])).strip()
+
+
+def _content(text):
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+class TicketAgent(BaseAgent):
+    """
+    Opens a work order ticket and asks its first question. The ticket is kept
+    in session state under flow.STATE_KEY; later replies are handled by
+    continue_ticket, installed as the root agent's before_agent_callback, so
+    they skip the root agent's routing turn entirely.
+    """
+
+    async def _run_async_impl(self, ctx) -> AsyncIterator[Event]:
+        text = _text(ctx.user_content)
+        ticket = ctx.session.state.get(flow.STATE_KEY)
+        if ticket:
+            ticket, reply = await flow.advance(ticket, text)
+        else:
+            ticket, reply = await flow.start(text, requestor=ctx.session.state.get("user_name"))
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=_content(reply),
+            actions=EventActions(state_delta={flow.STATE_KEY: ticket}),
+        )
+
+
+async def continue_ticket(callback_context):
+    """
+    before_agent_callback for the root agent: while a ticket is open, the
+    user's reply goes straight to the state machine and its answer ends the
+    turn. Questions that don't answer the pending step fall through to the
+    root agent and the ticket stays open.
+    """
+    ticket = callback_context.state.get(flow.STATE_KEY)
+    if not ticket:
+        return None
+    text = _text(callback_context.user_content)
+    if flow.is_aside(ticket, text):
+        return None
+    ticket, reply = await flow.advance(ticket, text)
+    callback_context.state[flow.STATE_KEY] = ticket
+    return _content(reply)
+
+
+ticket_agent = TicketAgent(
     name="ticket_agent",
-    description="This agent guides a user through the process of creating a work order ticket.",
-    model="gemini-2.5-flash", # Or your preferred model
-    tools=[],
-    instruction=prompt.TICKET_AGENT_INSTRUCTIONS,
-)
\ No newline at end of file
+    description="Creates a work order ticket. Call it with the user's message when they want to report a problem, create a ticket or file a work order.",
+)
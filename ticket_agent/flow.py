@@ -0,0 +1,328 @@
+import re
+import uuid
+from datetime import datetime, timedelta
+
+from dateutil import parser as date_parser
+from langchain.prompts.prompt import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from .. import resources
+from ..caching import BUMP_LABEL_VERSIONS
+from ..cypher_templates import FULLTEXT_INDEX, escape_fulltext
+from ..resources import Lazy
+from ..telemetry import stage
+from . import prompt
+
+# Slot-filling state machine for work order tickets. The ticket lives in ADK
+# session state as a plain dict; every reply is parsed locally (priority
+# keywords, relative and absolute timestamps, a full-text lookup of the
+# location) and the next fixed question is asked. The only LLM call is the
+# optional one-line summary of a long issue description.
+
+STATE_KEY = "ticket"
+SLOTS = ("issue_description", "priority", "location", "observed_time")
+# Descriptions longer than this many words get an LLM summary for the confirmation.
+SUMMARY_WORDS = 25
+# Failed parses before a slot is accepted as free text (or its default).
+MAX_RETRIES = 1
+
+PRIORITIES = (
+    ("Low", r"\b(?:low|minor|trivial|not\s+(?:urgent|important|critical)|whenever|p4)\b"),
+    ("Critical", r"\b(?:critical|emergency|severe|safety|dangerous|p1)\b"),
+    ("High", r"\b(?:high|urgent|major|serious|asap|p2)\b"),
+    ("Medium", r"\b(?:medium|moderate|normal|average|med|p3)\b"),
+)
+
+_START = re.compile(
+    r"^\s*(?:hi|hello|hey)?[,!\s]*(?:i\s+(?:need|want|would\s+like|'d\s+like)\s+to\s+|can\s+you\s+|could\s+you\s+|please\s+|"
+    r"help\s+me\s+)?(?:create|open|file|submit|raise|report|log|make|start)\s+(?:a\s+|an\s+)?(?:new\s+)?"
+    r"(?:ticket|work\s+order|issue|problem)?\s*(?:for|about|regarding|on|:|-)?\s*",
+    re.IGNORECASE,
+)
+_YES = re.compile(r"^\s*(?:y|yes|yeah|yep|sure|ok|okay|correct|confirm|proceed|go\s+ahead|do\s+it|create\s+it|"
+                  r"sounds\s+good|looks\s+good)\b", re.IGNORECASE)
+_NO = re.compile(r"^\s*(?:n|no|nope|not\s+quite|wait|change|edit|fix)\b", re.IGNORECASE)
+_CANCEL = re.compile(r"\b(?:cancel|never\s*mind|forget\s+it|stop|abort|don't\s+create)\b", re.IGNORECASE)
+# At free-text steps only a reply that is nothing but a cancellation cancels.
+_CANCEL_REPLY = re.compile(r"^\s*(?:please\s+)?(?:cancel|never\s*mind|forget\s+it|stop|abort|don't\s+create)"
+                           r"(?:\s+(?:it|that|this|the\s+ticket))?(?:\s+please)?\s*[.!]*\s*$", re.IGNORECASE)
+_FREE_TEXT_STEPS = ("issue_description", "location", "observed_time")
+_NONE = re.compile(r"^\s*(?:no|none|n/?a|not\s+sure|unknown|don't\s+know|dont\s+know|no\s+idea|skip)\s*\.?\s*$",
+                   re.IGNORECASE)
+_EDIT_SLOTS = (
+    ("issue_description", r"\b(?:issue|description|problem|describe)\b"),
+    ("priority", r"\b(?:priority|severity|urgency)\b"),
+    ("location", r"\b(?:location|equipment|room|where)\b"),
+    ("observed_time", r"\b(?:time|when|observed|date)\b"),
+)
+
+_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "ten": 10,
+            "fifteen": 15, "twenty": 20, "thirty": 30, "couple of": 2, "few": 3}
+# "2 hours ago", "for about 20 minutes", "a couple of days back".
+_AGO = re.compile(r"\b(\d+|an?|one|two|three|four|five|six|ten|fifteen|twenty|thirty|couple\s+of|few)\s+"
+                  r"(minute|min|hour|hr|day|week)s?\b(?!\s+from\s+now)", re.IGNORECASE)
+_WEEKDAY = re.compile(r"\b(?:mon|tues?|wed(?:nes)?|thu(?:rs)?|fri|sat(?:ur)?|sun)(?:day)?\b", re.IGNORECASE)
+_DATE = re.compile(r"\d{1,4}[/-]\d{1,2}|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b|"
+                   + _WEEKDAY.pattern, re.IGNORECASE)
+_CLOCK = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?(?![\d/-])", re.IGNORECASE)
+_PARTS_OF_DAY = {"this morning": (0, 8), "this afternoon": (0, 14), "this evening": (0, 19), "tonight": (0, 19),
+                 "last night": (1, 21), "yesterday morning": (1, 8), "yesterday afternoon": (1, 14),
+                 "yesterday evening": (1, 19)}
+
+LOCATION_LOOKUP = f"""
+CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $text) YIELD node, score
+WHERE node:Equipment OR node:Room
+RETURN elementId(node) AS id, node.name AS name, CASE WHEN node:Equipment THEN 'Equipment' ELSE 'Room' END AS label
+ORDER BY score DESC LIMIT 1
+"""
+
+# One write transaction: the Work Order, its HASORDER link when the location
+# resolved to equipment, and the label version bump that expires cached answers.
+CREATE_WORK_ORDER = """
+CREATE (wo:`Work Order` {id: $id, order_number: $order_number, description: $description, summary: $summary,
+                         status: 'Open', priority: $priority, location: $location, observed_time: $observed_time,
+                         requestor: $requestor, created_at: datetime()})
+WITH wo
+OPTIONAL MATCH (equipment:Equipment) WHERE elementId(equipment) = $equipment_id
+FOREACH (e IN CASE WHEN equipment IS NULL THEN [] ELSE [equipment] END | MERGE (e)-[:HASORDER]->(wo))
+WITH wo, equipment
+CALL {
+""" + BUMP_LABEL_VERSIONS.strip() + """
+}
+RETURN wo.order_number AS order_number, equipment.name AS equipment
+"""
+
+summary_chain = Lazy(
+    "ticket_summary_chain",
+    lambda: PromptTemplate.from_template(prompt.TICKET_SUMMARY_TEMPLATE) | resources.llm.get() | StrOutputParser(),
+)
+
+
+# --- 1. Parsers ---
+def parse_priority(text: str):
+    for priority, pattern in PRIORITIES:
+        if re.search(pattern, text, re.IGNORECASE):
+            return priority
+    match = re.fullmatch(r"\s*([1-4])\s*", text)
+    return ("Critical", "High", "Medium", "Low")[int(match.group(1)) - 1] if match else None
+
+
+def parse_observed_time(text: str, now: datetime = None):
+    """A datetime for replies like "now", "2 hours ago", "yesterday at 3pm" or "10/17 14:00"; None if unparseable."""
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    lowered = text.lower().strip()
+    if re.search(r"\b(?:just\s+now|right\s+now|now|currently|a\s+moment\s+ago|just\s+happened|ongoing)\b", lowered):
+        return now
+    match = _AGO.search(lowered)
+    if match:
+        amount = match.group(1)
+        amount = int(amount) if amount.isdigit() else _NUMBERS[re.sub(r"\s+", " ", amount)]
+        unit = {"min": "minutes", "minute": "minutes", "hr": "hours", "hour": "hours", "day": "days",
+                "week": "weeks"}[match.group(2)]
+        return now - timedelta(**{unit: amount})
+    # A day word on its own ("yesterday", "this morning") is an answer; otherwise a clock time or date is needed.
+    base, day_given = now, False
+    for phrase, (days_back, hour) in _PARTS_OF_DAY.items():
+        if phrase in lowered:
+            base, day_given = (now - timedelta(days=days_back)).replace(hour=hour, minute=0), True
+            lowered = lowered.replace(phrase, " ")
+            break
+    else:
+        for word, days_back in (("yesterday", 1), ("today", 0)):
+            if word in lowered:
+                base, day_given = now - timedelta(days=days_back), True
+                lowered = lowered.replace(word, " ")
+                break
+    if _DATE.search(lowered):
+        try:
+            parsed = date_parser.parse(lowered, fuzzy=True, default=base)
+        except (ValueError, OverflowError):
+            return base if day_given else None
+    else:
+        clock = _CLOCK.search(lowered)
+        if not clock or int(clock.group(1)) > 23:
+            return base if day_given else None
+        hour, minute, meridiem = int(clock.group(1)), int(clock.group(2) or 0), (clock.group(3) or "").replace(".", "")
+        if meridiem == "pm" and hour < 12 or not meridiem and day_given and base.hour >= 12 and hour < 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+        parsed = base.replace(hour=hour % 24, minute=min(minute, 59))
+    # "3pm" said in the morning means yesterday afternoon.
+    if parsed > now and not day_given and parsed - now < timedelta(days=1):
+        parsed -= timedelta(days=1)
+    # dateutil reads a bare weekday as the coming one; "Monday" means the last one.
+    elif parsed > now and _WEEKDAY.search(lowered) and parsed - now <= timedelta(days=7):
+        parsed -= timedelta(days=7)
+    return parsed
+
+
+def issue_from_request(text: str):
+    """The issue part of an opening request ("I need to report a leaky pipe in ..."), if it has one."""
+    issue = _START.sub("", text, count=1).strip(" .")
+    return issue if len(issue.split()) >= 3 else None
+
+
+def _slot_to_edit(text):
+    for slot, pattern in _EDIT_SLOTS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return slot
+    return None
+
+
+# --- 2. Side effects (graph and LLM) ---
+async def lookup_location(text: str):
+    """The best matching Equipment or Room for a location reply, or None."""
+    query = escape_fulltext(text)
+    if not query:
+        return None
+    with stage("ticket", "location_lookup") as s:
+        rows = await resources.async_graph.get().query(LOCATION_LOOKUP, {"text": query}, name="ticket:location")
+        s.set(size=len(rows))
+    return rows[0] if rows else None
+
+
+async def summarize_issue(text: str) -> str:
+    with stage("ticket", "summarize"):
+        summary = await summary_chain.get().ainvoke({"issue": text})
+    return summary.strip().strip('"') or text
+
+
+async def create_work_order(ticket: dict) -> dict:
+    """Write the ticket as a `Work Order` node; returns its order number and linked equipment."""
+    slots = ticket["slots"]
+    order_number = f"WO-{datetime.now():%Y%m%d}-{uuid.uuid4().hex[:6].upper()}"
+    params = {
+        "id": str(uuid.uuid4()),
+        "order_number": order_number,
+        "description": slots["issue_description"],
+        "summary": slots.get("summary") or slots["issue_description"],
+        "priority": slots["priority"],
+        "location": slots.get("location"),
+        "observed_time": slots.get("observed_time"),
+        "requestor": ticket.get("requestor"),
+        "equipment_id": slots.get("equipment_id"),
+        "labels": ["Work Order"],
+    }
+    with stage("ticket", "create_work_order"):
+        rows = await resources.async_graph.get().write(CREATE_WORK_ORDER, params, name="ticket:create_work_order")
+    return rows[0] if rows else {"order_number": order_number, "equipment": None}
+
+
+# --- 3. The state machine ---
+def new_ticket(requestor=None) -> dict:
+    return {"step": SLOTS[0], "slots": {}, "retries": 0, "editing": False, "requestor": requestor}
+
+
+def _question(step, ticket):
+    if step == "confirm":
+        slots = ticket["slots"]
+        return prompt.CONFIRMATION.format(
+            issue=slots.get("summary") or slots["issue_description"],
+            priority=slots["priority"],
+            location=slots.get("location_display") or slots.get("location") or "not specified",
+            observed=slots.get("observed_display") or slots.get("observed_time") or "not specified",
+        )
+    return prompt.QUESTIONS[step]
+
+
+def _next(ticket):
+    """Move to the next empty slot (or back to confirmation after an edit) and ask for it."""
+    ticket["retries"] = 0
+    if ticket.get("editing"):
+        ticket["editing"] = False
+        ticket["step"] = "confirm"
+    else:
+        ticket["step"] = next((slot for slot in SLOTS if slot not in ticket["slots"]), "confirm")
+    return ticket, _question(ticket["step"], ticket)
+
+
+def _retry(ticket, message):
+    ticket["retries"] += 1
+    return ticket, message
+
+
+async def advance(ticket: dict, text: str, now: datetime = None, lookup=lookup_location, summarize=summarize_issue,
+                  create=create_work_order):
+    """
+    Apply one user reply. Returns (ticket, reply); the ticket is None once it
+    has been created or cancelled.
+    """
+    text = (text or "").strip()
+    step, slots = ticket["step"], ticket["slots"]
+    # "stop" inside a description ("the pump won't stop") isn't a cancellation.
+    if step in _FREE_TEXT_STEPS:
+        cancelled = _CANCEL_REPLY.match(text)
+    else:
+        cancelled = _CANCEL.search(text) and (len(text.split()) <= 4 or "cancel" in text.lower())
+    if cancelled:
+        return None, prompt.CANCELLED
+
+    if step == "issue_description":
+        if len(text.split()) < 2:
+            return _retry(ticket, prompt.QUESTIONS[step])
+        slots["issue_description"] = text
+        slots["summary"] = await summarize(text) if len(text.split()) > SUMMARY_WORDS else text
+
+    elif step == "priority":
+        priority = parse_priority(text)
+        if priority is None:
+            if ticket["retries"] < MAX_RETRIES:
+                return _retry(ticket, prompt.PRIORITY_RETRY)
+            priority = "Medium"
+        slots["priority"] = priority
+
+    elif step == "location":
+        if _NONE.match(text):
+            slots["location"], slots["location_display"] = None, "not specified"
+        else:
+            match = await lookup(text)
+            slots["location"] = match["name"] if match else text
+            slots["location_display"] = f"{match['name']} ({match['label']})" if match else text
+            slots["equipment_id"] = match["id"] if match and match["label"] == "Equipment" else None
+
+    elif step == "observed_time":
+        observed = parse_observed_time(text, now)
+        if observed is None and ticket["retries"] < MAX_RETRIES and not _NONE.match(text):
+            return _retry(ticket, prompt.TIME_RETRY)
+        slots["observed_time"] = observed.isoformat(timespec="minutes") if observed else (None if _NONE.match(text) else text)
+        slots["observed_display"] = observed.strftime("%Y-%m-%d %H:%M") if observed else slots["observed_time"]
+
+    elif step == "confirm":
+        edit = _slot_to_edit(text)
+        if _YES.match(text) and not edit:
+            created = await create(ticket)
+            return None, prompt.CREATED.format(order_number=created["order_number"])
+        if edit == "priority" and parse_priority(re.sub(_EDIT_SLOTS[1][1], "", text, flags=re.IGNORECASE)):
+            # "change the priority to high": apply it and confirm again.
+            slots["priority"] = parse_priority(re.sub(_EDIT_SLOTS[1][1], "", text, flags=re.IGNORECASE))
+            return ticket, _question("confirm", ticket)
+        if edit:
+            ticket.update(step=edit, editing=True, retries=0)
+            return ticket, prompt.QUESTIONS[edit]
+        if _NO.match(text):
+            return ticket, prompt.WHAT_TO_CHANGE
+        return ticket, prompt.CONFIRM_RETRY
+
+    return _next(ticket)
+
+
+async def start(text: str, requestor=None, **kwargs):
+    """Open a ticket from the user's first message, using any issue it already describes."""
+    ticket = new_ticket(requestor)
+    issue = issue_from_request(text)
+    if issue:
+        return await advance(ticket, issue, **kwargs)
+    return _next(ticket)
+
+
+def is_aside(ticket: dict, text: str) -> bool:
+    """A question that doesn't answer the pending step, e.g. "where is AHU-1?" mid-ticket; the root agent takes it."""
+    text = text.strip()
+    if not text.endswith("?") or ticket["step"] in ("issue_description", "confirm"):
+        return False
+    if ticket["step"] == "priority":
+        return parse_priority(text) is None
+    if ticket["step"] == "observed_time":
+        return parse_observed_time(text) is None
+    return len(text.split()) > 3
@@ -1,37 +1,37 @@
-TICKET_AGENT_INSTRUCTIONS = """
-You are a friendly and professional "Ticket Creation Assistant".
-Your ONLY goal is to guide a user through creating a work order ticket by asking a series of questions.
-You must gather information one piece at a time and ask the next question in the sequence.
-Check the current task context to see what information you already have before asking a question.
-You MUST follow the conversation flow in below. Do NOT change the order of the questions under ANY circumstances. 
+# Fixed wording for the ticket flow (flow.py). Each question is asked as-is;
+# no LLM turn is needed to decide what to say next.
+QUESTIONS = {
+    "issue_description": "Of course, I can help with that. To start, please describe the issue or problem you're observing.",
+    "priority": "Got it. What would you classify the severity of this issue as? For example: Low, Medium, High, or Critical.",
+    "location": "Thank you. Is there a specific location or piece of equipment associated with this issue? Please provide the name or ID if you know it.",
+    "observed_time": "Almost done. When did you first observe this issue?",
+}
 
-Here is your conversational flow:
+PRIORITY_RETRY = "Sorry, I didn't catch the severity. Please answer Low, Medium, High, or Critical."
 
-1.  **Check for `issue_description`**: If it's missing, ask: "Of course, I can help with that. To start, please describe the issue or problem you're observing."
+TIME_RETRY = ("Sorry, I couldn't tell when that was. You can say something like \"just now\", \"2 hours ago\", "
+              "\"yesterday at 3pm\" or \"10/17 14:00\".")
 
-2.  **Check for `priority`**: "Got it. What would you classify the severity of this issue as? For example: Low, Medium, High, or Critical."
+CONFIRMATION = """Great, I have all the details. Here's a summary:
+- Issue: {issue}
+- Severity: {priority}
+- Location: {location}
+- Observed: {observed}
 
-3.  **Check for `location`**: "Thank you. Is there a specific location or piece of equipment associated with this issue? Please provide the name or ID if you know it."
+Do I have your permission to create this ticket?"""
 
-4.  **Check for `observed_time`**: "Almost done. When did you first observe this issue?"
+CONFIRM_RETRY = "Should I create this ticket? Please answer yes or no, or tell me which detail to change."
 
-5.  **Confirmation Step**: Once all information (`issue_description`, `priority`, `location`, `observed_time`) is present, you MUST summarize the details for the user and ask for final confirmation. Say:
-    "Great, I have all the details. Here's a summary:
-    - Issue: [Summarize the issue_description]
-    - Severity: [Show the priority]
-    - Location: [Show the location]
-    - Observed: [Show the observed_time]
+WHAT_TO_CHANGE = "No problem. Which detail should I change: the issue, severity, location or observed time? Or say cancel."
 
-    Do I have your permission to create this ticket?"
+CREATED = "Sounds good. I've created a ticket with the ID: {order_number}."
 
-6.  **Final Action**: If the user confirms (says "yes", "proceed", etc.), send a confirmation message to the user with a dummy Ticket ID. For now, this system is just for testing.
+CANCELLED = "Okay, I've cancelled this ticket. Nothing was created."
 
-7.  **Final Action**: If the user confirms (says "yes", "proceed", etc.), send a confirmation message to the user with a dummy Ticket ID. For now, this system is just for testing.
-    "Sound good. I've created a ticket with the ID: [ID]."
+# The one LLM call in the flow, for issue descriptions too long to repeat back verbatim.
+TICKET_SUMMARY_TEMPLATE = """
+Summarize the following maintenance issue reported by a building engineer in one short sentence (at most 15 words).
+Keep equipment names, locations and symptoms. Return only the sentence.
 
-MUST **GOLDEN RULE ** 
-
-MAINTAIN CONTROL OF THE CONVERSATION UNTIL IT IS COMPLETED. DO NOT LET THE ROOT AGENT TAKE CONTROL OF THE CONVERSATION. Review the conversation history. Based on the information already provided by the user, ask for the next piece of information you need. Do not start over if the conversatoin is already in progress.
-
-If the user wants to change something, acknowledge it and work with them. If they want to cancel, end the task politely.
-"""
\ No newline at end of file
+Issue: {issue}
+"""